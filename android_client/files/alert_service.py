@@ -0,0 +1,574 @@
+import argparse
+import hmac
+import json
+import os
+import secrets
+import signal
+import socket
+import threading
+from collections import deque
+from datetime import datetime
+
+from android_bridge import ON_ANDROID, get_bridge
+from datagram import DEFAULT_GROUP
+from dedup import SeenIds
+from framing import FRAMING_NDJSON, StreamDecoder, encode_message
+from journal import AlertJournal
+from messages import Message
+from metrics import MetricsRegistry, snapshot_writer
+from network import AlertTransport, NetworkManager
+from relay import DEFAULT_WORKERS, OUTBOX_FILE, FanoutRelay, open_outbox
+from response_handler import ResponseHandler
+
+# buildozer.spec 的 services 中声明的服务名称，Android 上对应的Java类为 <包名>.ServiceAlertservice
+SERVICE_NAME = 'alertservice'
+
+# 界面与服务之间的本机IPC通道，只在回环地址上监听
+IPC_HOST = '127.0.0.1'
+IPC_PORT = 8899
+IPC_MAX_CONNECTIONS = 8
+# IPC令牌文件，保存在界面与服务共用的数据目录中，只有本用户(Android 上只有本应用)可读
+IPC_TOKEN_FILE = 'ipc_token'
+
+# 界面连接时补发的最近日志行数
+IPC_BACKLOG_LINES = 200
+
+# 与 main.py 中界面应用的默认值相同
+SEEN_IDS_SIZE = 4096
+DISPATCH_QUEUE_DEPTH = 256
+JOURNAL_FILE = 'alerts.db'
+METRICS_FILE = 'metrics.json'
+METRICS_DUMP_INTERVAL = 60
+
+# 桌面环境下保存警报日志和运行统计的目录
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser('~'), '.linkedalert')
+
+
+def load_token(data_dir):
+    """
+    读取数据目录中的IPC令牌，没有时生成一个并保存
+
+    界面和服务读取同一个文件，服务被系统重启或界面重新打开后令牌仍然一致。
+
+    Args:
+        data_dir: 数据目录
+
+    Returns:
+        str: IPC令牌
+    """
+    path = os.path.join(data_dir, IPC_TOKEN_FILE)
+    try:
+        with open(path) as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except OSError:
+        pass
+    token = secrets.token_hex(16)
+    os.makedirs(data_dir, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    return token
+
+
+def take_token(message):
+    """
+    取出并移除消息中的IPC令牌，令牌不进入警报日志和转发
+
+    Args:
+        message: IPC消息字典或消息对象
+
+    Returns:
+        令牌，消息中没有时为 None
+    """
+    if isinstance(message, Message):
+        return message.extra.pop('token', None) if message.extra else None
+    return message.pop('token', None)
+
+
+def event(name, **fields):
+    """
+    生成一条推送给界面的事件消息
+
+    Args:
+        name: 事件名称，'log'、'alert'、'alert_stopped'，以及 ServiceClient 本地产生的
+            'connected'、'disconnected'
+        **fields: 事件内容
+
+    Returns:
+        dict: {"type": "event", "event": name, ...}
+    """
+    return dict(fields, type='event', event=name)
+
+
+class ServiceHandler(ResponseHandler):
+    """
+    后台服务使用的响应处理器
+
+    日志直接交给服务(没有 Kivy 主循环)，综合警报只执行按级别的声音和震动，
+    alert 命令按关键级别警报处理，stop_alert 命令停止正在进行的警报。
+    """
+
+    def __init__(self, service, **kwargs):
+        """
+        初始化响应处理器
+
+        Args:
+            service: AlertService 实例
+            **kwargs: 传给 ResponseHandler 的参数
+        """
+        super().__init__(log_callback=service.log, **kwargs)
+        self.service = service
+
+    def _emit_log(self, message):
+        self.log_callback(message)
+
+    def raise_alert(self, message):
+        super().raise_alert(message)
+        self.service.alert_started(message)
+
+    def stop_alert(self):
+        self.service.stop_alert()
+
+
+class AlertService:
+    """
+    无界面的警报接收服务
+
+    运行传输引擎、优先级分发队列、响应处理器、警报日志和转发器，不导入 Kivy。
+    Android 上作为前台服务运行，界面被系统回收后仍能接收警报；Linux 上可作为守护进程
+    (python -m alert_service)运行在中继设备上。
+
+    界面通过本机IPC通道(IPC_HOST:IPC_PORT，NDJSON)连接服务：发送 {"type": "subscribe"}
+    后收到最近的日志和当前警报状态，之后服务把日志和警报事件推送到该连接；界面发送的
+    command 消息与网络收到的命令一样进入分发队列，{"type": "service", "action": "stop"} 停止服务。
+    """
+
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, engine='thread', relay_peers=(), relay_workers=DEFAULT_WORKERS,
+                 metrics_enabled=True, echo=True, token=None):
+        """
+        初始化服务
+
+        Args:
+            data_dir: 保存警报日志和运行统计快照的目录
+            engine: 传输引擎名称
+            relay_peers: 收到的警报和命令转发给这些下游设备("host:port")，为空时不转发
+            relay_workers: 转发线程数
+            metrics_enabled: 是否统计运行指标
+            echo: 是否把日志打印到标准输出
+            token: IPC令牌，界面的每条IPC消息须带有此令牌；为 None 时使用数据目录中的 IPC_TOKEN_FILE(没有时生成)
+        """
+        self.data_dir = data_dir
+        self.echo = echo
+        self.android = get_bridge()
+        self.metrics = MetricsRegistry(enabled=metrics_enabled)
+        self._backlog = deque(maxlen=IPC_BACKLOG_LINES)
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._multicast = False
+        self.alert = None
+        self._peer = None
+        self._ipc_errors = self.metrics.counter('service.ipc_errors')
+        self._ipc_rejected = self.metrics.counter('service.ipc_rejected')
+
+        os.makedirs(data_dir, exist_ok=True)
+        self.token = token or load_token(data_dir)
+        self.journal = AlertJournal(os.path.join(data_dir, JOURNAL_FILE))
+        self.journal.start()
+        # 已处理的消息ID从警报日志中恢复，重启前收到的消息被重发时不会再次报警
+        self.seen_ids = SeenIds(max_size=SEEN_IDS_SIZE)
+        for key in self.journal.recent_ids(SEEN_IDS_SIZE):
+            self.seen_ids.add(key)
+        self.relay = None
+        self.outbox = None
+        if relay_peers:
+            send = NetworkManager().send_message
+            # 转发失败的消息由重试队列补发，服务重启后继续
+            self.outbox = open_outbox(os.path.join(data_dir, OUTBOX_FILE), send, log=self.log)
+            self.metrics.gauge('relay.outbox', self.outbox.stats)
+            self.relay = FanoutRelay(send, relay_peers, max_workers=relay_workers, metrics=self.metrics,
+                                     outbox=self.outbox)
+            self.relay.start()
+            self.outbox.start()
+
+        self.handler = ServiceHandler(self, metrics=self.metrics, journal=self.journal, relay=self.relay)
+        self.transport = AlertTransport(self.handler, engine=engine, max_depth=DISPATCH_QUEUE_DEPTH,
+                                        metrics=self.metrics, seen_ids=self.seen_ids)
+        # IPC连接由界面长期持有，不做空闲超时和心跳
+        self.ipc = NetworkManager(batch_callback=self._handle_ipc, max_connections=IPC_MAX_CONNECTIONS,
+                                  idle_timeout=None, heartbeat_interval=None)
+        self.metrics.gauge('service', self.stats)
+        if metrics_enabled and METRICS_DUMP_INTERVAL:
+            self.metrics.start_dump(METRICS_DUMP_INTERVAL, snapshot_writer(os.path.join(data_dir, METRICS_FILE)))
+
+    def start(self, host='0.0.0.0', port=8888, udp_port=None, group=None, ipc_port=IPC_PORT):
+        """
+        开始接收警报并打开IPC通道
+
+        Args:
+            host: 监听地址
+            port: 监听端口
+            udp_port: 同时在该端口接收UDP警报，None 表示只监听TCP
+            group: UDP接收加入的组播地址
+            ipc_port: IPC通道端口，None 表示不打开
+
+        Returns:
+            bool: TCP监听是否成功启动，IPC通道打开失败只写入日志
+        """
+        if udp_port is not None and group:
+            self.android.acquire_multicast_lock()
+            self._multicast = True
+        if not self.transport.start(host, port, udp_port=udp_port, group=group):
+            return False
+        self.log(f"警报服务已启动 ({host}:{port})，等待连接...")
+        if ipc_port is not None and not self.ipc.start_server(IPC_HOST, ipc_port):
+            self.log(f"无法打开IPC通道 {IPC_HOST}:{ipc_port}，界面将无法连接服务")
+        return True
+
+    def stop(self):
+        """停止接收警报，关闭IPC通道、转发器和警报日志"""
+        self._stopped.set()
+        self.ipc.stop_server()
+        self.transport.close()
+        self.handler.commands.stop()
+        self.handler.effects.stop()
+        self.metrics.stop_dump()
+        if self.relay is not None:
+            self.relay.stop()
+            self.outbox.stop()
+        self.journal.close()
+        if self._multicast:
+            self.android.release_multicast_lock()
+            self._multicast = False
+
+    def shutdown(self):
+        """请求停止，wait 随即返回，可在信号处理函数和IPC线程中调用"""
+        self._stopped.set()
+
+    def wait(self, timeout=None):
+        """
+        等待 shutdown 被调用
+
+        Returns:
+            bool: 已请求停止时返回True
+        """
+        return self._stopped.wait(timeout)
+
+    def log(self, message):
+        """记录日志并推送给已连接的界面，可在任意线程中调用"""
+        line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+        if self.echo:
+            print(line, flush=True)
+        with self._lock:
+            self._backlog.append(line)
+        self.publish(event('log', message=line))
+
+    def publish(self, message):
+        """
+        把事件推送给所有已订阅的界面连接，发送失败的连接不再推送
+
+        Args:
+            message: 事件消息
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for key, source in subscribers:
+            try:
+                sent = self.ipc.send_to(source, message)
+            except OSError:
+                sent = False
+            if not sent:
+                self._ipc_errors.inc()
+                with self._lock:
+                    self._subscribers.pop(key, None)
+
+    def alert_started(self, message):
+        """
+        综合警报启动后回送确认并通知界面，由响应处理器调用
+
+        Args:
+            message: 警报消息(messages.AlertMessage)
+        """
+        self.alert = {
+            'level': message.level,
+            'content': message.content or '',
+            'ip': message.source_ip,
+            'id': message.id,
+        }
+        self._peer = message.source or {}
+        self._send_ack({"type": "alert_ack", "message": "警报已启动"}, "警报确认")
+        self.publish(event('alert', alert=self.alert))
+
+    def stop_alert(self):
+        """停止正在进行的综合警报"""
+        self.handler.effects.cancel()
+        if self.alert is None:
+            self.log("没有活动的警报")
+            return
+        self._send_ack({"type": "stop_alert_ack", "message": "警报已停止"}, "停止警报确认")
+        self.alert = None
+        self.log("警报已停止")
+        self.publish(event('alert_stopped'))
+
+    def stats(self):
+        """
+        返回服务状态
+
+        Returns:
+            dict: 是否在监听、已连接的界面数和当前警报
+        """
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {'listening': self.transport.is_listening, 'subscribers': subscribers, 'alert': self.alert}
+
+    def _send_ack(self, ack_message, name):
+        peer = self._peer if self.alert is not None else None
+        if not peer or 'ip' not in peer:
+            return
+        if self.alert['id'] is not None:
+            ack_message = dict(ack_message, ref=self.alert['id'])
+        try:
+            if not self.transport.send_to(peer, ack_message):
+                raise ConnectionError("连接已断开")
+            self.log(f"已发送{name}到服务端")
+        except Exception as e:
+            self.log(f"发送{name}失败: {str(e)}")
+
+    def _authorized(self, message):
+        """检查并移除消息中的IPC令牌"""
+        token = take_token(message)
+        return isinstance(token, str) and hmac.compare_digest(token, self.token)
+
+    def _handle_ipc(self, messages):
+        """
+        处理界面通过IPC通道发来的一批消息
+
+        本机的任何应用都能连接回环端口，每条消息须带有服务的IPC令牌(token 字段)；
+        令牌不符的连接收到错误应答后被关闭，同一批中的其余消息不再处理。
+        """
+        results = []
+        for message in messages:
+            if not self._authorized(message):
+                self._ipc_rejected.inc()
+                source = message.get('source') or {}
+                self.log(f"拒绝来自 {source.get('ip', 'unknown')}:{source.get('port')} 的IPC连接: 令牌无效")
+                rejected = {'status': 'error', 'message': 'IPC令牌无效'}
+                try:
+                    self.ipc.send_to(source, rejected)
+                except OSError:
+                    pass
+                self.ipc.disconnect(source)
+                results.extend(rejected for _ in range(len(messages) - len(results)))
+                break
+            kind = message.get('type')
+            if kind == 'subscribe':
+                source = message['source']
+                with self._lock:
+                    self._subscribers[(source['ip'], source['port'])] = source
+                    lines = list(self._backlog)
+                results.append({'status': 'ok', 'lines': lines, 'alert': self.alert})
+            elif kind in ('alert', 'command'):
+                # 界面发来的命令与网络收到的命令一样按优先级排队处理
+                results.extend(self.transport.dispatcher.submit_batch([message]))
+            elif kind == 'service' and message.get('action') == 'stop':
+                self.log("界面请求停止警报服务")
+                self.shutdown()
+                results.append({'status': 'ok'})
+            elif kind == 'service' and message.get('action') == 'status':
+                results.append({'status': 'ok', 'service': self.stats()})
+            else:
+                results.append({'status': 'error', 'message': f"未知的IPC消息: {kind}"})
+        return results
+
+
+class ServiceClient:
+    """
+    界面端的IPC客户端
+
+    在后台线程中连接警报服务并订阅事件，连接断开或服务尚未启动时按 retry_interval 重试。
+    事件通过 on_event 回调交给界面，回调在客户端线程中调用；连接建立和断开时分别产生
+    'connected' 和 'disconnected' 事件，订阅时补发的日志和警报状态同样以事件形式交给回调。
+    """
+
+    def __init__(self, on_event, token, host=IPC_HOST, port=IPC_PORT, retry_interval=1.0):
+        """
+        初始化客户端
+
+        Args:
+            on_event: 事件回调，参数为事件消息字典
+            token: 服务的IPC令牌，随每条消息发送
+            host: 服务IPC地址
+            port: 服务IPC端口
+            retry_interval: 连接失败后的重试间隔(秒)
+        """
+        self.on_event = on_event
+        self.token = token
+        self.host = host
+        self.port = port
+        self.retry_interval = retry_interval
+        self._sock = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def start(self):
+        """启动客户端线程，立即返回"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """断开连接并停止重试，服务继续运行"""
+        self._stopping.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def send_command(self, command, params=None):
+        """
+        请服务执行一条命令，如 stop_alert
+
+        Args:
+            command: 命令名称
+            params: 命令参数
+
+        Returns:
+            bool: 是否已发出，未连接服务时返回False
+        """
+        return self._send({'type': 'command', 'command': command, 'params': params or {}})
+
+    def stop_service(self):
+        """
+        请服务停止接收警报并退出
+
+        Returns:
+            bool: 是否已发出
+        """
+        return self._send({'type': 'service', 'action': 'stop'})
+
+    def _send(self, message):
+        message = dict(message, token=self.token)
+        with self._lock:
+            sock = self._sock
+            if sock is None:
+                return False
+            try:
+                sock.sendall(encode_message(message, FRAMING_NDJSON))
+            except OSError:
+                return False
+        return True
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=self.retry_interval)
+            except OSError:
+                self._stopping.wait(self.retry_interval)
+                continue
+            sock.settimeout(None)
+            with self._lock:
+                self._sock = sock
+            self._emit(event('connected'))
+            self._send({'type': 'subscribe'})
+            decoder = StreamDecoder(FRAMING_NDJSON)
+            try:
+                while not self._stopping.is_set():
+                    data = sock.recv(65536)
+                    if not data:
+                        break
+                    for frame in decoder.feed(data):
+                        self._handle(json.loads(frame))
+            except (OSError, ValueError):
+                pass
+            finally:
+                with self._lock:
+                    self._sock = None
+                sock.close()
+            self._emit(event('disconnected'))
+
+    def _handle(self, message):
+        if message.get('type') == 'event':
+            self._emit(message)
+        elif 'lines' in message:
+            # 订阅的应答：补发最近的日志和当前警报
+            for line in message['lines']:
+                self._emit(event('log', message=line))
+            if message.get('alert'):
+                self._emit(event('alert', alert=message['alert']))
+
+    def _emit(self, message):
+        try:
+            self.on_event(message)
+        except Exception:
+            pass
+
+
+def service_argument():
+    """
+    读取 Android 启动服务时传入的参数(AndroidBridge.start_service 的 argument，JSON)
+
+    Returns:
+        dict: 参数字典，不在服务进程中时为空
+    """
+    argument = os.environ.get('PYTHON_SERVICE_ARGUMENT')
+    if not argument:
+        return {}
+    try:
+        value = json.loads(argument)
+    except ValueError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='无界面警报服务：接收警报并响应，界面通过本机IPC连接')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=8888, help='监听端口')
+    parser.add_argument('--udp', dest='udp', action='store_true', default=False,
+                        help='同时接收UDP警报(持有组播锁，耗电增加)')
+    parser.add_argument('--no-udp', dest='udp', action='store_false', help='不接收UDP警报(默认)')
+    parser.add_argument('--udp-port', type=int, default=None, help='UDP警报端口，默认与监听端口相同')
+    parser.add_argument('--group', default=DEFAULT_GROUP, help='加入的组播地址，空字符串表示不加入')
+    parser.add_argument('--engine', default='thread', help='传输引擎')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='警报日志和运行统计目录')
+    parser.add_argument('--ipc-port', type=int, default=IPC_PORT, help='IPC通道端口')
+    parser.add_argument('--token', default=None, help=f'IPC令牌，默认使用数据目录中的 {IPC_TOKEN_FILE}')
+    parser.add_argument('--relay', nargs='*', default=[], help='转发的下游设备地址 host:port')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='转发线程数')
+    # Android 上服务参数由界面通过环境变量传入，命令行参数优先
+    parser.set_defaults(**service_argument())
+    args = parser.parse_args(argv)
+
+    service = AlertService(args.data_dir, engine=args.engine, relay_peers=args.relay, relay_workers=args.workers,
+                           token=args.token)
+    udp_port = (args.udp_port or args.port) if args.udp else None
+    if not service.start(args.host, args.port, udp_port=udp_port, group=args.group or None, ipc_port=args.ipc_port):
+        service.stop()
+        raise SystemExit(1)
+    if not ON_ANDROID:
+        signal.signal(signal.SIGTERM, lambda signum, frame: service.shutdown())
+    try:
+        while not service.wait(3600):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+
+
+if __name__ == '__main__':
+    main()
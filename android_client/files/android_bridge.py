@@ -0,0 +1,301 @@
+import os
+import threading
+
+# 与 kivy.utils.platform 相同的判断方式，不必为此导入 Kivy
+ON_ANDROID = 'ANDROID_ARGUMENT' in os.environ or 'P4A_BOOTSTRAP' in os.environ
+
+ACTIVITY_CLASS = 'org.kivy.android.PythonActivity'
+SERVICE_CLASS = 'org.kivy.android.PythonService'
+CONTEXT_CLASS = 'android.content.Context'
+
+# 系统服务名称及其Java接口，取得的服务按接口转换后缓存
+SERVICE_CLASSES = {
+    'WINDOW_SERVICE': 'android.view.WindowManager',
+    'VIBRATOR_SERVICE': 'android.os.Vibrator',
+    'AUDIO_SERVICE': 'android.media.AudioManager',
+    'NOTIFICATION_SERVICE': 'android.app.NotificationManager',
+    'WIFI_SERVICE': 'android.net.wifi.WifiManager',
+}
+
+# 与 Activity 的窗口绑定的系统服务，从当前 Activity 取得，Activity 重建后重新取得；
+# 其余服务从 Application Context 取得，整个进程内有效
+ACTIVITY_SERVICES = ('WINDOW_SERVICE',)
+
+# 接收组播时持有的 WifiManager.MulticastLock 的标签
+MULTICAST_LOCK_TAG = 'linked_alert_multicast'
+
+# View.VISIBLE
+VIEW_VISIBLE = 0
+
+
+class AndroidBridge:
+    """
+    Android 平台桥接
+
+    pyjnius 的 autoclass 反射查找和 getSystemService 调用在低端设备上很慢，
+    桥接对象在第一次使用时解析 Java 类和系统服务，之后直接返回缓存的对象。
+    Activity 会被系统重建，不缓存 Activity 实例，每次从缓存的 PythonActivity 类读取；
+    与窗口绑定的服务在 reset_activity 时丢弃。
+    """
+
+    available = True
+
+    def __init__(self):
+        self._classes = {}
+        self._services = {}
+        self._granted = set()
+        self._requested = set()
+        self._multicast_lock = None
+        self._lock = threading.RLock()
+        self.lookups = 0
+
+    def autoclass(self, name):
+        """
+        取得Java类，每个类只反射查找一次
+
+        Args:
+            name: Java类的完整名称
+
+        Returns:
+            Java类的Python代理
+        """
+        cls = self._classes.get(name)
+        if cls is None:
+            with self._lock:
+                cls = self._classes.get(name)
+                if cls is None:
+                    cls = self._classes[name] = self._load_class(name)
+                    self.lookups += 1
+        return cls
+
+    @property
+    def activity(self):
+        """当前Activity；后台服务进程中没有Activity，返回服务本身(同样是 Context)"""
+        return self.autoclass(ACTIVITY_CLASS).mActivity or self.autoclass(SERVICE_CLASS).mService
+
+    def reset_activity(self):
+        """丢弃与旧 Activity 绑定的系统服务，应用恢复(Activity 可能已重建)时调用"""
+        with self._lock:
+            for name in ACTIVITY_SERVICES:
+                self._services.pop(name, None)
+
+    def system_service(self, name):
+        """
+        取得系统服务，结果会被缓存
+
+        Args:
+            name: Context 中的服务常量名，如 'WINDOW_SERVICE'
+
+        Returns:
+            系统服务对象，已转换为 SERVICE_CLASSES 中对应的接口
+        """
+        service = self._services.get(name)
+        if service is None:
+            with self._lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = self._load_service(name)
+                    self._services[name] = service
+        return service
+
+    @property
+    def window_manager(self):
+        return self.system_service('WINDOW_SERVICE')
+
+    @property
+    def vibrator(self):
+        return self.system_service('VIBRATOR_SERVICE')
+
+    def request_permissions(self, permissions):
+        """
+        申请运行时权限；已授予和正在等待用户答复的权限不再重复申请，被拒绝的权限下次调用时再次申请
+
+        Args:
+            permissions: 权限名称列表，如 ['VIBRATE']
+        """
+        with self._lock:
+            missing = [name for name in permissions if name not in self._granted and name not in self._requested]
+            if not missing:
+                return
+            self._requested.update(missing)
+        self._request_permissions(missing)
+
+    def _permissions_answered(self, permissions, results):
+        """记录用户对权限申请的答复"""
+        with self._lock:
+            for name, granted in zip(permissions, results):
+                self._requested.discard(name)
+                if granted:
+                    self._granted.add(name)
+
+    def acquire_multicast_lock(self):
+        """
+        持有组播锁，多数设备的 WLAN 默认过滤组播数据报，不持有时收不到组播警报
+
+        Returns:
+            WifiManager.MulticastLock，重复调用返回同一个锁
+        """
+        with self._lock:
+            if self._multicast_lock is None:
+                lock = self.system_service('WIFI_SERVICE').createMulticastLock(MULTICAST_LOCK_TAG)
+                lock.setReferenceCounted(False)
+                lock.acquire()
+                self._multicast_lock = lock
+            return self._multicast_lock
+
+    def release_multicast_lock(self):
+        """释放组播锁，停止接收组播时调用以减少耗电"""
+        with self._lock:
+            if self._multicast_lock is not None:
+                self._multicast_lock.release()
+                self._multicast_lock = None
+
+    def start_service(self, name, argument=''):
+        """
+        启动 buildozer.spec 的 services 中声明的后台服务，服务已在运行时只传入新参数
+
+        Args:
+            name: 服务名称
+            argument: 传给服务的参数字符串，服务中从环境变量 PYTHON_SERVICE_ARGUMENT 读取
+
+        Returns:
+            bool: 是否已请求启动
+        """
+        self._service_class(name).start(self.activity, argument)
+        return True
+
+    def stop_service(self, name):
+        """
+        停止后台服务
+
+        Args:
+            name: 服务名称
+        """
+        self._service_class(name).stop(self.activity)
+
+    def is_foreground(self):
+        """
+        检查应用窗口是否可见
+
+        Returns:
+            bool: 窗口可见时返回True
+        """
+        return self.activity.getWindow().getDecorView().getWindowVisibility() == VIEW_VISIBLE
+
+    def remove_view(self, view):
+        """
+        立即移除悬浮窗等通过 WindowManager 添加的视图
+
+        Args:
+            view: 要移除的视图
+        """
+        self.window_manager.removeViewImmediate(view)
+
+    def stats(self):
+        """
+        返回缓存统计
+
+        Returns:
+            dict: 已缓存的类数、服务数及实际反射查找次数
+        """
+        return {
+            'classes': len(self._classes),
+            'services': len(self._services),
+            'lookups': self.lookups,
+        }
+
+    def _service_class(self, name):
+        # python-for-android 为每个服务生成 <包名>.Service<首字母大写的服务名> 类
+        return self.autoclass(f"{self.activity.getPackageName()}.Service{name.capitalize()}")
+
+    def _load_class(self, name):
+        from jnius import autoclass
+        return autoclass(name)
+
+    def _load_service(self, name):
+        context = self.autoclass(CONTEXT_CLASS)
+        owner = self.activity if name in ACTIVITY_SERVICES else self.activity.getApplicationContext()
+        service = owner.getSystemService(getattr(context, name))
+        interface = SERVICE_CLASSES.get(name)
+        if interface:
+            from jnius import cast
+            service = cast(interface, service)
+        return service
+
+    def _request_permissions(self, permissions):
+        from android.permissions import request_permissions, Permission
+        # 回调参数为完整的权限名称和对应的授予结果，按顺序对应申请的权限
+        request_permissions([getattr(Permission, name) for name in permissions],
+                            lambda names, results: self._permissions_answered(permissions, results))
+
+
+class _Stub:
+    """桌面环境下代替Java类和对象的占位对象，任何属性访问和调用都返回占位对象"""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        return _Stub(f"{self._name}.{attr}")
+
+    def __call__(self, *args, **kwargs):
+        return _Stub(f"{self._name}()")
+
+    def __or__(self, other):
+        return self
+
+    __ror__ = __or__
+
+    def __repr__(self):
+        return f"<stub {self._name}>"
+
+
+class DesktopBridge(AndroidBridge):
+    """
+    桌面环境的桥接，接口与 AndroidBridge 相同
+
+    Java类和系统服务都是不做任何操作的占位对象，应用始终视为在前台，
+    可用于在非Android环境中运行和测量警报处理流程。
+    """
+
+    available = False
+
+    def is_foreground(self):
+        return True
+
+    def start_service(self, name, argument=''):
+        # 桌面环境下服务由 python -m alert_service 单独运行
+        return False
+
+    def stop_service(self, name):
+        pass
+
+    def _load_class(self, name):
+        return _Stub(name)
+
+    def _load_service(self, name):
+        return _Stub(SERVICE_CLASSES.get(name, name))
+
+    def _request_permissions(self, permissions):
+        self._permissions_answered(permissions, [True] * len(permissions))
+
+
+_bridge = None
+_bridge_lock = threading.Lock()
+
+
+def get_bridge():
+    """
+    返回进程内共享的桥接对象，第一次调用时按平台创建
+
+    Returns:
+        AndroidBridge: Android 环境下为 AndroidBridge，否则为 DesktopBridge
+    """
+    global _bridge
+    if _bridge is None:
+        with _bridge_lock:
+            if _bridge is None:
+                _bridge = AndroidBridge() if ON_ANDROID else DesktopBridge()
+    return _bridge
@@ -0,0 +1,178 @@
+import os
+import threading
+
+# 默认音频目录
+AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'audio')
+
+# 支持的音频格式，按优先顺序查找
+AUDIO_FORMATS = ('mp3', 'wav', 'ogg')
+
+# 默认警报音，以及各警报级别专用的警报音(缺失时使用默认警报音)
+DEFAULT_SOUND = 'alert_sound'
+LEVEL_SOUNDS = {
+    'critical': 'alert_critical',
+    'warning': 'alert_warning',
+    'info': 'alert_info',
+}
+
+
+def _kivy_loader(path):
+    from kivy.core.audio import SoundLoader
+    return SoundLoader.load(path)
+
+
+class AudioRegistry:
+    """
+    音频资源注册表
+
+    音频文件路径只查找一次，解码后的播放器对象按名称缓存并反复使用，
+    找不到的资源也会被记住，不会在每次播放时重复探测文件系统。
+    """
+
+    def __init__(self, search_dirs=(AUDIO_DIR,), formats=AUDIO_FORMATS, default=DEFAULT_SOUND, loader=None):
+        """
+        初始化音频资源注册表
+
+        Args:
+            search_dirs: 查找音频文件的目录，按顺序查找
+            formats: 支持的音频格式
+            default: 默认警报音名称
+            loader: 加载函数，参数为文件路径，返回播放器对象；默认使用 Kivy 的 SoundLoader
+        """
+        self.search_dirs = tuple(search_dirs)
+        self.formats = tuple(formats)
+        self.default = default
+        self.loader = loader or _kivy_loader
+        self.plays = 0
+        self._paths = {}
+        self._sounds = {}
+        self._lock = threading.RLock()
+
+    def resolve(self, name):
+        """
+        查找音频文件路径，结果会被缓存
+
+        Args:
+            name: 音频名称(不含扩展名)或文件路径
+
+        Returns:
+            str: 文件路径，找不到时返回None
+        """
+        with self._lock:
+            if name in self._paths:
+                return self._paths[name]
+            path = None
+            if os.path.isfile(name):
+                path = name
+            else:
+                for directory in self.search_dirs:
+                    for fmt in self.formats:
+                        candidate = os.path.join(directory, f"{name}.{fmt}")
+                        if os.path.isfile(candidate):
+                            path = candidate
+                            break
+                    if path:
+                        break
+            self._paths[name] = path
+            return path
+
+    def sound_for(self, level=None):
+        """
+        返回警报级别对应的音频名称
+
+        Args:
+            level: 警报级别，None 表示默认警报音
+
+        Returns:
+            str: 该级别有专用音频时返回其名称，否则返回默认警报音名称
+        """
+        name = LEVEL_SOUNDS.get(level)
+        if name and self.resolve(name):
+            return name
+        return self.default
+
+    def get(self, name):
+        """
+        取得已解码的播放器对象，第一次使用时加载
+
+        Args:
+            name: 音频名称或文件路径
+
+        Returns:
+            播放器对象，找不到或加载失败时返回None
+        """
+        with self._lock:
+            if name in self._sounds:
+                return self._sounds[name]
+            path = self.resolve(name)
+            sound = None
+            if path:
+                try:
+                    sound = self.loader(path)
+                except Exception:
+                    sound = None
+            self._sounds[name] = sound
+            return sound
+
+    def preload(self, names=None):
+        """
+        预先加载音频，避免第一次警报时才解码
+
+        Args:
+            names: 要加载的音频名称，默认为默认警报音和各级别警报音
+
+        Returns:
+            int: 成功加载的音频数
+        """
+        if names is None:
+            names = (self.default,) + tuple(LEVEL_SOUNDS.values())
+        return sum(1 for name in names if self.get(name) is not None)
+
+    def play(self, name, loop=False):
+        """
+        播放音频
+
+        Args:
+            name: 音频名称或文件路径
+            loop: 是否循环播放
+
+        Returns:
+            bool: 是否开始播放
+        """
+        sound = self.get(name)
+        if sound is None:
+            return False
+        with self._lock:
+            if sound.state == 'play':
+                sound.stop()
+            sound.loop = loop
+            sound.play()
+            self.plays += 1
+        return True
+
+    def stop(self, name=None):
+        """
+        停止播放
+
+        Args:
+            name: 要停止的音频名称，None 表示全部
+        """
+        with self._lock:
+            sounds = [self._sounds.get(name)] if name is not None else list(self._sounds.values())
+            for sound in sounds:
+                if sound is not None and sound.state == 'play':
+                    sound.stop()
+
+    def stats(self):
+        """
+        返回注册表统计
+
+        Returns:
+            dict: 已加载和缺失的音频以及播放次数
+        """
+        with self._lock:
+            return {
+                'loaded': sorted(name for name, sound in self._sounds.items() if sound is not None),
+                'missing': sorted(name for name, path in self._paths.items() if path is None),
+                'plays': self.plays,
+            }
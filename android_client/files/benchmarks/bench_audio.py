@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+警报发声耗时测试
+
+比较每次警报都重新查找、解码音频(旧做法)与使用音频资源注册表缓存播放器
+两种方式下，从收到警报到开始发声的耗时。发声由效果调度器驱动，
+耗时取自 EffectsScheduler.stats()['start_latency_ms']。
+
+安装了 Kivy 时使用 SoundLoader 解码；否则用 wave 模块完整读取未压缩的音频数据，
+此时差异只反映文件查找和读取的开销，mp3/ogg 的真实解码开销需要在装有 Kivy 的环境中测量。
+结果中会注明使用的解码方式。
+
+用法:
+    python benchmarks/bench_audio.py --alerts 50 --seconds 2
+"""
+
+import argparse
+import math
+import os
+import struct
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import AUDIO_FORMATS, DEFAULT_SOUND, AudioRegistry
+from effects import CHANNEL_SOUND, EffectsBackend, EffectsScheduler, pulse_pattern
+
+
+class WaveSound:
+    """没有 Kivy 时使用的播放器，加载时读取全部采样"""
+
+    def __init__(self, path):
+        with wave.open(path, 'rb') as f:
+            self.frames = f.readframes(f.getnframes())
+        self.state = 'stop'
+        self.loop = False
+
+    def play(self):
+        self.state = 'play'
+
+    def stop(self):
+        self.state = 'stop'
+
+
+def select_loader():
+    try:
+        from kivy.core.audio import SoundLoader
+        return 'kivy', SoundLoader.load
+    except ImportError:
+        return 'wave', WaveSound
+
+
+def write_tone(path, seconds, rate=44100, freq=880):
+    """生成一段正弦波警报音"""
+    samples = (int(12000 * math.sin(2 * math.pi * freq * i / rate)) for i in range(int(seconds * rate)))
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(b''.join(struct.pack('<h', s) for s in samples))
+
+
+class ColdBackend(EffectsBackend):
+    """旧做法：每次发声都探测全部格式并重新解码"""
+
+    def __init__(self, audio_dir, loader):
+        self.audio_dir = audio_dir
+        self.loader = loader
+        self.player = None
+
+    def sound_path(self):
+        path = None
+        for fmt in AUDIO_FORMATS:
+            candidate = os.path.join(self.audio_dir, f"{DEFAULT_SOUND}.{fmt}")
+            if os.path.exists(candidate) and path is None:
+                path = candidate
+        return path
+
+    def sound(self, on, duration=0, asset=None):
+        if on:
+            self.player = self.loader(self.sound_path())
+            self.player.loop = True
+            self.player.play()
+        elif self.player:
+            self.player.stop()
+            self.player = None
+
+
+class CachedBackend(EffectsBackend):
+    """音频资源注册表：只解码一次，之后复用播放器"""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def sound(self, on, duration=0, asset=None):
+        if on:
+            self.registry.play(asset or DEFAULT_SOUND, loop=True)
+        else:
+            self.registry.stop(asset)
+
+
+def measure(backend, alerts, preload=None):
+    scheduler = EffectsScheduler(backend)
+    scheduler.start()
+    if preload:
+        preload()
+    latencies = []
+    try:
+        for _ in range(alerts):
+            scheduler.start_latency.clear()
+            received_at = time.monotonic()
+            scheduler.play(CHANNEL_SOUND, pulse_pattern(2, 0.5), repeat=None, asset=DEFAULT_SOUND,
+                           requested_at=received_at)
+            deadline = received_at + 5
+            while CHANNEL_SOUND not in scheduler.start_latency and time.monotonic() < deadline:
+                time.sleep(0.0005)
+            latencies.append(scheduler.start_latency.get(CHANNEL_SOUND, float('nan')))
+            scheduler.cancel()
+    finally:
+        scheduler.stop()
+    return latencies
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='警报发声耗时测试')
+    parser.add_argument('--alerts', type=int, default=50, help='模拟的警报次数')
+    parser.add_argument('--seconds', type=float, default=2, help='警报音时长(秒)')
+    args = parser.parse_args()
+
+    decoder, loader = select_loader()
+    with tempfile.TemporaryDirectory() as audio_dir:
+        write_tone(os.path.join(audio_dir, f"{DEFAULT_SOUND}.wav"), args.seconds)
+        registry = AudioRegistry((audio_dir,), loader=loader)
+
+        results = [
+            ('cold', measure(ColdBackend(audio_dir, loader), args.alerts)),
+            ('cached', measure(CachedBackend(registry), args.alerts, preload=registry.preload)),
+        ]
+
+    print(f"解码方式: {decoder}，警报音 {args.seconds} 秒，{args.alerts} 次警报")
+    print(f"{'mode':<8}{'p50_ms':>10}{'p99_ms':>10}{'max_ms':>10}")
+    for mode, latencies in results:
+        ms = [value * 1000 for value in latencies]
+        print(f"{mode:<8}{percentile(ms, 50):>10.3f}{percentile(ms, 99):>10.3f}{max(ms):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+消息编码对比测试
+
+对典型的警报、命令、批量消息和响应，分别用每种可用的编码(JSON，以及已安装 msgpack/cbor2 时的
+MessagePack/CBOR)测量编码和解码耗时、消息体字节数和带分帧的线上字节数，
+并把编码后的数据直接交给 NetworkManager.process_data，测量接收端每条消息的处理耗时(不经过套接字)。
+
+用法:
+    python benchmarks/bench_codecs.py --iterations 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from framing import FRAMING_LENGTH, FRAMING_NDJSON, StreamDecoder, encode_message
+from network import NetworkManager
+from wire_codecs import available_codecs, get_codec
+
+ALERT = {
+    'type': 'alert',
+    'level': 'critical',
+    'content': '数据库主节点 db-01 不可达，已持续 120 秒',
+    'id': '3f2a9c1e7b5d4e8fa0c6b2d1e9f87a43',
+    'params': {'message': '数据库主节点不可达', 'host': 'db-01', 'duration': 120},
+}
+COMMAND = {
+    'type': 'command',
+    'command': 'beep',
+    'params': {'duration': 2, 'repeat': 3},
+    'id': '9b1d2c3e4f5a6b7c8d9e0f1a2b3c4d5e',
+}
+BATCH = {
+    'type': 'batch',
+    'messages': [dict(ALERT, id=f"{index:032x}", level=('info', 'warning', 'critical')[index % 3])
+                 for index in range(20)],
+}
+RESPONSE = {'status': 'ok', 'message': '已处理', 'id': '3f2a9c1e7b5d4e8fa0c6b2d1e9f87a43'}
+
+PAYLOADS = (('alert', ALERT), ('command', COMMAND), ('batch20', BATCH), ('response', RESPONSE))
+
+
+def time_per_call(function, argument, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        function(argument)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def receive_cost(codec, message, iterations):
+    """接收端 process_data 每次调用的耗时(微秒)，每次调用处理一帧"""
+    manager = NetworkManager(batch_callback=lambda messages: None)
+    framing = FRAMING_LENGTH if codec.binary else FRAMING_NDJSON
+    data = encode_message(message, framing, codec)
+    decoder = StreamDecoder()
+    address = ('127.0.0.1', 50000)
+    manager.process_data(data, address, decoder)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        manager.process_data(data, address, decoder)
+    return (time.perf_counter() - started) / iterations * 1e6, decoder.codec.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description='消息编码对比测试')
+    parser.add_argument('--iterations', type=int, default=20000, help='每项测量的调用次数')
+    parser.add_argument('--codecs', nargs='+', default=available_codecs(), help='要测试的编码')
+    args = parser.parse_args()
+
+    codecs = [get_codec(name) for name in args.codecs]
+    print(f"可用的编码: {', '.join(available_codecs())}")
+    print(f"{'payload':<10}{'codec':<9}{'bytes':>7}{'wire':>7}{'ratio':>7}{'enc_us':>9}{'dec_us':>9}{'recv_us':>9}")
+    for name, message in PAYLOADS:
+        baseline = None
+        for codec in codecs:
+            payload = codec.encode(message)
+            if codec.decode(payload) != message:
+                raise RuntimeError(f"{codec.name} 编解码结果不一致")
+            wire = len(encode_message(message, FRAMING_LENGTH if codec.binary else FRAMING_NDJSON, codec))
+            baseline = baseline or len(payload)
+            encode_us = time_per_call(codec.encode, message, args.iterations)
+            decode_us = time_per_call(codec.decode, payload, args.iterations)
+            if name == 'response':
+                receive = '-'
+            else:
+                receive_us, negotiated = receive_cost(codec, message, args.iterations // 10 or 1)
+                if negotiated != codec.name:
+                    raise RuntimeError(f"协商结果 {negotiated} 与发送的编码 {codec.name} 不一致")
+                receive = f"{receive_us:.1f}"
+            print(f"{name:<10}{codec.name:<9}{len(payload):>7}{wire:>7}{len(payload) / baseline:>7.2f}"
+                  f"{encode_us:>9.2f}{decode_us:>9.2f}{receive:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+命令分发测试
+
+在已有命令之外再注册 --extra 条命令，比较两种分发方式执行一条内置命令的耗时：
+    chain     按命令名逐个比较字符串(改动前 handle_command/execute_command 的 if/elif 写法)，
+              新命令追加在末尾，排在后面的命令每次都要先比较前面所有命令
+    registry  CommandRegistry.execute，按命令名一次查表并检查参数类型
+
+处理函数不做任何操作，测量的是分发本身。
+
+用法:
+    python benchmarks/bench_commands.py --calls 200000 --extra 0 10 50 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from commands import CommandRegistry
+from messages import COMMAND_PARAMS
+
+BUILTIN = tuple(COMMAND_PARAMS)
+PARAMS = {'duration': 1, 'repeat': 2}
+
+
+def noop(params, message):
+    pass
+
+
+def make_chain(names):
+    """生成与 names 顺序相同的 if/elif 分发函数"""
+    lines = ['def dispatch(command, params):']
+    for index, name in enumerate(names):
+        lines.append(f"    {'if' if index == 0 else 'elif'} command == {name!r}:")
+        lines.append('        noop(params, None)')
+    namespace = {'noop': noop}
+    exec('\n'.join(lines), namespace)
+    return namespace['dispatch']
+
+
+def time_per_call(function, command, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        function(command, PARAMS)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='命令分发测试')
+    parser.add_argument('--calls', type=int, default=200000, help='每项测量的调用次数')
+    parser.add_argument('--extra', type=int, nargs='+', default=[0, 10, 50, 200], help='额外注册的命令数')
+    args = parser.parse_args()
+
+    print(f"{'extra':>6}{'command':>12}{'chain_us':>10}{'registry_us':>13}")
+    for extra in args.extra:
+        names = BUILTIN + tuple(f"custom_{index}" for index in range(extra))
+        chain = make_chain(names)
+        registry = CommandRegistry()
+        for name in names:
+            registry.register(name, noop)
+        # 第一条内置命令和最后注册的命令
+        for command in (names[0], names[-1]):
+            chain_us = time_per_call(chain, command, args.calls)
+            registry_us = time_per_call(registry.execute, command, args.calls)
+            print(f"{extra:>6}{command:>12}{chain_us:>10.3f}{registry_us:>13.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+UDP/组播警报测试
+
+在本进程内启动多个接收端(每个接收端一个 NetworkManager，同时监听TCP和组播)，
+分别用一个组播数据报和逐个TCP发送(send_message)把同一条警报送到全部接收端，
+输出首个接收端和最后一个接收端分发到处理函数的耗时(p50/p99)。
+
+随后验证组播通道的可靠性措施：发送方跳过序号时接收端统计的丢失数，
+每条消息重复发送时接收端只分发一次，以及接收端通过TCP发回的 delivery_ack 数。
+
+用法:
+    python benchmarks/bench_datagram.py --receivers 20 --rounds 200
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datagram import DEFAULT_GROUP, DatagramSender
+from network import NetworkManager
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def find_free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Receiver:
+    """一个接收端，记录每条警报分发到处理函数的时间"""
+
+    def __init__(self, udp_port, group, engine):
+        self.arrivals = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)
+        self.manager = NetworkManager(batch_callback=self.handle, engine=engine)
+        self.port = find_free_port()
+        if not self.manager.start_server('127.0.0.1', self.port):
+            raise RuntimeError("TCP监听启动失败")
+        if not self.manager.start_datagram('0.0.0.0', udp_port, group):
+            raise RuntimeError("UDP接收启动失败")
+
+    def handle(self, messages):
+        now = time.perf_counter()
+        with self.lock:
+            for message in messages:
+                key = message.get('content')
+                self.arrivals.setdefault(key, now)
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.done.notify_all()
+        return None
+
+    def wait(self, key, timeout=5):
+        with self.lock:
+            self.done.wait_for(lambda: key in self.arrivals, timeout)
+            return self.arrivals.get(key)
+
+    def stop(self):
+        self.manager.stop_server()
+
+
+def measure(receivers, rounds, send):
+    first, last, lost = [], [], 0
+    for number in range(rounds):
+        key = f"{send.__name__}-{number}"
+        started = time.perf_counter()
+        send({'type': 'alert', 'level': 'critical', 'content': key})
+        arrivals = [receiver.wait(key) for receiver in receivers]
+        received = [arrival for arrival in arrivals if arrival is not None]
+        lost += len(arrivals) - len(received)
+        if received:
+            first.append((min(received) - started) * 1000)
+            last.append((max(received) - started) * 1000)
+    return first, last, lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UDP/组播警报测试')
+    parser.add_argument('--receivers', type=int, default=20, help='接收端数量')
+    parser.add_argument('--rounds', type=int, default=200, help='每种方式发送的警报数')
+    parser.add_argument('--group', default=DEFAULT_GROUP, help='组播地址')
+    parser.add_argument('--engine', default='selectors', help='接收端的TCP传输引擎')
+    parser.add_argument('--repeat', type=int, default=3, help='可靠性测试中每条消息的发送次数')
+    args = parser.parse_args()
+
+    udp_port = find_free_port(socket.SOCK_DGRAM)
+    receivers = [Receiver(udp_port, args.group, args.engine) for _ in range(args.receivers)]
+    client = NetworkManager()
+    sender = DatagramSender(args.group, udp_port)
+    try:
+        def multicast(message):
+            sender.send(message)
+
+        def tcp_fanout(message):
+            for receiver in receivers:
+                client.send_message('127.0.0.1', receiver.port, message)
+
+        # 预热：建立TCP连接池中的连接
+        measure(receivers, 3, tcp_fanout)
+
+        print(f"{'method':<12}{'recv':>6}{'first_p50':>11}{'first_p99':>11}{'last_p50':>10}{'last_p99':>10}{'lost':>6}")
+        for send in (multicast, tcp_fanout):
+            first, last, lost = measure(receivers, args.rounds, send)
+            print(f"{send.__name__:<12}{len(receivers):>6}{percentile(first, 50):>11.3f}{percentile(first, 99):>11.3f}"
+                  f"{percentile(last, 50):>10.3f}{percentile(last, 99):>10.3f}{lost:>6}")
+
+        # 可靠性：跳过序号模拟丢包，重复发送验证去重，delivery_ack 通过TCP发回
+        acks = []
+        ack_lock = threading.Lock()
+
+        def on_ack(message):
+            if message.get('type') == 'delivery_ack':
+                with ack_lock:
+                    acks.append(message)
+
+        ack_manager = NetworkManager(callback=on_ack, engine=args.engine)
+        ack_port = find_free_port()
+        ack_manager.start_server('0.0.0.0', ack_port)
+        reliable = DatagramSender(args.group, udp_port, repeat=args.repeat, ack_port=ack_port)
+        try:
+            sent, skipped = 0, 0
+            for number in range(20):
+                if number % 5 == 4:
+                    reliable.seq += 1
+                    skipped += 1
+                reliable.send({'type': 'alert', 'level': 'warning', 'content': f"reliable-{number}"})
+                sent += 1
+            for receiver in receivers:
+                receiver.wait(f"reliable-{sent - 1}")
+            deadline = time.time() + 10
+            while len(acks) < sent * len(receivers) and time.time() < deadline:
+                time.sleep(0.05)
+
+            dispatched = [sum(count for key, count in receiver.counts.items() if key.startswith('reliable-'))
+                          for receiver in receivers]
+            missing = [receiver.manager.datagram_stats()['missing'] for receiver in receivers]
+            print(f"\n每个接收端: 发送 {sent} 条 x {args.repeat} 次，分发 {min(dispatched)}-{max(dispatched)} 条；"
+                  f"跳过 {skipped} 个序号，发现丢失 {min(missing)}-{max(missing)} 条")
+            print(f"delivery_ack: 收到 {len(acks)} / {sent * len(receivers)}")
+        finally:
+            reliable.close()
+            ack_manager.stop_server()
+    finally:
+        sender.close()
+        for receiver in receivers:
+            receiver.stop()
+
+
+if __name__ == '__main__':
+    main()
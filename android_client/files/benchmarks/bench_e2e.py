@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+端到端警报延迟测试
+
+在无界面环境中运行警报处理流程，用负载生成器(loadgen.py)从本机发送警报，测量
+从TCP写出消息到消息被分发处理、以及到综合警报启动所经过的时间。
+
+测试目标(都运行在 network.AlertTransport 上，可指定传输引擎):
+    app      AlertClientApp 的 AppResponseHandler 和 start_alert 流程
+    network  ResponseHandler.handle_batch
+
+硬件效果使用不做任何操作的 EffectsBackend，Android 调用使用桌面桥接，app 目标的警报日志
+写入临时目录，日志回调由主线程驱动的 Kivy Clock 执行。每个场景输出分发延迟和警报启动延迟的
+p50/p99、吞吐量、峰值线程数、峰值常驻内存增量以及被分发队列丢弃的消息数。
+
+用法:
+    python benchmarks/bench_e2e.py --senders 1 100 1000 --scenarios burst slow
+    python benchmarks/bench_e2e.py --targets app network --engines thread asyncio --json result.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# 不创建窗口，不解析命令行参数
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_WINDOW', 'none')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from kivy.clock import Clock
+
+from bench_listener import find_free_port, raise_fd_limit, rss_kb
+from effects import EffectsBackend, EffectsScheduler
+from loadgen import SCENARIOS, connect_senders, run_load
+from messages import is_message
+
+
+def message_id(message):
+    params = message.get('params') if is_message(message) else None
+    return params.get('id') if isinstance(params, dict) else None
+
+
+class Recorder:
+    """记录每条消息的发送、分发和警报启动时间"""
+
+    def __init__(self):
+        self.sent = {}
+        self.dispatched = {}
+        self.alerted = {}
+        self.lock = threading.Lock()
+
+    def on_send(self, mid, at):
+        self.sent[mid] = at
+
+    def mark(self, table, messages):
+        now = time.perf_counter()
+        with self.lock:
+            for message in messages:
+                mid = message_id(message)
+                if mid is not None:
+                    table.setdefault(mid, now)
+
+    def latencies_ms(self, table):
+        with self.lock:
+            return [(at - self.sent[mid]) * 1000 for mid, at in table.items() if mid in self.sent]
+
+
+class ThreadSampler:
+    """后台采样线程数和常驻内存的峰值"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_rss = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # 不计入采样线程自身
+            self.peak_threads = max(self.peak_threads, threading.active_count() - 1)
+            self.peak_rss = max(self.peak_rss, rss_kb())
+            self._stop.wait(self.interval)
+
+
+class _NullLogView:
+    """代替界面日志视图，只统计行数"""
+
+    def __init__(self):
+        self.lines = 0
+
+    def append_lines(self, lines):
+        self.lines += len(lines)
+
+
+class AppTarget:
+    """AlertClientApp 的消息处理流程，不构建界面"""
+
+    def __init__(self, recorder, engine='thread'):
+        import main
+
+        class RecordingHandler(main.AppResponseHandler):
+            def handle_batch(self, messages):
+                recorder.mark(recorder.dispatched, messages)
+                return super().handle_batch(messages)
+
+        # 警报日志和运行统计写入临时目录
+        self.data_dir = tempfile.TemporaryDirectory()
+        data_dir = self.data_dir.name
+
+        class HeadlessApp(main.AlertClientApp):
+            response_handler_class = RecordingHandler
+            user_data_dir = data_dir
+
+            def start_alert(self, params=None, received_at=None, peer=None, message_id=None):
+                recorder.mark(recorder.alerted, [{'params': params or {}}])
+                super().start_alert(params, received_at=received_at, peer=peer, message_id=message_id)
+
+        self.app = HeadlessApp()
+        self.app.setup_alert_path(effects_backend=EffectsBackend(), engine=engine)
+        self.app.metrics.stop_dump()
+        self.app.log_area = _NullLogView()
+        self.port = find_free_port()
+        if not self.app.start_listener('127.0.0.1', self.port):
+            raise RuntimeError(f"引擎 {engine} 启动失败")
+
+    def dropped(self):
+        return self.app.dispatcher.stats()['dropped']
+
+    def close(self):
+        self.app.transport.close()
+        self.app.effects.stop()
+        if self.app.journal is not None:
+            self.app.journal.close()
+        self.data_dir.cleanup()
+
+
+class NetworkTarget:
+    """AlertTransport + ResponseHandler"""
+
+    def __init__(self, recorder, engine='thread'):
+        from network import AlertTransport
+        from response_handler import ResponseHandler
+
+        class RecordingHandler(ResponseHandler):
+            def handle_batch(self, messages):
+                recorder.mark(recorder.dispatched, messages)
+                return super().handle_batch(messages)
+
+        self.effects = EffectsScheduler(EffectsBackend())
+        self.effects.start()
+        self.log_lines = 0
+        self.handler = RecordingHandler(log_callback=self._log, effects=self.effects)
+        self.transport = AlertTransport(self.handler, engine=engine)
+        self.port = find_free_port()
+        if not self.transport.start('127.0.0.1', self.port):
+            raise RuntimeError(f"引擎 {engine} 启动失败")
+
+    def _log(self, message):
+        self.log_lines += 1
+
+    def dropped(self):
+        return self.transport.dispatcher.stats()['dropped']
+
+    def close(self):
+        self.transport.close()
+        self.effects.stop()
+
+
+TARGETS = {
+    'app': AppTarget,
+    'network': NetworkTarget,
+}
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_scenario(target_name, engine, scenario, senders, messages, size, timeout):
+    recorder = Recorder()
+    target = TARGETS[target_name](recorder, engine)
+    if scenario == 'oversized':
+        # 大消息只发少量，避免千连接时占用过多内存
+        messages = max(1, messages // 10)
+    total = senders * messages
+    try:
+        base_threads = threading.active_count()
+        base_rss = rss_kb()
+        socks = connect_senders('127.0.0.1', target.port, senders)
+        try:
+            with ThreadSampler() as sampler:
+                load = run_load(socks, messages, scenario, size=size, on_send=recorder.on_send, drain=0)
+                # 驱动 Kivy Clock 执行日志回调，直到全部消息被分发或丢弃
+                deadline = time.perf_counter() + timeout
+                while (len(recorder.dispatched) + target.dropped() < total
+                       and time.perf_counter() < deadline):
+                    Clock.tick()
+                    time.sleep(0.001)
+                Clock.tick()
+        finally:
+            for sock in socks:
+                sock.close()
+
+        dispatch = recorder.latencies_ms(recorder.dispatched)
+        alert = recorder.latencies_ms(recorder.alerted)
+        first_sent = min(recorder.sent.values()) if recorder.sent else 0
+        last_dispatched = max(recorder.dispatched.values()) if recorder.dispatched else first_sent
+        span = last_dispatched - first_sent
+        return {
+            'target': target_name,
+            'engine': engine or '-',
+            'scenario': scenario,
+            'senders': senders,
+            'messages': total,
+            'dispatched': len(recorder.dispatched),
+            'dropped': target.dropped(),
+            'dispatch_p50_ms': percentile(dispatch, 50),
+            'dispatch_p99_ms': percentile(dispatch, 99),
+            'alert_p50_ms': percentile(alert, 50),
+            'alert_p99_ms': percentile(alert, 99),
+            'throughput_msg_s': len(recorder.dispatched) / span if span > 0 else None,
+            'send_s': load['elapsed_s'],
+            'peak_threads': sampler.peak_threads,
+            'threads_delta': sampler.peak_threads - base_threads,
+            'rss_delta_kb': sampler.peak_rss - base_rss,
+        }
+    finally:
+        target.close()
+
+
+def fmt(value, width=9, digits=2):
+    return f"{value:>{width}.{digits}f}" if value is not None else f"{'-':>{width}}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端警报延迟测试')
+    parser.add_argument('--targets', nargs='+', choices=sorted(TARGETS), default=['app', 'network'], help='测试目标')
+    parser.add_argument('--engines', nargs='+', default=['thread', 'asyncio', 'selectors'], help='传输引擎')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS), help='发送场景')
+    parser.add_argument('--senders', nargs='+', type=int, default=[1, 100, 1000], help='并发发送连接数')
+    parser.add_argument('--messages', type=int, default=20, help='每个连接发送的消息数')
+    parser.add_argument('--size', type=int, default=64 * 1024, help='oversized 场景的消息大小(字节)')
+    parser.add_argument('--timeout', type=float, default=60, help='每个场景等待分发完成的最长时间(秒)')
+    parser.add_argument('--json', help='把结果写入JSON文件，便于比较不同版本')
+    args = parser.parse_args()
+
+    raise_fd_limit(max(args.senders) * 2 + 256)
+
+    header = (f"{'target':<8}{'engine':<10}{'scenario':<10}{'senders':>8}{'msgs':>7}{'disp':>7}{'drop':>6}"
+              f"{'p50_ms':>9}{'p99_ms':>9}{'alert50':>9}{'alert99':>9}{'msg/s':>9}{'threads':>8}{'rss+KB':>8}")
+    print(header)
+    results = []
+    for target_name in args.targets:
+        for engine in args.engines:
+            for scenario in args.scenarios:
+                for senders in args.senders:
+                    r = run_scenario(target_name, engine, scenario, senders, args.messages, args.size, args.timeout)
+                    results.append(r)
+                    print(f"{r['target']:<8}{r['engine']:<10}{r['scenario']:<10}{r['senders']:>8}{r['messages']:>7}"
+                          f"{r['dispatched']:>7}{r['dropped']:>6}"
+                          f"{fmt(r['dispatch_p50_ms'])}{fmt(r['dispatch_p99_ms'])}"
+                          f"{fmt(r['alert_p50_ms'])}{fmt(r['alert_p99_ms'])}"
+                          f"{fmt(r['throughput_msg_s'], digits=0)}{r['peak_threads']:>8}{r['rss_delta_kb']:>8}",
+                          flush=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+警报日志写入与查询测试
+
+向临时目录中的警报日志(journal.AlertJournal)分轮写入警报，每轮输出 record 调用耗时的
+p50/p99 (即处理消息的线程因写日志多花的时间)、写入吞吐量和写完本轮所需的时间，
+观察表中记录增多后写入是否变慢。写完后按时间倒序逐页翻完全部记录，并分别按级别、
+来源地址筛选翻页，输出第一页、最后一页和每页查询耗时的 p50/p99。
+
+用法:
+    python benchmarks/bench_journal.py --records 100000 --rounds 10
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import AlertJournal
+
+LEVELS = ('info', 'warning', 'critical')
+
+
+def make_alert(index, hosts):
+    return {
+        'type': 'alert',
+        'level': random.choice(LEVELS),
+        'content': f"主机 {index % hosts} 磁盘使用率 {random.randint(80, 99)}%",
+        'source': {'ip': f"10.0.{index % hosts // 256}.{index % hosts % 256}", 'port': 40000 + index % 1000},
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def ingest(journal, records, rounds, hosts):
+    print(f"{'round':>6}{'rows':>9}{'p50_us':>9}{'p99_us':>9}{'rec/s':>10}{'flush_ms':>10}")
+    per_round = records // rounds
+    index = 0
+    for number in range(1, rounds + 1):
+        alerts = [make_alert(index + i, hosts) for i in range(per_round)]
+        index += per_round
+        latencies = []
+        started = time.perf_counter()
+        for alert in alerts:
+            before = time.perf_counter()
+            journal.record(alert)
+            latencies.append((time.perf_counter() - before) * 1e6)
+        recorded = time.perf_counter()
+        if not journal.flush(timeout=60):
+            raise RuntimeError("写入超时")
+        flushed = time.perf_counter()
+        print(f"{number:>6}{index:>9}{percentile(latencies, 50):>9.1f}{percentile(latencies, 99):>9.1f}"
+              f"{per_round / (flushed - started):>10.0f}{(flushed - recorded) * 1000:>10.1f}")
+
+
+def page_through(journal, page_size, **filters):
+    latencies = []
+    cursor = None
+    rows = 0
+    while True:
+        started = time.perf_counter()
+        page = journal.query(before=cursor, limit=page_size, **filters)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if not page:
+            break
+        rows += len(page)
+        cursor = (page[-1]['ts'], page[-1]['id'])
+    return rows, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='警报日志写入与查询测试')
+    parser.add_argument('--records', type=int, default=100000, help='写入的警报数')
+    parser.add_argument('--rounds', type=int, default=10, help='分几轮写入')
+    parser.add_argument('--hosts', type=int, default=500, help='模拟的监控主机数')
+    parser.add_argument('--page-size', type=int, default=50, help='每页记录数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        journal = AlertJournal(os.path.join(data_dir, 'alerts.db'))
+        journal.start()
+        try:
+            ingest(journal, args.records, args.rounds, args.hosts)
+            stats = journal.stats()
+            print(f"写入 {stats['written']} 条，丢弃 {stats['dropped']} 条，{stats['batches']} 个事务，"
+                  f"数据库 {os.path.getsize(journal.path) // 1024} KB")
+
+            print(f"\n{'query':<18}{'rows':>8}{'pages':>7}{'first_ms':>10}{'last_ms':>10}{'p50_ms':>9}{'p99_ms':>9}")
+            queries = [
+                ('all', {}),
+                ('level=critical', {'level': 'critical'}),
+                ('source_ip', {'source_ip': '10.0.0.7'}),
+            ]
+            for name, filters in queries:
+                rows, latencies = page_through(journal, args.page_size, **filters)
+                print(f"{name:<18}{rows:>8}{len(latencies):>7}{latencies[0]:>10.3f}{latencies[-1]:>10.3f}"
+                      f"{percentile(latencies, 50):>9.3f}{percentile(latencies, 99):>9.3f}")
+            started = time.perf_counter()
+            total = journal.count(level='critical')
+            print(f"count(level=critical) = {total}，{(time.perf_counter() - started) * 1000:.3f} ms")
+        finally:
+            journal.close()
+
+
+if __name__ == '__main__':
+    main()
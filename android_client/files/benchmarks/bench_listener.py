@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+监听引擎负载测试
+
+对每种传输引擎建立大量空闲并发连接，记录线程数和常驻内存(RSS)，
+并在所有连接上各发送一条消息，验证引擎在高连接数下仍能正常处理。
+
+用法:
+    python benchmarks/bench_listener.py --connections 2000 --engines thread asyncio selectors
+"""
+
+import argparse
+import json
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network import NetworkManager
+
+
+def rss_kb():
+    """读取当前进程常驻内存(KB)，非Linux平台退化为峰值内存"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def raise_fd_limit(needed):
+    """尽量提高文件描述符上限，每个连接在本进程内占用两个描述符"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = min(hard, max(soft, needed))
+    if target > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return target
+
+
+def run_scenario(engine, connections):
+    received = []
+    lock = threading.Lock()
+
+    def callback(message):
+        if message.get('type') == 'alert':
+            with lock:
+                received.append(message)
+
+    manager = NetworkManager(callback=callback, engine=engine)
+    port = find_free_port()
+    if not manager.start_server('127.0.0.1', port):
+        raise RuntimeError(f"引擎 {engine} 启动失败")
+
+    base_threads = threading.active_count()
+    base_rss = rss_kb()
+
+    clients = []
+    started = time.perf_counter()
+    for _ in range(connections):
+        client = socket.create_connection(('127.0.0.1', port), timeout=10)
+        clients.append(client)
+
+    # 等待服务端登记全部连接
+    deadline = time.time() + 30
+    while manager.connection_count() < connections and time.time() < deadline:
+        time.sleep(0.05)
+    connect_time = time.perf_counter() - started
+
+    idle_threads = threading.active_count()
+    idle_rss = rss_kb()
+
+    # 每个连接发送一条警报并读取响应
+    payload = json.dumps({"type": "alert", "level": "info", "content": "load"}).encode('utf-8')
+    started = time.perf_counter()
+    for client in clients:
+        client.sendall(payload)
+    for client in clients:
+        client.recv(1024)
+    roundtrip_time = time.perf_counter() - started
+
+    for client in clients:
+        client.close()
+    manager.stop_server()
+
+    return {
+        'engine': engine,
+        'connections': connections,
+        'connect_s': connect_time,
+        'roundtrip_s': roundtrip_time,
+        'threads_delta': idle_threads - base_threads,
+        'rss_delta_kb': idle_rss - base_rss,
+        'rss_per_conn_b': (idle_rss - base_rss) * 1024 // max(connections, 1),
+        'received': len(received),
+    }
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='监听引擎负载测试')
+    parser.add_argument('--connections', type=int, default=1000, help='并发空闲连接数')
+    parser.add_argument('--engines', nargs='+', default=['thread', 'asyncio', 'selectors'], help='要测试的引擎')
+    args = parser.parse_args()
+
+    limit = raise_fd_limit(args.connections * 2 + 64)
+    if limit < args.connections * 2 + 64:
+        print(f"文件描述符上限 {limit} 不足，连接数可能受限")
+
+    header = f"{'engine':<10}{'conns':>8}{'connect_s':>11}{'rtt_all_s':>11}{'threads+':>10}{'rss+KB':>10}{'B/conn':>9}{'recv':>7}"
+    print(header)
+    for engine in args.engines:
+        r = run_scenario(engine, args.connections)
+        print(f"{r['engine']:<10}{r['connections']:>8}{r['connect_s']:>11.3f}{r['roundtrip_s']:>11.3f}"
+              f"{r['threads_delta']:>10}{r['rss_delta_kb']:>10}{r['rss_per_conn_b']:>9}{r['received']:>7}")
+
+
+if __name__ == '__main__':
+    main()
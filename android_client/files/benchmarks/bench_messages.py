@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+消息模型测试
+
+对典型的警报和命令消息比较两种表示：
+    dict     解码出的字典，添加来源信息和接收时间(改动前在分发队列和处理器之间传递的形式)
+    message  parse_message 转换出的 __slots__ 消息对象
+
+输出每条消息占用的内存(tracemalloc，同时保留 --count 条消息)、转换耗时、
+计算分发优先级的耗时，以及处理器按消息对象处理一条消息的耗时(效果后端不做任何操作)。
+
+用法:
+    python benchmarks/bench_messages.py --count 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import AlertDeduplicator
+from dispatch_queue import message_priority
+from effects import EffectsBackend, EffectsScheduler
+from messages import parse_message
+from response_handler import ResponseHandler
+
+SOURCE = {'ip': '192.168.1.10', 'port': 50000}
+PAYLOADS = (
+    ('alert', {'type': 'alert', 'level': 'critical', 'content': '数据库主节点 db-01 不可达',
+               'id': '3f2a9c1e7b5d4e8fa0c6b2d1e9f87a43', 'params': {'message': '数据库主节点不可达'}}),
+    ('command', {'type': 'command', 'command': 'flash', 'params': {'count': 2},
+                 'id': '9b1d2c3e4f5a6b7c8d9e0f1a2b3c4d5e'}),
+)
+
+
+def decode(text, index):
+    message = json.loads(text)
+    message['id'] = f"{index:032x}"
+    message['source'] = SOURCE
+    message['received_at'] = time.monotonic()
+    return message
+
+
+def memory_per_message(text, count, convert):
+    """同时保留 count 条消息时每条消息占用的字节数"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = [convert(decode(text, index)) for index in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del messages
+    return used / count
+
+
+def time_per_call(function, items):
+    started = time.perf_counter()
+    for item in items:
+        function(item)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='消息模型测试')
+    parser.add_argument('--count', type=int, default=20000, help='每项测量的消息数')
+    args = parser.parse_args()
+
+    effects = EffectsScheduler(EffectsBackend())
+    effects.start()
+    # 不去重、不输出日志，测量的是处理器本身
+    handler = ResponseHandler(deduplicator=AlertDeduplicator(ttl=0), effects=effects)
+    handler.log = lambda message: None
+
+    print(f"{'payload':<9}{'form':<9}{'bytes':>8}{'parse_us':>10}{'prio_us':>9}{'handle_us':>11}")
+    try:
+        for name, payload in PAYLOADS:
+            text = json.dumps(payload)
+            dicts = [decode(text, index) for index in range(args.count)]
+            parsed = [parse_message(message) for message in dicts]
+            for form, items, convert in (('dict', dicts, lambda message: message),
+                                         ('message', parsed, parse_message)):
+                size = memory_per_message(text, args.count, convert)
+                parse_us = time_per_call(parse_message, dicts) if form == 'message' else 0
+                priority_us = time_per_call(message_priority, items)
+                handle_us = time_per_call(handler.handle_message, parsed) if form == 'message' else None
+                handle = '-' if handle_us is None else f"{handle_us:.2f}"
+                print(f"{name:<9}{form:<9}{size:>8.0f}{parse_us:>10.2f}{priority_us:>9.3f}{handle:>11}")
+    finally:
+        effects.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+接收路径内存分配测试
+
+通过 socketpair 发送警报，对比两种接收方式：
+    recv       每次 recv 分配新的字节串，写入解码器后取出帧的字节串副本，再解码为文本(改动前引擎的做法)
+    recv_into  recv_into 直接读入连接解码器的缓冲区，帧是指向缓冲区的 memoryview，每帧只解码一次
+
+分两个阶段测量：
+    frame      只做接收、分帧和文本解码，即改动涉及的部分
+    pipeline   经过 NetworkManager(process_data / process_received)完整处理，分发回调不做任何处理
+输出吞吐量，以及用 tracemalloc 测得的每次读取的临时分配峰值(读取和处理过程中比处理前多占用的
+最大字节数)、每条消息的平均峰值和测试结束后仍保留的字节数。
+
+用法:
+    python benchmarks/bench_receive.py --messages 20000
+    python benchmarks/bench_receive.py --messages 20000 --recv-size 1024 --framing length
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from framing import FRAMING_LENGTH, FRAMING_NDJSON, StreamDecoder, encode_message
+from network import NetworkManager
+
+ALERT = {
+    'type': 'alert',
+    'level': 'critical',
+    'content': '数据库主节点 db-01 不可达，已持续 120 秒',
+    'params': {'message': '数据库主节点不可达', 'host': 'db-01', 'duration': 120},
+}
+MODES = ('recv', 'recv_into')
+STAGES = ('frame', 'pipeline')
+ADDRESS = ('127.0.0.1', 50000)
+
+
+def send_all(sock, data):
+    sock.sendall(data)
+    sock.shutdown(socket.SHUT_WR)
+
+
+def receive_step(mode, stage, sock, recv_size, decoder, manager):
+    """读取一次并处理，返回处理的消息数，对端已关闭时返回None"""
+    if mode == 'recv':
+        data = sock.recv(recv_size)
+        if not data:
+            return None
+        if stage == 'pipeline':
+            manager.process_data(data, ADDRESS, decoder)
+            return 0
+        texts = [frame.decode('utf-8') for frame in decoder.feed(data)]
+    else:
+        size = sock.recv_into(decoder.get_buffer(recv_size), recv_size)
+        if not size:
+            return None
+        if stage == 'pipeline':
+            manager.process_received(size, ADDRESS, decoder)
+            return 0
+        texts = [str(frame, 'utf-8') for frame in decoder.commit(size)]
+    return len(texts)
+
+
+def run(mode, stage, stream, recv_size, trace):
+    """
+    接收一遍数据
+
+    Returns:
+        tuple: (处理的消息数, 读取次数, 耗时秒, 每次读取的临时分配峰值列表, 结束后保留的字节数)
+    """
+    received = []
+    manager = NetworkManager(batch_callback=lambda messages: received.append(len(messages)))
+    decoder = StreamDecoder(buffer_size=recv_size)
+    reader, writer = socket.socketpair()
+    sender = threading.Thread(target=send_all, args=(writer, stream), daemon=True)
+    peaks = []
+    reads = 0
+    processed = 0
+    sender.start()
+    if trace:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    try:
+        while True:
+            if trace:
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+            count = receive_step(mode, stage, reader, recv_size, decoder, manager)
+            if count is None:
+                break
+            processed += count
+            reads += 1
+            if trace:
+                peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        elapsed = time.perf_counter() - started
+        retained = 0
+        if trace:
+            retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        if trace:
+            tracemalloc.stop()
+        sender.join()
+        reader.close()
+        writer.close()
+    return processed + sum(received), reads, elapsed, peaks, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description='接收路径内存分配测试')
+    parser.add_argument('--messages', type=int, default=20000, help='发送的警报数')
+    parser.add_argument('--recv-size', type=int, default=4096, help='每次读取的最大字节数')
+    parser.add_argument('--framing', choices=(FRAMING_NDJSON, FRAMING_LENGTH), default=FRAMING_NDJSON,
+                        help='分帧方式')
+    parser.add_argument('--rounds', type=int, default=3, help='吞吐量测量次数，取最好的一次')
+    args = parser.parse_args()
+
+    stream = b''.join(encode_message(dict(ALERT, seq=index), args.framing) for index in range(args.messages))
+    print(f"{args.messages} 条警报，共 {len(stream)} 字节，每次最多读取 {args.recv_size} 字节")
+    print(f"{'stage':<10}{'mode':<11}{'reads':>7}{'msgs/s':>10}{'peak_B/read':>13}{'max_B/read':>12}"
+          f"{'peak_B/msg':>12}{'retained_B':>12}")
+    for stage in STAGES:
+        for mode in MODES:
+            best = None
+            for _ in range(args.rounds):
+                processed, reads, elapsed, _, _ = run(mode, stage, stream, args.recv_size, trace=False)
+                if processed != args.messages:
+                    raise RuntimeError(f"{stage}/{mode} 只处理了 {processed}/{args.messages} 条警报")
+                best = elapsed if best is None else min(best, elapsed)
+            _, reads, _, peaks, retained = run(mode, stage, stream, args.recv_size, trace=True)
+            print(f"{stage:<10}{mode:<11}{reads:>7}{args.messages / best:>10.0f}{sum(peaks) / len(peaks):>13.0f}"
+                  f"{max(peaks):>12}{sum(peaks) / args.messages:>12.1f}{retained:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+中继转发测试
+
+在本进程内启动多个下游接收端(每个接收端一个 NetworkManager)，分别用逐个发送(send_message 循环)
+和 relay.FanoutRelay 把同一条警报送到全部接收端，输出每种方式的总耗时、每个设备耗时的 p50/p99
+和成功/失败数。本机回环上往返时间几乎为零，--rtt 让每个接收端处理消息前等待指定毫秒数，
+模拟无线网络的往返时间。--dead 加入若干不可达的下游地址(默认 TEST-NET 地址，连接会一直等到超时)，
+观察不可达设备对其余设备的影响。
+
+用法:
+    python benchmarks/bench_relay.py --peers 200 --rtt 20 --dead 5 --rounds 5
+"""
+
+import argparse
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network import NetworkManager
+from pool import ConnectionPool
+from relay import DEFAULT_WORKERS, FanoutRelay
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def sequential(peers, message, send):
+    results = {}
+    started = time.perf_counter()
+    for host, port in peers:
+        before = time.perf_counter()
+        response = send(host, port, message)
+        results[f"{host}:{port}"] = {
+            'status': response.get('status'),
+            'ms': (time.perf_counter() - before) * 1000,
+        }
+    delivered = sum(1 for result in results.values() if result['status'] == 'ok')
+    return {
+        'peers': len(peers),
+        'delivered': delivered,
+        'failed': len(peers) - delivered,
+        'elapsed_ms': (time.perf_counter() - started) * 1000,
+        'results': results,
+    }
+
+
+def print_row(name, report):
+    times = [result['ms'] for result in report['results'].values()]
+    print(f"{name:<12}{report['peers']:>7}{report['delivered']:>7}{report['failed']:>7}"
+          f"{report['elapsed_ms']:>12.1f}{percentile(times, 50):>10.2f}{percentile(times, 99):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='中继转发测试')
+    parser.add_argument('--peers', type=int, default=200, help='下游接收端数量')
+    parser.add_argument('--rtt', type=float, default=0, help='模拟的往返时间(毫秒)')
+    parser.add_argument('--dead', type=int, default=0, help='不可达的下游地址数')
+    parser.add_argument('--dead-host', default='192.0.2.1', help='不可达地址')
+    parser.add_argument('--rounds', type=int, default=5, help='每种方式的发送轮数')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='转发线程数')
+    parser.add_argument('--timeout', type=float, default=5, help='连接超时(秒)')
+    parser.add_argument('--engine', default='selectors', help='接收端的传输引擎')
+    parser.add_argument('--skip-sequential', action='store_true', help='不测试逐个发送')
+    args = parser.parse_args()
+
+    def delayed(messages):
+        time.sleep(args.rtt / 1000)
+        return None
+
+    receivers = []
+    peers = []
+    for _ in range(args.peers):
+        manager = NetworkManager(engine=args.engine, batch_callback=delayed if args.rtt else None)
+        port = find_free_port()
+        if not manager.start_server('127.0.0.1', port):
+            raise RuntimeError("接收端启动失败")
+        receivers.append(manager)
+        peers.append(('127.0.0.1', port))
+    peers.extend((args.dead_host, 9000 + index) for index in range(args.dead))
+
+    sender = NetworkManager(pool=ConnectionPool(timeout=args.timeout))
+    relay = FanoutRelay(sender.send_message, peers, max_workers=args.workers)
+    relay.start()
+    try:
+        print(f"{'method':<12}{'peers':>7}{'ok':>7}{'failed':>7}{'elapsed_ms':>12}{'p50_ms':>10}{'p99_ms':>10}")
+        for number in range(args.rounds):
+            message = {'type': 'alert', 'level': 'critical', 'content': f"relay-{number}"}
+            if not args.skip_sequential:
+                print_row('sequential', sequential(peers, dict(message, id=f"seq-{number}"), sender.send_message))
+            print_row('fanout', relay.relay(dict(message, id=f"fan-{number}")))
+    finally:
+        relay.stop()
+        for manager in receivers:
+            manager.stop_server()
+
+
+if __name__ == '__main__':
+    main()
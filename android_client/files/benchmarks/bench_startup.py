@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+冷启动测试
+
+两部分:
+    导入耗时  用 python -X importtime 分别导入 network、response_handler 和 main，
+              输出每个模块的累计导入耗时(多次取最小值)以及 main 中自身耗时最多的导入。
+    监听耗时  在子进程中按两种顺序启动无界面的 AlertClientApp，父进程从启动子进程开始
+              反复连接并发送警报，测量第一条警报得到确认的时间(监听就绪)和界面部分加载完成的时间。
+              listener-first 是 main.py 现在的顺序：先初始化警报通路并监听，再加载界面组件、
+              字体和 androidhelper；ui-first 先加载这些再监听，即改动之前导入 main 时的顺序。
+
+无界面环境中没有窗口，设备上创建窗口和 OpenGL 上下文的时间可用 --window-ms 模拟，
+该时间计入界面部分。
+
+用法:
+    python benchmarks/bench_startup.py --rounds 10
+    python benchmarks/bench_startup.py --rounds 10 --window-ms 800 --skip-profile
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# 不创建窗口，不解析命令行参数；子进程继承这些环境变量
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_WINDOW', 'none')
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILE_MODULES = ('network', 'response_handler', 'main')
+ORDERS = ('listener-first', 'ui-first')
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def import_profile(module):
+    """
+    导入一个模块并解析 -X importtime 的输出
+
+    Returns:
+        list: (模块名, 自身耗时微秒, 累计耗时微秒)，最后一项为被导入的模块本身
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            cwd=APP_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2))))
+    return rows
+
+
+def profile(rounds, top):
+    print(f"{'module':<18}{'import_ms':>10}")
+    heaviest = None
+    for module in PROFILE_MODULES:
+        best = None
+        for _ in range(rounds):
+            rows = import_profile(module)
+            if best is None or rows[-1][2] < best[-1][2]:
+                best = rows
+        print(f"{module:<18}{best[-1][2] / 1000:>10.1f}")
+        heaviest = best
+    print(f"\nmain 中自身耗时最多的 {top} 个导入:")
+    for name, self_us, cumulative_us in sorted(heaviest, key=lambda row: -row[1])[:top]:
+        print(f"  {name:<40}{self_us / 1000:>8.1f} ms (累计 {cumulative_us / 1000:.1f} ms)")
+
+
+def child(order, port, window_ms):
+    """子进程：按指定顺序启动应用，界面部分加载完成后输出 READY，收到 STOP 后退出"""
+    sys.path.insert(0, APP_DIR)
+    import main
+
+    def load_ui():
+        # build 中加载的界面组件、窗口和字体，以及界面显示后预热的音频目录和 androidhelper
+        from kivy.core.window import Window
+        from kivy.uix.button import Button
+        from kivy.uix.label import Label
+        from kivy.uix.popup import Popup
+        from kivy.uix.textinput import TextInput
+        from log_view import HistoryView, LogView
+        main.setup_fonts()
+        main.ensure_audio_dir()
+        main.get_droid()
+        time.sleep(window_ms / 1000)
+
+    data_dir = tempfile.TemporaryDirectory()
+
+    class BenchApp(main.AlertClientApp):
+        user_data_dir = data_dir.name
+
+    main.LISTEN_HOST = '127.0.0.1'
+    main.LISTEN_PORT = port
+    main.UDP_ENABLED = False
+    app = BenchApp()
+    if order == 'ui-first':
+        load_ui()
+        app.start_alert_path()
+    else:
+        app.start_alert_path()
+        load_ui()
+    print('READY', flush=True)
+    sys.stdin.readline()
+    app.metrics.stop_dump()
+    app.transport.close()
+    app.effects.stop()
+    if app.journal is not None:
+        app.journal.close()
+    data_dir.cleanup()
+
+
+def first_ack(port, deadline):
+    """反复连接并发送警报，返回第一条警报得到确认的时间"""
+    message = json.dumps({'type': 'alert', 'level': 'info', 'content': 'startup'}).encode() + b'\n'
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as conn:
+                conn.sendall(message)
+                reply = conn.makefile('rb').readline()
+                if reply and json.loads(reply).get('status') == 'ok':
+                    return time.perf_counter()
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.001)
+    return None
+
+
+def measure(order, window_ms, timeout):
+    port = find_free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--child', order,
+         '--port', str(port), '--window-ms', str(window_ms)],
+        cwd=APP_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    ready = {}
+
+    def read_stdout():
+        for line in process.stdout:
+            if line.strip() == 'READY':
+                ready['at'] = time.perf_counter()
+
+    reader = threading.Thread(target=read_stdout, daemon=True)
+    reader.start()
+    try:
+        acked = first_ack(port, started + timeout)
+        while 'at' not in ready and process.poll() is None and time.perf_counter() < started + timeout:
+            time.sleep(0.001)
+    finally:
+        try:
+            process.stdin.write('STOP\n')
+            process.stdin.flush()
+        except OSError:
+            pass
+        process.wait(timeout=10)
+    if acked is None or 'at' not in ready:
+        raise RuntimeError(f"{order} 启动失败或超时")
+    return (acked - started) * 1000, (ready['at'] - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='冷启动测试')
+    parser.add_argument('--rounds', type=int, default=5, help='每种启动顺序的测量次数')
+    parser.add_argument('--window-ms', type=float, default=0, help='模拟的窗口创建耗时(毫秒)')
+    parser.add_argument('--timeout', type=float, default=30, help='每次启动的最长等待时间(秒)')
+    parser.add_argument('--top', type=int, default=10, help='列出的最耗时导入数')
+    parser.add_argument('--skip-profile', action='store_true', help='不测试导入耗时')
+    parser.add_argument('--child', choices=ORDERS, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.port, args.window_ms)
+        return
+
+    if not args.skip_profile:
+        profile(args.rounds, args.top)
+        print()
+
+    results = {order: [] for order in ORDERS}
+    for _ in range(args.rounds):
+        # 交替测量，两种顺序受到的系统缓存和负载影响相同
+        for order in ORDERS:
+            results[order].append(measure(order, args.window_ms, args.timeout))
+    print(f"{'order':<16}{'listen_ms':>11}{'listen_min':>12}{'ready_ms':>10}")
+    for order in ORDERS:
+        listen = [row[0] for row in results[order]]
+        ready = [row[1] for row in results[order]]
+        print(f"{order:<16}{statistics.median(listen):>11.1f}{min(listen):>12.1f}{statistics.median(ready):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+警报负载生成器
+
+用单个线程驱动大量非阻塞发送连接，按场景向客户端发送警报：
+    burst      每个连接一次写入全部消息(流水线)
+    steady     每个连接按固定间隔逐条发送
+    oversized  每条消息填充到指定大小
+    slow       每条消息拆成小块慢速写入
+
+每条消息的最后一个字节写出时通过 on_send 回调记录写入时间，供端到端延迟测试使用。
+
+用法:
+    python benchmarks/loadgen.py --host 192.168.1.10 --port 8888 --senders 100 --messages 20 --scenario burst
+"""
+
+import argparse
+import json
+import selectors
+import socket
+import time
+
+SCENARIOS = ('burst', 'steady', 'oversized', 'slow')
+
+
+def alert_payload(message_id, level='info', size=0):
+    """
+    生成一条带编号的警报
+
+    Args:
+        message_id: 消息编号，写入内容和参数中，使每条警报的指纹都不同
+        level: 警报级别
+        size: 消息的最小字节数，不足时用填充字段补齐
+
+    Returns:
+        bytes: 以换行结尾的JSON消息
+    """
+    message = {
+        'type': 'alert',
+        'level': level,
+        'content': f"load {message_id}",
+        'params': {'id': message_id, 'message': f"load {message_id}"},
+    }
+    data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    if size > len(data):
+        message['padding'] = 'x' * (size - len(data) - len(', "padding": ""'))
+        data = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    return data + b'\n'
+
+
+class _Sender:
+    __slots__ = ('sock', 'frames', 'frame', 'offset', 'next_at', 'received', 'waiting_write')
+
+    def __init__(self, sock, frames):
+        self.sock = sock
+        self.frames = frames
+        self.frame = 0
+        self.offset = 0
+        self.next_at = 0
+        self.received = 0
+        self.waiting_write = False
+
+    @property
+    def done(self):
+        return self.frame >= len(self.frames)
+
+
+def connect_senders(host, port, count, timeout=30):
+    """建立发送连接，连接建立完成后才开始计时发送"""
+    socks = []
+    for _ in range(count):
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setblocking(False)
+        socks.append(sock)
+    return socks
+
+
+def run_load(socks, messages, scenario='burst', size=64 * 1024, interval=0.01,
+             chunk=16, chunk_interval=0.005, level='info', on_send=None, drain=1.0):
+    """
+    在已建立的连接上按场景发送警报
+
+    Args:
+        socks: 非阻塞套接字列表
+        messages: 每个连接发送的消息数
+        scenario: 场景名称，SCENARIOS 之一
+        size: oversized 场景下每条消息的字节数
+        interval: steady 场景下的发送间隔(秒)
+        chunk: slow 场景下每次写入的字节数
+        chunk_interval: slow 场景下两次写入之间的间隔(秒)
+        level: 警报级别
+        on_send: 回调，参数为(消息编号, 写出最后一个字节的 send 调用开始时的 perf_counter 时间)
+        drain: 全部发送完后继续读取响应的时间(秒)
+
+    Returns:
+        dict: 发送的消息数、字节数、耗时和收到的响应字节数
+    """
+    if scenario not in SCENARIOS:
+        raise ValueError(f"未知的场景: {scenario}")
+
+    selector = selectors.DefaultSelector()
+    senders = []
+    message_id = 0
+    for sock in socks:
+        frames = []
+        for _ in range(messages):
+            frames.append((message_id, alert_payload(message_id, level, size if scenario == 'oversized' else 0)))
+            message_id += 1
+        if scenario == 'burst':
+            # 整批一次写入，所有消息的发送时间都记为最后一个字节写出的时间
+            frames = [(tuple(mid for mid, _ in frames), b''.join(data for _, data in frames))]
+        sender = _Sender(sock, frames)
+        senders.append(sender)
+        selector.register(sock, selectors.EVENT_READ, sender)
+
+    sent_bytes = 0
+    started = time.perf_counter()
+    pending = len(senders)
+    drain_until = None
+    while True:
+        now = time.perf_counter()
+        for sender in senders:
+            if sender.done or sender.waiting_write or sender.next_at > now:
+                continue
+            ids, data = sender.frames[sender.frame]
+            end = len(data) if scenario != 'slow' else min(len(data), sender.offset + chunk)
+            # 以写入调用开始的时间作为发送时间，对端可能在 send 返回前就已处理完消息
+            attempted_at = time.perf_counter()
+            try:
+                written = sender.sock.send(data[sender.offset:end])
+            except BlockingIOError:
+                written = 0
+            except OSError:
+                sender.frame = len(sender.frames)
+                pending -= 1
+                continue
+            sender.offset += written
+            sent_bytes += written
+            if sender.offset < end:
+                # 发送缓冲区已满，等待可写
+                sender.waiting_write = True
+                selector.modify(sender.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, sender)
+                continue
+            if sender.offset < len(data):
+                sender.next_at = now + chunk_interval
+                continue
+            if on_send:
+                for mid in (ids if isinstance(ids, tuple) else (ids,)):
+                    on_send(mid, attempted_at)
+            sender.frame += 1
+            sender.offset = 0
+            if sender.done:
+                pending -= 1
+            elif scenario == 'steady':
+                sender.next_at = now + interval
+
+        now = time.perf_counter()
+        if pending == 0:
+            if drain_until is None:
+                elapsed = now - started
+                drain_until = now + drain
+            if now >= drain_until:
+                break
+            timeout = drain_until - now
+        else:
+            ready_at = [s.next_at for s in senders if not s.done and not s.waiting_write]
+            timeout = max(0, min(ready_at) - now) if ready_at else 0.05
+        for key, events in selector.select(timeout):
+            sender = key.data
+            if events & selectors.EVENT_READ:
+                try:
+                    data = sender.sock.recv(65536)
+                except BlockingIOError:
+                    data = None
+                except OSError:
+                    data = b''
+                if data:
+                    sender.received += len(data)
+                elif data == b'':
+                    selector.unregister(sender.sock)
+                    if not sender.done:
+                        sender.frame = len(sender.frames)
+                        pending -= 1
+                    continue
+            if events & selectors.EVENT_WRITE:
+                sender.waiting_write = False
+                selector.modify(sender.sock, selectors.EVENT_READ, sender)
+
+    selector.close()
+    return {
+        'messages': message_id,
+        'bytes': sent_bytes,
+        'elapsed_s': elapsed,
+        'response_bytes': sum(sender.received for sender in senders),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='警报负载生成器')
+    parser.add_argument('--host', default='127.0.0.1', help='客户端地址')
+    parser.add_argument('--port', type=int, default=8888, help='客户端端口')
+    parser.add_argument('--senders', type=int, default=10, help='并发发送连接数')
+    parser.add_argument('--messages', type=int, default=20, help='每个连接发送的消息数')
+    parser.add_argument('--scenario', choices=SCENARIOS, default='burst', help='发送场景')
+    parser.add_argument('--size', type=int, default=64 * 1024, help='oversized 场景的消息大小(字节)')
+    parser.add_argument('--level', default='info', help='警报级别')
+    args = parser.parse_args()
+
+    socks = connect_senders(args.host, args.port, args.senders)
+    try:
+        result = run_load(socks, args.messages, args.scenario, size=args.size, level=args.level)
+    finally:
+        for sock in socks:
+            sock.close()
+    rate = result['messages'] / result['elapsed_s'] if result['elapsed_s'] else float('inf')
+    print(f"场景 {args.scenario}: {args.senders} 个连接共发送 {result['messages']} 条消息 "
+          f"({result['bytes']} 字节)，耗时 {result['elapsed_s']:.3f} 秒，{rate:.0f} 条/秒，"
+          f"收到响应 {result['response_bytes']} 字节")
+
+
+if __name__ == '__main__':
+    main()
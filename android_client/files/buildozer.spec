@@ -22,7 +22,7 @@ source.include_exts = py,png,jpg,kv,atlas
 #source.exclude_exts = spec
 
 # (list) List of directory to exclude (let empty to not exclude anything)
-#source.exclude_dirs = tests, bin, venv
+source.exclude_dirs = benchmarks, bin
 
 # (list) List of exclusions using pattern matching
 # Do not prefix with './'
@@ -54,7 +54,7 @@ requirements = python3,kivy==2.2.1,kivymd==1.1.1,socket,threading,json,android,p
 orientation = portrait
 
 # (list) List of service to declare
-services = alert_service:main.py
+services = alertservice:alert_service.py:foreground:sticky
 
 #
 # OSX Specific
@@ -91,7 +91,7 @@ fullscreen = 0
 #android.adaptive_icon_foreground = %(source.dir)s/data/icon_fg.png
 
 # (list) Permissions
-android.permissions = INTERNET, VIBRATE, FLASHLIGHT, RECORD_AUDIO, READ_EXTERNAL_STORAGE, WRITE_EXTERNAL_STORAGE, SYSTEM_ALERT_WINDOW, WAKE_LOCK, FOREGROUND_SERVICE
+android.permissions = INTERNET, VIBRATE, FLASHLIGHT, RECORD_AUDIO, READ_EXTERNAL_STORAGE, WRITE_EXTERNAL_STORAGE, SYSTEM_ALERT_WINDOW, WAKE_LOCK, FOREGROUND_SERVICE, ACCESS_WIFI_STATE, CHANGE_WIFI_MULTICAST_STATE
 
 # (list) features (adds uses-feature -tags to manifest)
 #android.features = android.hardware.usb.host
@@ -0,0 +1,299 @@
+import threading
+import time
+from collections import deque
+
+from messages import COMMAND_PARAMS, COMMANDS, MessageError, check_params
+from metrics import NULL_REGISTRY
+
+# 命令的执行线程
+THREAD_INLINE = 'inline'  # 调用方线程(分发队列的工作线程)，与其他消息按顺序执行
+THREAD_WORKER = 'worker'  # 命令工作线程，耗时的命令不阻塞之后的消息
+THREAD_UI = 'ui'          # 界面线程(Kivy 主循环)，没有设置 ui_scheduler 时在命令工作线程执行
+
+THREADS = (THREAD_INLINE, THREAD_WORKER, THREAD_UI)
+
+# 命令工作线程数
+DEFAULT_WORKERS = 1
+
+
+class CommandError(Exception):
+    """命令不存在、参数不合法、执行出错或未在超时时间内完成"""
+
+
+class CommandSpec:
+    """一条已注册的命令"""
+
+    __slots__ = ('name', 'handler', 'params', 'timeout', 'thread')
+
+    def __init__(self, name, handler, params=None, timeout=None, thread=THREAD_INLINE):
+        self.name = name
+        self.handler = handler
+        self.params = params
+        self.timeout = timeout
+        self.thread = thread
+
+    def __repr__(self):
+        return f"CommandSpec({self.name!r}, thread={self.thread!r}, timeout={self.timeout!r})"
+
+
+class _Call:
+    """交给命令工作线程或界面线程执行的一次调用"""
+
+    __slots__ = ('spec', 'params', 'message', 'done', 'error')
+
+    def __init__(self, spec, params, message):
+        self.spec = spec
+        self.params = params
+        self.message = message
+        self.done = threading.Event()
+        self.error = None
+
+
+def command(name, params=None, timeout=None, thread=THREAD_INLINE):
+    """
+    把方法标记为命令处理函数，由 CommandRegistry.register_object 注册到对象所用的命令表
+
+    处理函数的参数为 (params, message)：params 是已按类型表检查过的参数字典，
+    message 是命令消息(messages.CommandMessage)，直接调用 CommandRegistry.execute 时可能为 None。
+    同一个方法可以叠加多个装饰器，注册为多条命令。
+
+    Args:
+        name: 命令名
+        params: 参数类型表 {参数名: 类型或类型元组}，默认使用 messages.COMMAND_PARAMS 中的定义
+        timeout: 超时时间(秒)。在工作线程或界面线程执行的命令，调用方最多等待这么久，
+            超时时报告错误(命令仍会执行完)；为 None 时提交后立即返回。在调用方线程执行的命令超时只记录日志
+        thread: 执行线程，THREADS 之一
+
+    Returns:
+        装饰器
+    """
+    def decorator(function):
+        specs = function.__dict__.setdefault('_command_specs', [])
+        specs.append((name, params, timeout, thread))
+        return function
+    return decorator
+
+
+class CommandRegistry:
+    """
+    命令表
+
+    命令名到处理函数的字典，按名称一次查表分发，新增命令不影响已有命令的分发耗时。
+    响应处理器和应用共用同一个命令表：处理器注册内置命令，应用用 register_object
+    注册自己的实现，同名命令以后注册的为准。
+
+    每条命令有参数类型表、超时时间和执行线程。在工作线程执行的命令由固定数量的
+    命令工作线程依次执行，第一次使用时启动；在界面线程执行的命令通过 ui_scheduler 交给界面线程。
+    """
+
+    def __init__(self, log=None, ui_scheduler=None, workers=DEFAULT_WORKERS, metrics=None):
+        """
+        初始化命令表
+
+        Args:
+            log: 日志函数，记录在后台执行出错和执行超时的命令
+            ui_scheduler: 在界面线程执行函数的方法，参数为无参函数，如用 Clock.schedule_once 包装
+            workers: 命令工作线程数
+            metrics: 指标注册表，默认不统计
+        """
+        self.log = log or (lambda message: None)
+        self.ui_scheduler = ui_scheduler
+        self.max_workers = workers
+        self._commands = {}
+        self._calls = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._workers = []
+
+        self.metrics = metrics if metrics is not None else NULL_REGISTRY
+        self._executed = self.metrics.counter('commands.executed')
+        self._errors = self.metrics.counter('commands.errors')
+        self._timeouts = self.metrics.counter('commands.timeouts')
+        self._command_time = self.metrics.histogram('commands.ms')
+
+    def register(self, name, handler, params=None, timeout=None, thread=THREAD_INLINE):
+        """
+        注册命令，已有同名命令时替换
+
+        Args:
+            name: 命令名
+            handler: 处理函数 handler(params, message)
+            params: 参数类型表，默认使用 messages.COMMAND_PARAMS 中的定义
+            timeout: 超时时间(秒)，见 command
+            thread: 执行线程，THREADS 之一
+
+        Returns:
+            CommandSpec: 注册的命令
+        """
+        if thread not in THREADS:
+            raise ValueError(f"未知的执行线程: {thread}")
+        # 与解析消息时使用同一个字符串对象，查表时按对象比较即可命中
+        name = COMMANDS.get(name, name)
+        spec = CommandSpec(name, handler, params if params is not None else COMMAND_PARAMS.get(name), timeout, thread)
+        self._commands[name] = spec
+        return spec
+
+    def command(self, name, params=None, timeout=None, thread=THREAD_INLINE):
+        """
+        注册命令的装饰器，用于普通函数
+
+        Returns:
+            装饰器，函数原样返回
+        """
+        def decorator(function):
+            self.register(name, function, params, timeout, thread)
+            return function
+        return decorator
+
+    def register_object(self, target):
+        """
+        注册对象中用 command 装饰的方法，子类中的同名命令覆盖基类的
+
+        Args:
+            target: 响应处理器、应用等对象
+
+        Returns:
+            list: 注册的命令名
+        """
+        names = []
+        for cls in reversed(type(target).__mro__):
+            for attr, value in vars(cls).items():
+                for name, params, timeout, thread in getattr(value, '_command_specs', ()):
+                    # 按属性名取绑定方法，子类覆盖的方法同样生效
+                    self.register(name, getattr(target, attr), params, timeout, thread)
+                    names.append(name)
+        return names
+
+    def unregister(self, name):
+        """注销命令"""
+        self._commands.pop(name, None)
+
+    def get(self, name):
+        """
+        查找命令
+
+        Returns:
+            CommandSpec: 命令，未注册时为 None
+        """
+        return self._commands.get(name)
+
+    def __contains__(self, name):
+        return name in self._commands
+
+    def names(self):
+        """已注册的命令名"""
+        return sorted(self._commands)
+
+    def execute(self, name, params=None, message=None):
+        """
+        执行命令
+
+        Args:
+            name: 命令名
+            params: 参数字典
+            message: 命令消息，传给处理函数
+
+        Raises:
+            CommandError: 命令未注册、参数不合法、执行出错或未在超时时间内完成
+        """
+        spec = self._commands.get(name)
+        if spec is None:
+            raise CommandError(f"未知命令: {name}")
+        params = params or {}
+        try:
+            check_params(name, params, spec.params)
+        except MessageError as e:
+            raise CommandError(str(e)) from e
+
+        if spec.thread == THREAD_INLINE or (spec.thread == THREAD_UI and self._on_ui_thread()):
+            self._run(spec, params, message)
+            return
+
+        call = _Call(spec, params, message)
+        if spec.thread == THREAD_UI and self.ui_scheduler is not None:
+            self.ui_scheduler(lambda: self._run_call(call))
+        else:
+            self._submit(call)
+        if spec.timeout is None:
+            return
+        if not call.done.wait(spec.timeout):
+            self._timeouts.inc()
+            raise CommandError(f"命令 {name} 未在 {spec.timeout} 秒内完成")
+        if call.error is not None:
+            raise CommandError(str(call.error)) from call.error
+
+    def stop(self):
+        """停止命令工作线程，尚未执行的命令被丢弃"""
+        with self._cond:
+            self._running = False
+            self._calls.clear()
+            self._cond.notify_all()
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join(timeout=10)
+        self._workers = []
+
+    def stats(self):
+        """
+        返回命令表状态
+
+        Returns:
+            dict: 命令数、工作线程数和等待执行的命令数
+        """
+        with self._cond:
+            queued = len(self._calls)
+        return {'commands': len(self._commands), 'workers': len(self._workers), 'queued': queued}
+
+    def _on_ui_thread(self):
+        # Kivy 主循环运行在主线程；已在界面线程时直接执行，避免等待自己
+        return self.ui_scheduler is not None and threading.current_thread() is threading.main_thread()
+
+    def _run(self, spec, params, message):
+        started = time.perf_counter()
+        try:
+            spec.handler(params, message)
+        except Exception:
+            self._errors.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._command_time.observe(elapsed * 1000)
+        self._executed.inc()
+        if spec.timeout is not None and elapsed > spec.timeout:
+            self._timeouts.inc()
+            self.log(f"命令 {spec.name} 执行了 {elapsed:.1f} 秒，超过 {spec.timeout} 秒")
+
+    def _run_call(self, call):
+        try:
+            self._run(call.spec, call.params, call.message)
+        except Exception as e:
+            call.error = e
+            if call.spec.timeout is None:
+                # 没有调用方等待结果，出错只能记录日志
+                self.log(f"执行命令 {call.spec.name} 出错: {str(e)}")
+        finally:
+            call.done.set()
+
+    def _submit(self, call):
+        with self._cond:
+            if not self._running:
+                self._start()
+            self._calls.append(call)
+            self._cond.notify()
+
+    def _start(self):
+        self._running = True
+        self._workers = [threading.Thread(target=self._work, name='command-worker') for _ in range(self.max_workers)]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running and not self._calls:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                call = self._calls.popleft()
+            self._run_call(call)
@@ -0,0 +1,339 @@
+import json
+import socket
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from wire_codecs import CODEC_JSON, JSON_CODEC, get_codec, sniff_codec
+
+# 默认的组播地址(本地管理范围)
+DEFAULT_GROUP = '239.255.88.88'
+
+# 发送方单个数据报的最大字节数，超过以太网 MTU 的数据报会被分片，任一分片丢失整条消息就丢失
+MAX_DATAGRAM_SIZE = 1400
+# 接收缓冲区，能容纳任意 UDP 数据报
+RECV_BUFFER_SIZE = 65535
+
+# 接收线程检查停止标志的间隔(秒)
+POLL_INTERVAL = 0.5
+
+# 等待通过 TCP 回送的确认消息数上限，超出时丢弃最早的确认
+MAX_PENDING_ACKS = 1024
+
+
+class SequenceTracker:
+    """
+    按发送方跟踪数据报序号，发现丢包
+
+    每个发送方(来源IP + 发送方标识)记住已收到的最大序号，新序号比它大 1 以上时
+    中间的序号计为丢失。序号不大于最大序号的数据报是重发或乱序到达的，不计为丢失。
+    最多跟踪 max_senders 个发送方，超出时淘汰最久没有消息的发送方。
+    """
+
+    def __init__(self, max_senders=1024):
+        """
+        初始化序号跟踪器
+
+        Args:
+            max_senders: 最多跟踪的发送方数
+        """
+        self.max_senders = max_senders
+        self.missing = 0
+        self._last = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key, seq):
+        """
+        记录一个序号
+
+        Args:
+            key: 发送方标识
+            seq: 数据报序号
+
+        Returns:
+            int: 本次发现丢失的数据报数
+        """
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and seq <= last:
+                self._last.move_to_end(key)
+                return 0
+            self._last[key] = seq
+            self._last.move_to_end(key)
+            if len(self._last) > self.max_senders:
+                self._last.popitem(last=False)
+            missing = seq - last - 1 if last is not None else 0
+            self.missing += missing
+            return missing
+
+    def stats(self):
+        with self._lock:
+            return {'senders': len(self._last), 'missing': self.missing}
+
+
+def _membership(group, interface):
+    return struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton(interface))
+
+
+class DatagramListener:
+    """
+    UDP/组播警报接收
+
+    每个数据报是一条完整的消息(或批量信封)，按首字节识别编码(JSON 或 NetworkManager 接受的二进制编码)，
+    与TCP使用相同的消息格式，经
+    NetworkManager.process_messages 进入同一条分发链路，消息ID去重也相同。
+    数据报中的 seq 和 sender 字段用于发现丢包；没有 id 的数据报以 "sender:seq" 作为ID，
+    发送方重发的相同数据报只处理一次。
+
+    UDP 无法可靠地应答，数据报带有 ack_port 时，处理结果和应用的确认消息通过 TCP
+    发往发送方的 ack_port，由单独的线程发送，不阻塞接收线程。
+    """
+
+    def __init__(self, manager, host='0.0.0.0', port=8888, group=None, interface='0.0.0.0'):
+        """
+        初始化UDP接收
+
+        Args:
+            manager: NetworkManager 实例
+            host: 监听地址，加入组播组时忽略并监听所有地址
+            port: 监听端口
+            group: 组播地址，None 表示只接收单播和广播
+            interface: 加入组播组使用的本机网卡地址
+        """
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.group = group
+        self.interface = interface
+        self.sequences = SequenceTracker()
+        self.socket = None
+        self.is_listening = False
+        self._thread = None
+        self._acks = deque(maxlen=MAX_PENDING_ACKS)
+        self._ack_cond = threading.Condition()
+        self._ack_thread = None
+
+        metrics = manager.metrics
+        self._datagrams = metrics.counter('udp.datagrams')
+        self._gaps = metrics.counter('udp.missing')
+        self._ack_errors = metrics.counter('udp.ack_errors')
+
+    def start(self):
+        """
+        开始接收
+
+        Raises:
+            OSError: 绑定端口或加入组播组失败
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            # 多个进程(或同一设备上的多个实例)可以同时接收同一个组播端口
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(('' if self.group else self.host, self.port))
+            if self.group:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                                _membership(self.group, self.interface))
+            sock.settimeout(POLL_INTERVAL)
+        except OSError:
+            sock.close()
+            raise
+        self.socket = sock
+        self.is_listening = True
+        self._thread = threading.Thread(target=self._receive)
+        self._thread.daemon = True
+        self._thread.start()
+        self._ack_thread = threading.Thread(target=self._send_acks)
+        self._ack_thread.daemon = True
+        self._ack_thread.start()
+
+    def stop(self):
+        """停止接收，尚未发出的确认消息被丢弃"""
+        self.is_listening = False
+        with self._ack_cond:
+            self._acks.clear()
+            self._ack_cond.notify_all()
+        for thread in (self._thread, self._ack_thread):
+            if thread and thread is not threading.current_thread():
+                thread.join(timeout=POLL_INTERVAL * 4)
+        self._thread = None
+        self._ack_thread = None
+        if self.socket:
+            if self.group:
+                try:
+                    self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP,
+                                           _membership(self.group, self.interface))
+                except OSError:
+                    pass
+            self.socket.close()
+            self.socket = None
+
+    def send_ack(self, host, port, message):
+        """
+        通过TCP向发送方回送一条消息，立即返回
+
+        Args:
+            host: 发送方地址
+            port: 发送方接收确认的TCP端口
+            message: 消息字典
+        """
+        with self._ack_cond:
+            self._acks.append((host, port, message))
+            self._ack_cond.notify()
+
+    def process_datagram(self, data, address):
+        """
+        处理一个数据报
+
+        Args:
+            data: 数据报内容，bytes 或指向接收缓冲区的 memoryview
+            address: 发送方地址
+
+        Returns:
+            list: 处理结果(响应字典)列表
+        """
+        received_at = time.monotonic()
+        self._datagrams.inc()
+        source = {'ip': address[0], 'port': address[1], 'transport': 'udp'}
+        codec = sniff_codec(data, self.manager.codecs) or JSON_CODEC
+        frame = data
+        if not codec.binary:
+            # 文本只解码一次，decode_frame 直接解析解码后的字符串
+            try:
+                frame = str(data, 'utf-8').strip()
+            except UnicodeDecodeError as e:
+                self.manager.notify({"type": "error", "message": f"UDP数据报不是有效的UTF-8文本: {str(e)}",
+                                     "source": source})
+                return []
+        if not frame:
+            return []
+        message = self.manager.decode_frame(frame, source, codec)
+        if message is None:
+            return []
+
+        ack_port = message.get('ack_port')
+        if isinstance(ack_port, int) and 0 < ack_port < 65536:
+            source['ack_port'] = ack_port
+        seq = message.get('seq')
+        if isinstance(seq, int):
+            sender = message.get('sender')
+            missing = self.sequences.check((address[0], sender), seq)
+            if missing:
+                self._gaps.inc(missing)
+                self.manager.notify({
+                    "type": "info",
+                    "message": f"来自 {address[0]} 的UDP警报丢失 {missing} 条(序号 {seq - missing}-{seq - 1})",
+                    "source": source
+                })
+            if 'id' not in message:
+                message['id'] = f"{sender}:{seq}"
+
+        responses = self.manager.process_messages([message], source, received_at)
+        if 'ack_port' in source:
+            for response in responses:
+                if response.get('duplicate'):
+                    # 重复发送的数据报，第一份已经确认过
+                    continue
+                # 与应用的确认消息一样用 ref 引用原消息ID，确认消息本身不带 id，不会被对方按ID去重
+                ack = dict(response, type='delivery_ack')
+                ack['ref'] = ack.pop('id', None)
+                self.send_ack(source['ip'], source['ack_port'], ack)
+        return responses
+
+    def _receive(self):
+        # 数据报直接读入复用的缓冲区，处理完一个再读下一个
+        buffer = bytearray(RECV_BUFFER_SIZE)
+        view = memoryview(buffer)
+        while self.is_listening:
+            try:
+                size, address = self.socket.recvfrom_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                self.process_datagram(view[:size], address)
+            except Exception as e:
+                self.manager.notify({"type": "error", "message": f"处理UDP数据报出错: {str(e)}"})
+
+    def _send_acks(self):
+        while True:
+            with self._ack_cond:
+                while self.is_listening and not self._acks:
+                    self._ack_cond.wait()
+                if not self.is_listening:
+                    return
+                host, port, message = self._acks.popleft()
+            response = self.manager.send_message(host, port, message)
+            if response.get('status') == 'error':
+                self._ack_errors.inc()
+
+
+class DatagramSender:
+    """
+    UDP/组播警报发送
+
+    每条消息带上递增的 seq 和本发送方的随机标识 sender，接收方据此发现丢包并去重；
+    repeat 大于1时同一数据报连续发送多次，降低无线网络丢包的影响，接收方只处理一次。
+    指定 ack_port 时，接收方通过TCP把处理结果发往本机该端口，需由调用方在该端口上
+    运行 NetworkManager 接收 {"type": "delivery_ack", "ref": 消息ID} 消息。
+    """
+
+    def __init__(self, host=DEFAULT_GROUP, port=8888, ttl=1, repeat=1, ack_port=None, codec=CODEC_JSON):
+        """
+        初始化发送方
+
+        Args:
+            host: 目标地址，组播地址、广播地址或单播地址
+            port: 目标端口
+            ttl: 组播数据报的生存跳数，1 表示只在本网段内
+            repeat: 每条消息发送的次数
+            ack_port: 接收确认的本机TCP端口
+            codec: 消息编码名称，二进制编码的数据报更小，接收方需支持该编码
+        """
+        self.address = (host, port)
+        self.repeat = repeat
+        self.ack_port = ack_port
+        self.codec = get_codec(codec)
+        self.sender = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self._lock = threading.Lock()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+    def send(self, message):
+        """
+        发送一条消息，不等待任何应答
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            int: 本条消息的序号
+
+        Raises:
+            ValueError: 消息编码后超过 MAX_DATAGRAM_SIZE
+        """
+        with self._lock:
+            seq = self.seq + 1
+            message = dict(message, seq=seq, sender=self.sender)
+            if self.ack_port:
+                message['ack_port'] = self.ack_port
+            if self.codec.binary:
+                payload = self.codec.encode(message)
+            else:
+                payload = json.dumps(message, ensure_ascii=False).encode('utf-8')
+            if len(payload) > MAX_DATAGRAM_SIZE:
+                # 不占用序号，接收方不会把它计为丢包
+                raise ValueError(f"数据报 {len(payload)} 字节超过上限 {MAX_DATAGRAM_SIZE} 字节，请改用TCP发送")
+            self.seq = seq
+            for _ in range(self.repeat):
+                self.socket.sendto(payload, self.address)
+            return seq
+
+    def close(self):
+        self.socket.close()
@@ -0,0 +1,166 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_FINGERPRINT_FIELDS = ('source', 'level', 'content')
+
+
+class _Window:
+    __slots__ = ('started', 'count')
+
+    def __init__(self, started):
+        self.started = started
+        self.count = 0
+
+
+class AlertDeduplicator:
+    """
+    警报去重器
+
+    按指定字段计算警报指纹，同一指纹在 ttl 秒的抑制窗口内只放行第一条，
+    其余计为重复并被抑制。窗口缓存按创建顺序排列，过期窗口从头部清理，
+    超过 max_size 时淘汰最早的窗口，内存占用有上限。
+    """
+
+    def __init__(self, fields=DEFAULT_FINGERPRINT_FIELDS, ttl=60, max_size=1024):
+        """
+        初始化警报去重器
+
+        Args:
+            fields: 参与计算指纹的消息字段
+            ttl: 抑制窗口时长(秒)
+            max_size: 最多同时跟踪的指纹数
+        """
+        self.fields = tuple(fields)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.suppressed = 0
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def fingerprint(self, message):
+        """
+        计算消息指纹
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            tuple: 指纹
+        """
+        values = []
+        for field in self.fields:
+            value = message.get(field)
+            if field == 'source' and isinstance(value, dict):
+                # 来源只按IP区分，发送端口每次连接都会变化
+                value = value.get('ip')
+            elif isinstance(value, (dict, list)):
+                value = json.dumps(value, sort_keys=True, ensure_ascii=False)
+            values.append(value)
+        return tuple(values)
+
+    def check(self, message):
+        """
+        检查警报是否为抑制窗口内的重复警报
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            tuple: (是否为新警报, 当前窗口内的重复次数)
+        """
+        key = self.fingerprint(message)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            window = self._windows.get(key)
+            if window is not None:
+                window.count += 1
+                self.suppressed += 1
+                return False, window.count
+
+            self._windows[key] = _Window(now)
+            while len(self._windows) > self.max_size:
+                self._windows.popitem(last=False)
+            return True, 0
+
+    def clear(self):
+        """清空所有抑制窗口，之后到达的警报都会被放行"""
+        with self._lock:
+            self._windows.clear()
+
+    def stats(self):
+        """
+        返回去重统计
+
+        Returns:
+            dict: 跟踪中的指纹数和累计抑制次数
+        """
+        with self._lock:
+            return {'tracked': len(self._windows), 'suppressed': self.suppressed}
+
+    def _expire(self, now):
+        expire_before = now - self.ttl
+        windows = self._windows
+        while windows:
+            key, window = next(iter(windows.items()))
+            if window.started >= expire_before:
+                break
+            del windows[key]
+
+
+class SeenIds:
+    """
+    有界的已处理消息ID集合
+
+    发送方重试时使用相同的消息ID，接收方据此只处理一次。集合按加入顺序排列，
+    超过 max_size 时淘汰最早的ID，因此只能识别最近 max_size 条消息内的重复；
+    发送方的重试窗口内到达的消息数应小于 max_size。
+    """
+
+    def __init__(self, max_size=4096):
+        """
+        初始化已处理消息ID集合
+
+        Args:
+            max_size: 最多记住的消息ID数
+        """
+        self.max_size = max_size
+        self.duplicates = 0
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        """
+        记录一个消息ID
+
+        Args:
+            key: 消息ID，通常为 (来源IP, 消息ID)
+
+        Returns:
+            bool: 是否为新ID，已记录过的ID计为重复并返回False
+        """
+        with self._lock:
+            if key in self._ids:
+                self.duplicates += 1
+                return False
+            self._ids[key] = None
+            if len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+            return True
+
+    def discard(self, key):
+        """移除一个消息ID，消息未能处理时调用，发送方重试时会再次处理"""
+        with self._lock:
+            self._ids.pop(key, None)
+
+    def stats(self):
+        """
+        返回统计
+
+        Returns:
+            dict: 记住的消息ID数和累计识别出的重复次数
+        """
+        with self._lock:
+            return {'tracked': len(self._ids), 'duplicates': self.duplicates}
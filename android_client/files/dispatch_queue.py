@@ -0,0 +1,195 @@
+import heapq
+import itertools
+import threading
+
+# 警报级别对应的优先级，数值越小越优先
+LEVEL_PRIORITY = {
+    'critical': 0,
+    'warning': 1,
+    'info': 2,
+}
+DEFAULT_PRIORITY = LEVEL_PRIORITY['info']
+
+# 命令的优先级：停止警报和综合警报与关键警报同级，其余硬件命令与警告同级
+COMMAND_PRIORITY = {
+    'stop_alert': LEVEL_PRIORITY['critical'],
+    'alert': LEVEL_PRIORITY['critical'],
+}
+DEFAULT_COMMAND_PRIORITY = LEVEL_PRIORITY['warning']
+
+
+def message_priority(message):
+    """
+    计算消息优先级
+
+    Args:
+        message: 消息字典或消息对象(messages.Message)
+
+    Returns:
+        int: 优先级，数值越小越优先
+    """
+    priority = getattr(message, 'priority', None)
+    if priority is not None:
+        # 消息对象在解析时已按级别或命令算好优先级
+        return priority
+    msg_type = message.get('type')
+    if msg_type == 'alert':
+        return LEVEL_PRIORITY.get(message.get('level'), DEFAULT_PRIORITY)
+    if msg_type == 'command':
+        return COMMAND_PRIORITY.get(message.get('command'), DEFAULT_COMMAND_PRIORITY)
+    return DEFAULT_PRIORITY
+
+
+class PriorityDispatcher:
+    """
+    按优先级分发消息的有界队列
+
+    网络线程调用 submit/submit_batch 入队后立即返回，单个工作线程每次取出
+    队列中的全部消息，按优先级排序后作为一批交给处理函数。
+
+    队列满时按优先级丢弃：新消息比队列中最低优先级的消息更优先时，
+    挤掉那条最低优先级(且最新)的消息，否则丢弃新消息；关键级消息从不被丢弃，
+    队列中全是关键级消息时允许超出最大深度。被丢弃的新消息在入队结果中标为 dropped；
+    被挤掉的消息此前已入队成功，交给 drop_callback，由调用方通知发送方。
+    比正在处理的消息更优先的消息入队时，会立即调用 preempt_callback，
+    让处理方中断正在执行的低优先级硬件响应。
+    """
+
+    def __init__(self, handler, max_depth=256, preempt_callback=None, drop_callback=None):
+        """
+        初始化分发队列
+
+        Args:
+            handler: 批量处理函数，参数为按优先级排序的消息列表
+            max_depth: 队列最大深度
+            preempt_callback: 抢占回调，参数为新消息的优先级
+            drop_callback: 挤出回调，参数为已入队后被更优先的消息挤出队列的消息
+        """
+        self.handler = handler
+        self.max_depth = max_depth
+        self.preempt_callback = preempt_callback
+        self.drop_callback = drop_callback
+        self.dropped = 0
+        self.max_seen_depth = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running_priority = None
+        self._running = False
+        self._worker = None
+
+    def start(self):
+        """启动工作线程"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._worker = threading.Thread(target=self._work)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def stop(self):
+        """停止工作线程，队列中尚未处理的消息被丢弃"""
+        with self._cond:
+            self._running = False
+            self._heap.clear()
+            self._cond.notify_all()
+        if self._worker and self._worker is not threading.current_thread():
+            self._worker.join(timeout=5)
+        self._worker = None
+
+    def submit(self, message):
+        """
+        提交一条消息
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            bool: 是否已入队
+        """
+        return self.submit_batch([message])[0]['status'] == 'ok'
+
+    def submit_batch(self, messages):
+        """
+        提交一批消息
+
+        Args:
+            messages: 消息字典列表
+
+        Returns:
+            list: 与消息一一对应的入队结果字典
+        """
+        results = []
+        evicted = []
+        preempt = None
+        with self._cond:
+            for message in messages:
+                priority = message_priority(message)
+                item = (priority, next(self._seq), message)
+                if len(self._heap) >= self.max_depth:
+                    worst = max(self._heap)
+                    if worst[0] > priority:
+                        # 挤掉队列中优先级最低的消息
+                        self._heap.remove(worst)
+                        heapq.heapify(self._heap)
+                        evicted.append(worst[2])
+                        self.dropped += 1
+                    elif priority > LEVEL_PRIORITY['critical']:
+                        # 队列中没有比新消息更低优先级的消息，丢弃新消息
+                        self.dropped += 1
+                        results.append({'status': 'dropped', 'message': '队列已满'})
+                        continue
+                heapq.heappush(self._heap, item)
+                results.append({'status': 'ok'})
+
+                if self._running_priority is not None and priority < self._running_priority:
+                    if preempt is None or priority < preempt:
+                        preempt = priority
+
+            self.max_seen_depth = max(self.max_seen_depth, len(self._heap))
+            self._cond.notify()
+
+        # 回调在锁外执行，避免回调中再次提交消息时死锁
+        if preempt is not None and self.preempt_callback:
+            self.preempt_callback(preempt)
+        if self.drop_callback:
+            for message in evicted:
+                self.drop_callback(message)
+        return results
+
+    def depth(self):
+        """返回当前队列深度"""
+        with self._cond:
+            return len(self._heap)
+
+    def stats(self):
+        """
+        返回队列统计
+
+        Returns:
+            dict: 当前深度、历史最大深度和累计丢弃数
+        """
+        with self._cond:
+            return {
+                'depth': len(self._heap),
+                'peak_depth': self.max_seen_depth,
+                'dropped': self.dropped,
+            }
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._running_priority = None
+                while self._running and not self._heap:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                # 取出当前排队的全部消息，按优先级顺序作为一批处理
+                batch = [heapq.heappop(self._heap) for _ in range(len(self._heap))]
+                self._running_priority = batch[0][0]
+            try:
+                self.handler([message for _, _, message in batch])
+            except Exception:
+                # 处理函数自行记录错误，工作线程不能因此退出
+                pass
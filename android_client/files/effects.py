@@ -0,0 +1,289 @@
+import heapq
+import itertools
+import threading
+import time
+
+from dispatch_queue import DEFAULT_PRIORITY
+
+# 硬件通道
+CHANNEL_FLASH = 'flash'
+CHANNEL_VIBRATE = 'vibrate'
+CHANNEL_SOUND = 'sound'
+CHANNELS = (CHANNEL_FLASH, CHANNEL_VIBRATE, CHANNEL_SOUND)
+
+
+def pulse_pattern(on, off=0):
+    """
+    生成一次"开-关"节拍
+
+    Args:
+        on: 开启时长(秒)
+        off: 关闭时长(秒)
+
+    Returns:
+        list: [(是否开启, 时长), ...]
+    """
+    steps = [(True, on)]
+    if off > 0:
+        steps.append((False, off))
+    return steps
+
+
+class EffectsBackend:
+    """
+    硬件效果后端接口，各方法由调度器线程调用，必须立即返回
+
+    默认实现不做任何操作，可用于桌面环境或测试。
+    """
+
+    def flash(self, on):
+        """打开或关闭闪光灯"""
+
+    def vibrate(self, on, duration=0):
+        """开始震动指定时长(秒)，on为False时立即停止"""
+
+    def sound(self, on, duration=0, asset=None):
+        """开始播放指定时长(秒)的警报声，asset 为音频资源名，on为False时立即停止"""
+
+
+class _Effect:
+    __slots__ = ('steps', 'repeat', 'priority', 'asset', 'requested_at', 'index', 'generation')
+
+    def __init__(self, steps, repeat, priority, asset, requested_at, generation):
+        self.steps = steps
+        self.repeat = repeat
+        self.priority = priority
+        self.asset = asset
+        self.requested_at = requested_at
+        self.index = 0
+        self.generation = generation
+
+
+# 调度线程取到的节拍已被取消或替换
+_SKIP = object()
+
+
+class EffectsScheduler:
+    """
+    单线程硬件效果调度器
+
+    闪光灯、震动和声音由同一个定时线程按"开/关"节拍驱动，不再为每个效果
+    创建睡眠线程。每个通道同时只运行一个效果：同级或更高优先级的请求替换
+    当前效果，完全相同的请求只续接重复次数，低优先级请求在高优先级效果结束前被忽略。
+    cancel 和替换在调用线程中直接关闭被停止效果的硬件，不必等待当前节拍结束。
+    调度线程只在锁内决定下一个节拍，在锁外调用硬件后端，后端调用缓慢时不会阻塞其他线程。
+    """
+
+    def __init__(self, backend=None):
+        """
+        初始化调度器
+
+        Args:
+            backend: 硬件效果后端，默认为不做任何操作的 EffectsBackend
+        """
+        self.backend = backend if backend is not None else EffectsBackend()
+        self.last_stop_latency = None
+        self.start_latency = {}
+        self._effects = {}
+        self._timers = []
+        self._seq = itertools.count()
+        self._generation = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._worker = None
+
+    def start(self):
+        """启动调度线程"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._worker = threading.Thread(target=self._work)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def stop(self):
+        """取消所有效果并停止调度线程"""
+        self.cancel()
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._worker and self._worker is not threading.current_thread():
+            self._worker.join(timeout=5)
+        self._worker = None
+
+    def play(self, channel, steps, repeat=1, priority=DEFAULT_PRIORITY, asset=None, requested_at=None):
+        """
+        在指定通道上运行一个节拍序列
+
+        Args:
+            channel: 硬件通道，CHANNELS 之一
+            steps: 节拍序列 [(是否开启, 时长秒), ...]
+            repeat: 重复次数，None 表示一直循环直到被取消
+            priority: 优先级，数值越小越优先
+            asset: 声音通道使用的音频资源名
+            requested_at: 请求产生时的 time.monotonic() 时间(如收到警报的时间)，
+                默认为调用时间，用于统计第一次开启硬件的耗时
+
+        Returns:
+            bool: 请求是否被接受
+        """
+        steps = tuple(steps)
+        if channel not in CHANNELS or not steps:
+            return False
+        with self._cond:
+            current = self._effects.get(channel)
+            if current is not None:
+                if current.priority < priority:
+                    return False
+                if current.priority == priority and current.steps == steps and current.asset == asset:
+                    # 重叠的相同请求合并为一个效果，只续接重复次数
+                    if current.repeat is not None:
+                        current.repeat = None if repeat is None else max(current.repeat, repeat)
+                    return True
+            now = time.monotonic()
+            if requested_at is None:
+                requested_at = now
+            effect = _Effect(steps, repeat, priority, asset, requested_at, next(self._generation))
+            self._effects[channel] = effect
+            if current is None:
+                self._schedule(now, channel, effect.generation)
+                self._cond.notify()
+                return True
+        # 被替换的效果在锁外关闭硬件，循环播放的旧音频不会被新效果的节拍关闭；
+        # 关闭之后才调度新效果的第一拍，关闭不会晚于新效果的开启
+        self._apply(channel, False, 0, current.asset)
+        with self._cond:
+            if self._effects.get(channel) is effect:
+                self._schedule(time.monotonic(), channel, effect.generation)
+                self._cond.notify()
+        return True
+
+    def cancel(self, channel=None):
+        """
+        立即停止效果
+
+        Args:
+            channel: 要停止的通道，None 表示全部通道
+        """
+        self._stop_where(lambda ch, effect: channel is None or ch == channel)
+
+    def preempt(self, priority):
+        """
+        停止所有低于指定优先级的效果
+
+        Args:
+            priority: 新请求的优先级
+        """
+        self._stop_where(lambda ch, effect: effect.priority > priority)
+
+    def active(self):
+        """
+        返回正在运行的效果
+
+        Returns:
+            dict: 通道 -> 优先级
+        """
+        with self._cond:
+            return {channel: effect.priority for channel, effect in self._effects.items()}
+
+    def stats(self):
+        """
+        返回调度器状态
+
+        Returns:
+            dict: 运行中的通道、各通道最近一次从请求到开启硬件的耗时(毫秒)、
+                最近一次停止耗时(毫秒)及调度线程数
+        """
+        latency = self.last_stop_latency
+        return {
+            'active': self.active(),
+            'start_latency_ms': {channel: round(value * 1000, 3) for channel, value in self.start_latency.items()},
+            'last_stop_latency_ms': None if latency is None else round(latency * 1000, 3),
+            'threads': 1 if self._worker and self._worker.is_alive() else 0,
+        }
+
+    def _stop_where(self, predicate):
+        started = time.perf_counter()
+        with self._cond:
+            stopped = [(channel, effect) for channel, effect in self._effects.items() if predicate(channel, effect)]
+            for channel, _ in stopped:
+                del self._effects[channel]
+            self._cond.notify()
+        # 在调用线程中直接关闭硬件，待执行的节拍因代数不匹配而被丢弃
+        for channel, effect in stopped:
+            self._apply(channel, False, 0, effect.asset)
+        if stopped:
+            self.last_stop_latency = time.perf_counter() - started
+
+    def _schedule(self, due, channel, generation):
+        heapq.heappush(self._timers, (due, next(self._seq), channel, generation))
+
+    def _work(self):
+        while True:
+            step = self._next_step()
+            if step is None:
+                return
+            if step is _SKIP:
+                continue
+            channel, on, duration, effect = step
+            # 在锁外调用后端：androidhelper/pyjnius 调用可能很慢，不能阻塞 play、cancel 和 active
+            self._apply(channel, on, duration, effect.asset)
+            if not on:
+                continue
+            with self._cond:
+                current = self._effects.get(channel)
+            if current is None or (current is not effect and current.asset != effect.asset):
+                # 调用后端期间效果被 cancel/preempt 停止或被替换，关闭可能早于本次开启，重新关闭；
+                # 被使用同一硬件(资源相同)的新效果替换时由新效果的节拍决定硬件状态
+                self._apply(channel, False, 0, effect.asset)
+            elif current is effect and effect.requested_at is not None:
+                self.start_latency[channel] = time.monotonic() - effect.requested_at
+                effect.requested_at = None
+
+    def _next_step(self):
+        """
+        等待下一个到期的节拍并在锁内决定要执行的操作
+
+        Returns:
+            (通道, 是否开启, 时长, 效果)；节拍已失效时为 _SKIP；调度器停止时为 None
+        """
+        with self._cond:
+            while self._running:
+                if self._timers:
+                    delay = self._timers[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+            if not self._running:
+                return None
+            due, _, channel, generation = heapq.heappop(self._timers)
+            effect = self._effects.get(channel)
+            if effect is None or effect.generation != generation:
+                # 效果已被取消或替换
+                return _SKIP
+            if effect.index >= len(effect.steps):
+                effect.index = 0
+                if effect.repeat is not None:
+                    effect.repeat -= 1
+            if effect.repeat is not None and effect.repeat <= 0:
+                del self._effects[channel]
+                return channel, False, 0, effect
+            on, duration = effect.steps[effect.index]
+            effect.index += 1
+            self._schedule(due + duration, channel, generation)
+            return channel, on, duration, effect
+
+    def _apply(self, channel, on, duration, asset):
+        try:
+            if channel == CHANNEL_FLASH:
+                self.backend.flash(on)
+            elif channel == CHANNEL_VIBRATE:
+                self.backend.vibrate(on, duration)
+            else:
+                self.backend.sound(on, duration, asset)
+        except Exception:
+            # 硬件调用失败不能影响其他通道的节拍
+            pass
@@ -0,0 +1,817 @@
+import asyncio
+import collections
+import selectors
+import socket
+import threading
+import time
+
+from framing import FRAMING_NDJSON, FrameError, encode_message
+
+# 监听队列长度，监控主机批量重连时过小的队列会丢弃SYN，发送方要等待重传
+DEFAULT_BACKLOG = 512
+# 最大同时连接数，超出时新连接收到错误响应后被关闭；None 表示不限制
+DEFAULT_MAX_CONNECTIONS = 1024
+# 连接在该时长(秒)内没有收到任何数据即关闭，回收重启主机留下的半开连接；None 表示不限制
+DEFAULT_IDLE_TIMEOUT = 300
+# 连接空闲超过该时长(秒)时发送 {"type": "ping"} 心跳，对端回复 pong 即视为活动；None 表示不发送
+DEFAULT_HEARTBEAT_INTERVAL = None
+# TCP keepalive 参数: (空闲秒数, 探测间隔秒数, 探测次数)；None 表示不启用
+DEFAULT_KEEPALIVE = (60, 10, 5)
+# 检查空闲连接的间隔(秒)
+REAP_INTERVAL = 1.0
+# 旧版发送方不带换行符的原始文本在连接空闲该时长(秒)后作为一条消息处理
+UNTERMINATED_IDLE = 0.5
+
+PING_MESSAGE = {'type': 'ping'}
+REJECT_MESSAGE = {'status': 'error', 'message': '连接数已达上限'}
+
+
+def set_keepalive(sock, keepalive):
+    """
+    启用TCP keepalive，平台不支持的参数被忽略
+
+    Args:
+        sock: 套接字
+        keepalive: (空闲秒数, 探测间隔秒数, 探测次数)，为 None 时不做任何操作
+    """
+    if not keepalive:
+        return
+    idle, interval, count = keepalive
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    except OSError:
+        return
+    for name, value in (('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', interval), ('TCP_KEEPCNT', count)):
+        option = getattr(socket, name, None)
+        if option is None:
+            continue
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, option, value)
+        except OSError:
+            pass
+
+
+class BaseEngine:
+    """
+    传输引擎基类
+
+    引擎只负责套接字的接入与读写，每个连接持有一个 NetworkManager.create_decoder
+    创建的分帧解码器，收到的数据统一交给 NetworkManager.process_received
+    (已用 recv_into 读入解码器缓冲区)或 process_data 处理，
+    其返回的响应原样写回该连接；连接事件通过 NetworkManager.notify 上报。
+    消息的分发和处理都在 NetworkManager 之后进行，更换引擎不影响上层代码。
+
+    子类实现 start/stop/connection_count/_write/_abort，并在连接建立和断开时调用
+    _connected/_disconnected 登记连接，send 即可按地址向客户端主动发送消息。
+    连接对象需有 address、decoder、last_active 和 last_ping 属性，子类每收到数据就更新
+    last_active，并定期调用 _reap(或对单个连接调用 _reap_peer)关闭空闲连接、发送心跳。
+    对端关闭连接时调用 _flush_remaining，处理解码器中剩余的不带换行符的数据。
+    """
+
+    name = None
+
+    def __init__(self, manager, backlog=DEFAULT_BACKLOG, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+                 keepalive=DEFAULT_KEEPALIVE):
+        """
+        初始化传输引擎
+
+        Args:
+            manager: 所属的 NetworkManager 实例
+            backlog: 监听队列长度
+            max_connections: 最大同时连接数，None 表示不限制
+            idle_timeout: 空闲连接超时(秒)，None 表示不限制
+            heartbeat_interval: 空闲连接的心跳间隔(秒)，None 表示不发送
+            keepalive: TCP keepalive 参数 (空闲秒数, 探测间隔秒数, 探测次数)，None 表示不启用
+        """
+        self.manager = manager
+        self.backlog = backlog
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.keepalive = keepalive
+        self.is_listening = False
+        # 客户端地址 -> 连接对象
+        self.peers = {}
+        self.rejected = 0
+        self.idle_closed = 0
+        self.pings = 0
+
+    @property
+    def reaping(self):
+        """是否需要定期检查空闲连接"""
+        return bool(self.idle_timeout or self.heartbeat_interval)
+
+    def start(self, host, port):
+        """
+        启动监听
+
+        Args:
+            host: 监听地址
+            port: 监听端口
+
+        Raises:
+            OSError: 绑定或监听失败
+        """
+        raise NotImplementedError
+
+    def stop(self):
+        """停止监听并关闭所有连接"""
+        raise NotImplementedError
+
+    def connection_count(self):
+        """返回当前活动连接数"""
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        返回连接管理统计
+
+        Returns:
+            dict: 当前连接数、被拒绝的连接数、因空闲关闭的连接数和已发送的心跳数
+        """
+        return {
+            'connections': self.connection_count(),
+            'rejected': self.rejected,
+            'idle_closed': self.idle_closed,
+            'pings': self.pings,
+        }
+
+    def send(self, address, message):
+        """
+        通过已建立的连接向客户端发送一条消息，使用该连接的分帧方式，可在任意线程调用
+
+        Args:
+            address: 客户端地址 (ip, port)
+            message: 消息字典
+
+        Returns:
+            bool: 连接存在并已写入(或已排入写队列)时返回True，连接已断开时返回False
+
+        Raises:
+            OSError: 写入失败
+        """
+        peer = self.peers.get(tuple(address))
+        if peer is None:
+            return False
+        self._write(peer, encode_message(message, peer.decoder.framing, peer.decoder.codec))
+        return True
+
+    def disconnect(self, address):
+        """
+        关闭与客户端的连接，可在任意线程调用
+
+        Args:
+            address: 客户端地址 (ip, port)
+
+        Returns:
+            bool: 连接存在时返回True
+        """
+        peer = self.peers.get(tuple(address))
+        if peer is None:
+            return False
+        self._abort(peer)
+        return True
+
+    def _write(self, peer, data):
+        raise NotImplementedError
+
+    def _abort(self, peer):
+        """立即关闭连接，连接的清理和 _disconnected 由引擎的正常关闭流程完成"""
+        raise NotImplementedError
+
+    def _full(self):
+        return self.max_connections is not None and self.connection_count() >= self.max_connections
+
+    def _prepare(self, sock):
+        """为新接受的连接设置套接字选项"""
+        set_keepalive(sock, self.keepalive)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+
+    def _reject(self, address):
+        self.rejected += 1
+        self.manager.notify({
+            "type": "error",
+            "message": f"连接数已达上限 {self.max_connections}，拒绝来自 {address[0]}:{address[1]} 的连接"
+        })
+
+    def _reap(self):
+        """检查所有连接，见 _reap_peer"""
+        now = time.monotonic()
+        for peer in list(self.peers.values()):
+            self._reap_peer(peer, now)
+
+    def _reap_peer(self, peer, now):
+        """处理空闲连接中等待换行符的原始文本，关闭空闲超时的连接，向空闲超过心跳间隔的连接发送心跳"""
+        idle = now - peer.last_active
+        if peer.decoder.unterminated and idle >= UNTERMINATED_IDLE:
+            self._flush_remaining(peer)
+        if self.idle_timeout and idle >= self.idle_timeout:
+            self.idle_closed += 1
+            self._abort(peer)
+        elif (self.heartbeat_interval and idle >= self.heartbeat_interval
+              and now - peer.last_ping >= self.heartbeat_interval):
+            peer.last_ping = now
+            self.pings += 1
+            try:
+                self._write(peer, encode_message(PING_MESSAGE, peer.decoder.framing, peer.decoder.codec))
+            except OSError:
+                self._abort(peer)
+
+    def _flush_remaining(self, peer):
+        """处理解码器中剩余的未结束数据并回写响应，连接即将关闭时响应可能写不出去"""
+        response = self.manager.process_remaining(peer.address, peer.decoder)
+        if response:
+            try:
+                self._write(peer, response)
+            except OSError:
+                pass
+
+    def _connected(self, address, peer):
+        self.peers[address] = peer
+        self.manager.notify({
+            "type": "connection",
+            "message": f"接受来自 {address[0]}:{address[1]} 的连接"
+        })
+
+    def _disconnected(self, address):
+        self.peers.pop(address, None)
+        self.manager.notify({
+            "type": "disconnection",
+            "message": f"客户端 {address[0]}:{address[1]} 已断开连接"
+        })
+
+
+class _ThreadPeer:
+    """线程引擎的连接，接收线程回写响应和其他线程主动发送共用一把锁，避免数据交错"""
+
+    __slots__ = ('sock', 'address', 'decoder', 'lock', 'last_active', 'last_ping')
+
+    def __init__(self, sock, address, decoder):
+        self.sock = sock
+        self.address = address
+        self.decoder = decoder
+        self.lock = threading.Lock()
+        self.last_active = self.last_ping = time.monotonic()
+
+
+class ThreadedEngine(BaseEngine):
+    """
+    每个连接一个线程的传输引擎（默认）
+
+    接收线程的 recv 按心跳间隔(或空闲超时)超时返回，由接收线程自己发送心跳、
+    关闭空闲连接，不会因为某个连接写入阻塞而影响其他连接。
+    """
+
+    name = 'thread'
+
+    def __init__(self, manager, **options):
+        super().__init__(manager, **options)
+        self.socket = None
+        self.connection_thread = None
+        self.client_handlers = set()
+        self._lock = threading.Lock()
+
+    def start(self, host, port):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.socket.bind((host, port))
+            self.socket.listen(self.backlog)
+        except OSError:
+            self.socket.close()
+            self.socket = None
+            raise
+        self.is_listening = True
+
+        # 在新线程中接受连接
+        self.connection_thread = threading.Thread(target=self.accept_connections)
+        self.connection_thread.daemon = True
+        self.connection_thread.start()
+
+    def stop(self):
+        self.is_listening = False
+        if self.socket:
+            # 只 close 不会唤醒阻塞在 accept 中的线程，反复启停时线程会越积越多
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.socket.close()
+            self.socket = None
+        for peer in list(self.peers.values()):
+            self._abort(peer)
+
+    def connection_count(self):
+        with self._lock:
+            return len(self.client_handlers)
+
+    def accept_connections(self):
+        """接受客户端连接"""
+        while self.is_listening:
+            try:
+                client_socket, address = self.socket.accept()
+            except:
+                # 如果socket被关闭，退出循环
+                break
+
+            if self._full():
+                self._reject(address)
+                self._refuse(client_socket)
+                continue
+            self._prepare(client_socket)
+
+            # 创建客户端处理线程
+            client_thread = threading.Thread(
+                target=self.handle_client,
+                args=(client_socket, address)
+            )
+            client_thread.daemon = True
+
+            # 保存线程引用，线程结束时移除
+            with self._lock:
+                self.client_handlers.add(client_thread)
+            client_thread.start()
+
+    def _refuse(self, client_socket):
+        try:
+            client_socket.settimeout(1)
+            client_socket.sendall(encode_message(REJECT_MESSAGE, FRAMING_NDJSON))
+        except OSError:
+            pass
+        finally:
+            client_socket.close()
+
+    def handle_client(self, client_socket, address):
+        """
+        处理客户端连接
+
+        Args:
+            client_socket: 客户端套接字
+            address: 客户端地址
+        """
+        peer = _ThreadPeer(client_socket, address, self.manager.create_decoder())
+        # 超时后检查空闲时长；写入同样受此超时限制，长期不读取数据的对端会被断开
+        timeout = self.heartbeat_interval or self.idle_timeout
+        client_socket.settimeout(timeout)
+        self._connected(address, peer)
+        try:
+            while self.is_listening:
+                try:
+                    # 直接读入连接解码器的缓冲区，缓冲区在消息之间复用
+                    size = client_socket.recv_into(peer.decoder.get_buffer())
+                except socket.timeout:
+                    self._reap_peer(peer, time.monotonic())
+                    if not peer.decoder.unterminated and client_socket.gettimeout() != timeout:
+                        client_socket.settimeout(timeout)
+                    continue
+                if not size:
+                    self._flush_remaining(peer)
+                    break
+                peer.last_active = time.monotonic()
+
+                response = self.manager.process_received(size, address, peer.decoder)
+                if response:
+                    self._write(peer, response)
+                if peer.decoder.unterminated:
+                    # 等待换行符的原始文本在连接空闲后处理，不必等到下一次心跳检查
+                    client_socket.settimeout(UNTERMINATED_IDLE)
+        except:
+            pass
+        finally:
+            client_socket.close()
+            with self._lock:
+                self.client_handlers.discard(threading.current_thread())
+            self._disconnected(address)
+
+    def _write(self, peer, data):
+        with peer.lock:
+            peer.sock.sendall(data)
+
+    def _abort(self, peer):
+        # shutdown 使阻塞在 recv 上的接收线程立即返回，由接收线程关闭套接字
+        try:
+            peer.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class _AsyncioClientProtocol(asyncio.BufferedProtocol):
+    """
+    asyncio 单连接协议，不为连接创建任务或流对象，保持每连接内存开销最小
+
+    事件循环把数据直接读入连接解码器的缓冲区(BufferedProtocol)，不为每次读取创建字节串。
+    """
+
+    __slots__ = ('engine', 'transport', 'address', 'decoder', 'last_active', 'last_ping', 'accepted')
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.transport = None
+        self.address = None
+        self.decoder = engine.manager.create_decoder()
+        self.last_active = self.last_ping = time.monotonic()
+        self.accepted = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.address = transport.get_extra_info('peername')[:2]
+        if self.engine._full():
+            self.engine._reject(self.address)
+            transport.write(encode_message(REJECT_MESSAGE, FRAMING_NDJSON))
+            transport.close()
+            return
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            self.engine._prepare(sock)
+        self.accepted = True
+        self.engine._connected(self.address, self)
+
+    def get_buffer(self, sizehint):
+        return self.decoder.get_buffer()
+
+    def buffer_updated(self, nbytes):
+        if not self.accepted:
+            return
+        self.last_active = time.monotonic()
+        try:
+            response = self.engine.manager.process_received(nbytes, self.address, self.decoder)
+        except FrameError:
+            self.transport.close()
+            return
+        if response:
+            self.transport.write(response)
+
+    def eof_received(self):
+        if self.accepted:
+            response = self.engine.manager.process_remaining(self.address, self.decoder)
+            if response:
+                self.transport.write(response)
+
+    def connection_lost(self, exc):
+        if self.accepted:
+            self.engine._disconnected(self.address)
+
+
+class AsyncioEngine(BaseEngine):
+    """
+    asyncio 传输引擎
+
+    所有连接运行在同一个后台线程的事件循环上，线程数与连接数无关。
+    """
+
+    name = 'asyncio'
+
+    def __init__(self, manager, **options):
+        super().__init__(manager, **options)
+        self.loop = None
+        self.server = None
+        self.loop_thread = None
+        self._reaper = None
+
+    def start(self, host, port):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.server = self.loop.run_until_complete(self.loop.create_server(
+                lambda: _AsyncioClientProtocol(self),
+                host, port,
+                reuse_address=True,
+                backlog=self.backlog
+            ))
+        except Exception:
+            self.loop.close()
+            self.loop = None
+            raise
+
+        self.is_listening = True
+        if self.reaping:
+            self._reaper = self.loop.call_later(REAP_INTERVAL, self._reap_periodically)
+
+        # 事件循环在独立线程中运行，避免阻塞UI主循环
+        self.loop_thread = threading.Thread(target=self._run_loop)
+        self.loop_thread.daemon = True
+        self.loop_thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def _reap_periodically(self):
+        self._reap()
+        self._reaper = self.loop.call_later(REAP_INTERVAL, self._reap_periodically)
+
+    def _shutdown(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        self.server.close()
+        for protocol in list(self.peers.values()):
+            protocol.transport.close()
+        # 让 connection_lost 回调先执行完再停止循环
+        self.loop.call_soon(self.loop.stop)
+
+    def stop(self):
+        if not self.is_listening:
+            return
+        self.is_listening = False
+        self.loop.call_soon_threadsafe(self._shutdown)
+        if self.loop_thread is not threading.current_thread():
+            self.loop_thread.join(timeout=5)
+        self.loop_thread = None
+        self.server = None
+
+    def connection_count(self):
+        return len(self.peers)
+
+    def _write(self, peer, data):
+        # 传输对象只能在事件循环线程中使用
+        self.loop.call_soon_threadsafe(peer.transport.write, data)
+
+    def _abort(self, peer):
+        self.loop.call_soon_threadsafe(peer.transport.abort)
+
+
+# selectors 引擎每次 recv_into 读入的最大字节数
+RECV_BUFFER_SIZE = 64 * 1024
+# selectors 引擎每个连接写队列的上限(字节)，对端长期不读取时关闭连接，避免写队列无限增长
+MAX_WRITE_QUEUE = 4 * 1024 * 1024
+
+
+class _SelectorPeer:
+    """selectors 引擎的连接，待发送的数据排在写队列中，由事件循环线程写出"""
+
+    __slots__ = ('sock', 'address', 'decoder', 'out', 'queued', 'writing', 'last_active', 'last_ping')
+
+    def __init__(self, sock, address, decoder):
+        self.sock = sock
+        self.address = address
+        self.decoder = decoder
+        self.out = collections.deque()
+        self.queued = 0
+        self.writing = False
+        self.last_active = self.last_ping = time.monotonic()
+
+
+class SelectorsEngine(BaseEngine):
+    """
+    selectors 传输引擎
+
+    单个线程通过 selectors(Linux 下为 epoll)驱动所有非阻塞连接，不依赖 asyncio。
+    所有连接共用一个预先分配的读缓冲区，用 recv_into 读入后以 memoryview 交给
+    连接的分帧解码器，解码器只保存尚未组成完整帧的数据，空闲连接不占用整块读缓冲区，
+    接收数据时不再为每次 recv 分配新的字节串；响应和主动发送的
+    消息进入连接的写队列，套接字可写时再写出，慢速接收方不会阻塞其他连接。
+    """
+
+    name = 'selectors'
+
+    def __init__(self, manager, buffer_size=RECV_BUFFER_SIZE, max_write_queue=MAX_WRITE_QUEUE, **options):
+        super().__init__(manager, **options)
+        self.max_write_queue = max_write_queue
+        self.socket = None
+        self.selector = None
+        self.loop_thread = None
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        # 其他线程排入写队列或要求关闭的连接，由事件循环线程处理
+        self._pending = set()
+        self._aborting = set()
+        self._lock = threading.Lock()
+        self._wakeup_r = None
+        self._wakeup_w = None
+
+    def start(self, host, port):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.socket.bind((host, port))
+            self.socket.listen(self.backlog)
+        except OSError:
+            self.socket.close()
+            self.socket = None
+            raise
+        self.socket.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self.selector.register(self.socket, selectors.EVENT_READ, self._accept)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, self._drain_wakeup)
+
+        self.is_listening = True
+
+        self.loop_thread = threading.Thread(target=self._run_loop)
+        self.loop_thread.daemon = True
+        self.loop_thread.start()
+
+    def stop(self):
+        if not self.is_listening:
+            return
+        self.is_listening = False
+        self._wakeup()
+        if self.loop_thread is not threading.current_thread():
+            self.loop_thread.join(timeout=5)
+        self.loop_thread = None
+
+    def connection_count(self):
+        return len(self.peers)
+
+    def _write(self, peer, data):
+        if threading.current_thread() is self.loop_thread:
+            self._queue(peer, data)
+            return
+        with self._lock:
+            peer.out.append(data)
+            peer.queued += len(data)
+            self._pending.add(peer)
+        self._wakeup()
+
+    def _abort(self, peer):
+        if threading.current_thread() is self.loop_thread:
+            self._close(peer)
+            return
+        with self._lock:
+            self._aborting.add(peer)
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            # 唤醒数据已经排满或循环已关闭，事件循环必然会醒来
+            pass
+
+    def _run_loop(self):
+        timeout = REAP_INTERVAL if self.reaping else None
+        next_reap = time.monotonic() + REAP_INTERVAL
+        try:
+            while self.is_listening:
+                for key, events in self.selector.select(timeout):
+                    if callable(key.data):
+                        # 监听套接字和唤醒套接字
+                        key.data()
+                        continue
+                    peer = key.data
+                    if events & selectors.EVENT_READ and not self._read(peer):
+                        continue
+                    if events & selectors.EVENT_WRITE:
+                        self._flush(peer)
+                if self.reaping and time.monotonic() >= next_reap:
+                    self._reap()
+                    next_reap = time.monotonic() + REAP_INTERVAL
+        finally:
+            for peer in list(self.peers.values()):
+                self._close(peer)
+            self.selector.close()
+            self.socket.close()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
+            self.selector = None
+            self.socket = None
+
+    def _accept(self):
+        while True:
+            try:
+                client_socket, address = self.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            address = address[:2]
+            client_socket.setblocking(False)
+            if self._full():
+                self._reject(address)
+                try:
+                    client_socket.send(encode_message(REJECT_MESSAGE, FRAMING_NDJSON))
+                except OSError:
+                    pass
+                client_socket.close()
+                continue
+            self._prepare(client_socket)
+            peer = _SelectorPeer(client_socket, address, self.manager.create_decoder())
+            self.selector.register(client_socket, selectors.EVENT_READ, peer)
+            self._connected(address, peer)
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            aborting, self._aborting = self._aborting, set()
+        for peer in aborting:
+            self._close(peer)
+        for peer in pending:
+            if peer.address in self.peers:
+                self._flush(peer)
+
+    def _read(self, peer):
+        """读取一次数据并处理，连接已关闭时返回False"""
+        try:
+            size = peer.sock.recv_into(self._buffer)
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            self._close(peer)
+            return False
+        if not size:
+            self._flush_remaining(peer)
+            self._close(peer)
+            return False
+        peer.last_active = time.monotonic()
+        try:
+            response = self.manager.process_data(self._view[:size], peer.address, peer.decoder)
+        except FrameError:
+            self._close(peer)
+            return False
+        if response:
+            self._queue(peer, response)
+        return True
+
+    def _queue(self, peer, data):
+        with self._lock:
+            peer.out.append(data)
+            peer.queued += len(data)
+        self._flush(peer)
+
+    def _flush(self, peer):
+        """尽量写出写队列中的数据，写不完时注册可写事件，写完后取消"""
+        with self._lock:
+            while peer.out:
+                data = peer.out[0]
+                try:
+                    sent = peer.sock.send(data)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    peer.out.clear()
+                    peer.queued = 0
+                    break
+                peer.queued -= sent
+                if sent < len(data):
+                    peer.out[0] = memoryview(data)[sent:]
+                    break
+                peer.out.popleft()
+            writing = bool(peer.out)
+            overflow = peer.queued > self.max_write_queue
+        if overflow:
+            self.manager.notify({
+                "type": "error",
+                "message": f"客户端 {peer.address[0]}:{peer.address[1]} 长时间不读取数据，写队列超过上限，连接已关闭"
+            })
+            self._close(peer)
+            return
+        if writing != peer.writing and peer.address in self.peers:
+            peer.writing = writing
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self.selector.modify(peer.sock, events, peer)
+
+    def _close(self, peer):
+        if self.peers.get(peer.address) is not peer:
+            return
+        try:
+            self.selector.unregister(peer.sock)
+        except (KeyError, ValueError):
+            pass
+        peer.sock.close()
+        self._disconnected(peer.address)
+
+
+ENGINES = {
+    ThreadedEngine.name: ThreadedEngine,
+    AsyncioEngine.name: AsyncioEngine,
+    SelectorsEngine.name: SelectorsEngine,
+}
+
+
+def create_engine(name, manager, **options):
+    """
+    按名称创建传输引擎
+
+    Args:
+        name: 引擎名称('thread'、'asyncio' 或 'selectors')，也可以直接传入 BaseEngine 的子类
+        manager: 所属的 NetworkManager 实例
+        **options: 连接管理参数，见 BaseEngine.__init__
+
+    Returns:
+        BaseEngine: 引擎实例
+
+    Raises:
+        ValueError: 未知的引擎名称
+    """
+    if isinstance(name, type) and issubclass(name, BaseEngine):
+        return name(manager, **options)
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"未知的传输引擎: {name}")
+    return engine_class(manager, **options)
@@ -0,0 +1,370 @@
+import json
+import re
+import struct
+
+from wire_codecs import JSON_CODEC
+
+# 分帧方式
+FRAMING_AUTO = 'auto'      # 按连接的首字节自动协商
+FRAMING_NDJSON = 'ndjson'  # 每行一个JSON，以换行符结尾
+FRAMING_LENGTH = 'length'  # 4字节大端长度前缀 + 消息体
+
+FRAMINGS = (FRAMING_AUTO, FRAMING_NDJSON, FRAMING_LENGTH)
+
+# 单帧最大字节数，防止异常数据撑爆缓冲区
+MAX_FRAME_SIZE = 1024 * 1024
+
+LENGTH_HEADER = struct.Struct('!I')
+
+# 每个连接接收缓冲区的初始大小(字节)，每次 recv_into 至少预留其一半的空间
+RECV_BUFFER_SIZE = 8 * 1024
+
+# NDJSON 帧首尾去掉的空白字符，与 bytes.strip() 相同
+_WHITESPACE = b' \t\n\r\x0b\x0c'
+
+_json_decoder = json.JSONDecoder()
+
+# 匹配旧版不带换行符的JSON时关注的字符：字符串外的括号和引号、字符串内的引号和反斜杠
+_STRUCTURE = re.compile(rb'[][{}"]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+
+
+class FrameError(ValueError):
+    """数据流无法分帧(帧过大或长度前缀非法)，连接需要关闭"""
+
+
+class StreamDecoder:
+    """
+    增量分帧解码器
+
+    每个连接持有一个实例，接收数据有两种方式：
+        recv_into(sock)(或 get_buffer + commit)：套接字数据直接读入解码器的缓冲区，完整的帧以
+            指向缓冲区的 memoryview 返回，接收和分帧都不分配新的字节串；
+        feed(data)：写入已接收的数据，默认返回帧的字节串副本。
+    memoryview 帧只在下一次读入之前有效，调用方需在此之前解析完毕(NetworkManager 收到后立即解码)。
+    缓冲区在消息之间复用，已消费的数据在需要空间时才前移。recv_into 第一次读入时按 buffer_size
+    分配缓冲区；feed 只按写入的数据量扩大，由共用读缓冲区的引擎写入时每个连接只占用与消息大小相当的内存。
+    超过 buffer_size 的缓冲区在数据消费完后释放，避免一条超大帧长期占用内存。
+
+    FRAMING_AUTO 模式根据连接的首字节协商：0x00 视为长度前缀
+    (单帧小于16MB时长度最高字节必为0)，否则按 NDJSON 处理。
+    NDJSON 模式兼容旧版不带换行符的发送方：缓冲区中没有换行符时，
+    若数据本身是一个或多个完整的JSON对象，同样会被切分成帧。括号从上一次停下的位置继续匹配，
+    分多次到达的大消息不会被反复解析。不是JSON的原始文本可能只收到了一部分，
+    保留到收到换行符、连接空闲或关闭时由 flush 取出(unterminated 为 True)。
+
+    codec 记录该连接协商的消息编码(wire_codecs.Codec)，由 NetworkManager 在收到第一帧时设置。
+    """
+
+    def __init__(self, framing=FRAMING_AUTO, max_frame_size=MAX_FRAME_SIZE, buffer_size=RECV_BUFFER_SIZE):
+        """
+        初始化解码器
+
+        Args:
+            framing: 分帧方式，FRAMINGS 之一
+            max_frame_size: 单帧最大字节数
+            buffer_size: 接收缓冲区的初始大小(字节)
+        """
+        if framing not in FRAMINGS:
+            raise ValueError(f"未知的分帧方式: {framing}")
+        self.framing = framing
+        self.max_frame_size = max_frame_size
+        self.buffer_size = buffer_size
+        self.codec = None
+        self._buffer = bytearray()
+        self._view = memoryview(self._buffer)
+        self._start = 0   # 未消费数据的起始位置
+        self._end = 0     # 已写入数据的结束位置
+        self._scan = 0    # 下一次查找换行符的起始位置
+        # 匹配不带换行符的JSON的进度：下一次扫描的位置、括号深度、是否在字符串中、是否已判定为原始文本
+        self._object_scan = 0
+        self._depth = 0
+        self._in_string = False
+        self._raw = False
+
+    @property
+    def pending(self):
+        """缓冲区中尚未组成完整帧的字节数"""
+        return self._end - self._start
+
+    @property
+    def unterminated(self):
+        """缓冲区中是否有等待换行符的原始文本(旧版发送方)，连接空闲或关闭时用 flush 取出"""
+        return self._raw and self._end > self._start
+
+    def get_buffer(self, size_hint=None):
+        """
+        返回缓冲区中可写入的空间，写入后调用 commit
+
+        Args:
+            size_hint: 至少需要的字节数；默认至少留出 buffer_size 的一半，缓冲区第一次按 buffer_size 分配
+
+        Returns:
+            memoryview: 可写入的空间，下一次调用 get_buffer、commit 或 feed 之前有效
+        """
+        if size_hint is None:
+            need, minimum = self.buffer_size // 2 or 1, self.buffer_size
+        else:
+            need, minimum = size_hint, 0
+        if len(self._buffer) - self._end < need:
+            self._reserve(need, minimum)
+        return self._view[self._end:]
+
+    def commit(self, size):
+        """
+        确认已写入 get_buffer 返回的空间的字节数，取出所有完整的帧
+
+        Args:
+            size: 写入的字节数
+
+        Returns:
+            list: 完整帧的 memoryview 列表(不含分帧头和换行符)，下一次读入之前有效
+
+        Raises:
+            FrameError: 帧长度超过上限
+        """
+        self._end += size
+        if self.framing == FRAMING_AUTO and self.pending:
+            self.framing = FRAMING_LENGTH if self._buffer[self._start] == 0 else FRAMING_NDJSON
+
+        if self.framing == FRAMING_LENGTH:
+            frames = self._split_length()
+        else:
+            frames = self._split_lines()
+
+        if self._start == self._end:
+            self._start = self._end = self._scan = 0
+            self._reset_object()
+            if len(self._buffer) > self.buffer_size:
+                self._release()
+        if self.pending > self.max_frame_size + LENGTH_HEADER.size:
+            raise FrameError(f"帧长度超过上限 {self.max_frame_size} 字节")
+        return frames
+
+    def recv_into(self, sock):
+        """
+        从套接字读取一次数据并取出所有完整的帧
+
+        Args:
+            sock: 套接字
+
+        Returns:
+            tuple: (读取的字节数, 完整帧的 memoryview 列表)，字节数为0表示对端已关闭连接
+
+        Raises:
+            OSError: 读取失败(包括超时)
+            FrameError: 帧长度超过上限
+        """
+        size = sock.recv_into(self.get_buffer())
+        return size, (self.commit(size) if size else [])
+
+    def feed(self, data, copy=True):
+        """
+        写入新数据并取出所有完整的帧
+
+        Args:
+            data: 新接收的字节数据
+            copy: 为True时返回帧的字节串副本；为False时返回 memoryview，与 commit 相同只在下一次读入之前有效
+
+        Returns:
+            list: 完整帧的列表(不含分帧头和换行符)
+
+        Raises:
+            FrameError: 帧长度超过上限
+        """
+        size = len(data)
+        self.get_buffer(size)[:size] = data
+        frames = self.commit(size)
+        if copy:
+            return [bytes(frame) for frame in frames]
+        return frames
+
+    def flush(self):
+        """
+        取出缓冲区中剩余的未结束数据，在连接关闭或空闲时调用
+
+        NDJSON 模式下剩余数据(没有换行符的原始文本，或未接收完整的JSON)去掉首尾空白后作为最后一帧返回；
+        长度前缀模式下不完整的帧无法解析，保留在缓冲区中。
+
+        Returns:
+            list: 帧的字节串列表，没有剩余数据时为空
+        """
+        if self.framing != FRAMING_NDJSON or not self.pending:
+            return []
+        data = bytes(self._view[self._start:self._end]).strip()
+        self._start = self._end = self._scan = 0
+        self._reset_object()
+        return [data] if data else []
+
+    def _reserve(self, need, minimum):
+        """前移未消费的数据，空间仍不足时换用更大的缓冲区"""
+        pending = self.pending
+        if pending + need <= len(self._buffer):
+            # 只移动尚未组成完整帧的数据；之前返回的帧已按约定解析完毕
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        else:
+            # 换用新缓冲区而不是原地扩大，仍被引用的 memoryview 不会阻止扩大
+            buffer = bytearray(max(len(self._buffer) * 2, pending + need, minimum))
+            buffer[:pending] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        self._scan = max(self._scan - self._start, 0)
+        self._object_scan = max(self._object_scan - self._start, 0)
+        self._start = 0
+        self._end = pending
+
+    def _release(self):
+        self._buffer = bytearray()
+        self._view = memoryview(self._buffer)
+
+    def _split_length(self):
+        frames = []
+        buffer = self._buffer
+        view = self._view
+        header_size = LENGTH_HEADER.size
+        while self._end - self._start >= header_size:
+            (size,) = LENGTH_HEADER.unpack_from(buffer, self._start)
+            if size > self.max_frame_size:
+                raise FrameError(f"帧长度 {size} 超过上限 {self.max_frame_size} 字节")
+            end = self._start + header_size + size
+            if end > self._end:
+                break
+            frames.append(view[self._start + header_size:end])
+            self._start = end
+        return frames
+
+    def _reset_object(self):
+        self._object_scan = self._depth = 0
+        self._in_string = self._raw = False
+
+    def _split_lines(self):
+        frames = []
+        buffer = self._buffer
+        start = self._start
+        while True:
+            index = buffer.find(b'\n', max(self._scan, self._start), self._end)
+            if index < 0:
+                self._scan = self._end
+                break
+            # 去掉首尾空白(如 \r\n 结尾)，不复制数据
+            begin, stop = self._start, index
+            while begin < stop and buffer[begin] in _WHITESPACE:
+                begin += 1
+            while stop > begin and buffer[stop - 1] in _WHITESPACE:
+                stop -= 1
+            if stop > begin:
+                frames.append(self._view[begin:stop])
+            self._start = index + 1
+        if self._start != start:
+            # 换行符之前的数据已作为帧取出，不带换行符的数据从头匹配
+            self._reset_object()
+        if self.pending:
+            frames.extend(self._split_unterminated())
+        return frames
+
+    def _split_unterminated(self):
+        """兼容旧版发送方：没有换行符的完整JSON(可能多个粘连)也作为帧返回，原始文本留在缓冲区中"""
+        frames = []
+        buffer = self._buffer
+        while not self._raw:
+            if not self._depth and not self._in_string:
+                # 跳过对象之间的空白，下一个对象必须以括号开始
+                start = self._start
+                while start < self._end and buffer[start] in _WHITESPACE:
+                    start += 1
+                self._start = start
+                if start == self._end:
+                    break
+                if buffer[start] not in b'{[':
+                    self._raw = True
+                    break
+                self._object_scan = start
+            end = self._scan_object()
+            if end < 0:
+                break
+            frame = self._view[self._start:end]
+            try:
+                _json_decoder.raw_decode(str(frame, 'utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                # 括号成对但不是JSON(如 "[WARN] ...")，按原始文本处理
+                self._raw = True
+                break
+            frames.append(frame)
+            self._start = end
+        return frames
+
+    def _scan_object(self):
+        """从上一次停下的位置继续匹配括号，返回顶层对象的结束位置，尚未接收完整时返回 -1"""
+        buffer = self._buffer
+        end = self._end
+        position = self._object_scan
+        depth = self._depth
+        in_string = self._in_string
+        while True:
+            if in_string:
+                match = _STRING_SPECIAL.search(buffer, position, end)
+                if match is None:
+                    position = end
+                    break
+                position = match.start()
+                if buffer[position] == 0x5c:
+                    if position + 1 == end:
+                        # 被转义的字符尚未收到，下次从反斜杠处继续
+                        break
+                    position += 2
+                    continue
+                in_string = False
+                position += 1
+                continue
+            match = _STRUCTURE.search(buffer, position, end)
+            if match is None:
+                position = end
+                break
+            position = match.end()
+            char = buffer[position - 1]
+            if char == 0x22:
+                in_string = True
+            elif char in b'{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth <= 0:
+                    self._object_scan = position
+                    self._depth = 0
+                    self._in_string = False
+                    return position
+        self._object_scan = position
+        self._depth = depth
+        self._in_string = in_string
+        return -1
+
+
+def encode_frame(payload, framing=FRAMING_NDJSON):
+    """
+    为消息体添加分帧信息
+
+    Args:
+        payload: 消息体字节串
+        framing: 分帧方式，FRAMING_AUTO 按 NDJSON 处理
+
+    Returns:
+        bytes: 可直接写入套接字的数据
+    """
+    if framing == FRAMING_LENGTH:
+        return LENGTH_HEADER.pack(len(payload)) + payload
+    return payload + b'\n'
+
+
+def encode_message(message, framing=FRAMING_NDJSON, codec=None):
+    """
+    将消息字典编码为带分帧信息的字节串
+
+    Args:
+        message: 消息字典
+        framing: 分帧方式
+        codec: 消息编码(wire_codecs.Codec)，默认JSON
+
+    Returns:
+        bytes: 可直接写入套接字的数据
+    """
+    return encode_frame((codec or JSON_CODEC).encode(message), framing)
@@ -0,0 +1,310 @@
+import json
+import sqlite3
+import threading
+import time
+
+# 数据库结构版本，保存在 PRAGMA user_version 中
+SCHEMA_VERSION = 2
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        type TEXT NOT NULL,
+        level TEXT,
+        command TEXT,
+        source_ip TEXT,
+        source_port INTEGER,
+        content TEXT,
+        payload TEXT,
+        message_id TEXT
+    )""",
+    # 索引条目中带有 id(rowid)，按时间倒序分页时不需要再排序
+    "CREATE INDEX IF NOT EXISTS alerts_ts ON alerts (ts)",
+    "CREATE INDEX IF NOT EXISTS alerts_level_ts ON alerts (level, ts)",
+    "CREATE INDEX IF NOT EXISTS alerts_source_ts ON alerts (source_ip, ts)",
+)
+
+INSERT_SQL = ("INSERT INTO alerts (ts, type, level, command, source_ip, source_port, content, payload, message_id) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+QUERY_COLUMNS = ('id', 'ts', 'type', 'level', 'command', 'source_ip', 'source_port', 'content')
+
+# 不写入 payload 的字段：来源单独成列，接收时间只在本次运行中有意义
+_PAYLOAD_EXCLUDED = ('source', 'received_at')
+
+
+def _row(ts, message):
+    """把消息转换为一行记录"""
+    source = message.get('source') or {}
+    payload = {key: value for key, value in message.items() if key not in _PAYLOAD_EXCLUDED}
+    command = message.get('command')
+    content = message.get('content')
+    message_id = message.get('id')
+    if content is None and command is not None:
+        content = f"{command} {json.dumps(message.get('params') or {}, ensure_ascii=False)}"
+    return (
+        ts,
+        str(message.get('type')),
+        message.get('level'),
+        command,
+        source.get('ip'),
+        source.get('port'),
+        None if content is None else str(content),
+        json.dumps(payload, ensure_ascii=False, default=str),
+        None if message_id is None else str(message_id),
+    )
+
+
+class AlertJournal:
+    """
+    设备上的警报日志
+
+    警报保存在 WAL 模式的 SQLite 数据库中，应用重启后仍可查询。record 只把消息
+    放入待写列表后立即返回，由一个写入线程按批写入，每批一个事务，处理消息的线程
+    和UI线程都不等待磁盘。查询使用单独的读连接，WAL 模式下读写互不阻塞。
+
+    分页查询按 (ts, id) 游标向更早的记录翻页，每一页都只走索引，
+    与已翻过的页数和总记录数无关。
+    """
+
+    def __init__(self, path, batch_size=1000, flush_interval=0.5, max_pending=100000):
+        """
+        初始化警报日志，数据库不存在时创建
+
+        Args:
+            path: 数据库文件路径
+            batch_size: 每个事务最多写入的记录数
+            flush_interval: 待写记录不足一批时最多等待的时长(秒)
+            max_pending: 待写列表的最大长度，写入跟不上时丢弃新记录并计数，不阻塞调用方
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_commit_ms = None
+        self._pending = []
+        self._submitted = 0
+        self._done = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._writer = None
+
+        self._write_conn = self._connect()
+        with self._write_conn:
+            for statement in SCHEMA:
+                self._write_conn.execute(statement)
+            self._migrate()
+            self._write_conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._read_conn = self._connect()
+        self._read_lock = threading.Lock()
+
+    def _migrate(self):
+        """升级旧版本创建的数据库"""
+        columns = {row[1] for row in self._write_conn.execute("PRAGMA table_info(alerts)")}
+        if 'message_id' not in columns:
+            # 版本1没有消息ID列
+            self._write_conn.execute("ALTER TABLE alerts ADD COLUMN message_id TEXT")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 只在检查点时同步，断电最多丢失最近提交的事务，数据库不会损坏
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        """启动写入线程"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._writer = threading.Thread(target=self._write_loop)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def record(self, message):
+        """
+        追加一条消息，立即返回，可在任意线程调用
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            bool: 是否已放入待写列表
+        """
+        ts = time.time()
+        with self._cond:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((ts, message))
+            self._submitted += 1
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def flush(self, timeout=5):
+        """
+        等待调用前追加的记录全部写入
+
+        Args:
+            timeout: 最长等待时间(秒)
+
+        Returns:
+            bool: 是否在超时前写完
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._submitted
+            self._cond.notify()
+            while self._done < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._running:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        """写完待写记录后停止写入线程并关闭数据库"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._writer and self._writer is not threading.current_thread():
+            self._writer.join(timeout=5)
+        self._writer = None
+        # 写入线程未启动时也不丢弃已追加的记录
+        self._write_pending()
+        self._write_conn.close()
+        with self._read_lock:
+            self._read_conn.close()
+
+    def query(self, level=None, source_ip=None, since=None, until=None, before=None, limit=50):
+        """
+        按时间倒序查询一页记录
+
+        Args:
+            level: 只返回该级别的警报
+            source_ip: 只返回来自该地址的消息
+            since: 起始时间戳(含)
+            until: 截止时间戳(不含)
+            before: 翻页游标 (ts, id)，取上一页最后一条记录的 ts 和 id，只返回比它更早的记录
+            limit: 每页记录数
+
+        Returns:
+            list: 记录字典列表，字段见 QUERY_COLUMNS
+        """
+        clauses, args = self._filters(level, source_ip, since, until)
+        if before is not None:
+            clauses.append("(ts, id) < (?, ?)")
+            args.extend(before)
+        sql = (f"SELECT {', '.join(QUERY_COLUMNS)} FROM alerts{self._where(clauses)} "
+               f"ORDER BY ts DESC, id DESC LIMIT ?")
+        args.append(limit)
+        with self._read_lock:
+            rows = self._read_conn.execute(sql, args).fetchall()
+        return [dict(zip(QUERY_COLUMNS, row)) for row in rows]
+
+    def recent_ids(self, limit=4096):
+        """
+        返回最近记录的消息ID，启动时用来恢复已处理消息ID集合
+
+        Args:
+            limit: 最多返回的ID数
+
+        Returns:
+            list: (来源IP, 消息ID) 列表，按时间从早到晚排列
+        """
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                "SELECT source_ip, message_id FROM alerts WHERE message_id IS NOT NULL "
+                "ORDER BY ts DESC LIMIT ?", (limit,)
+            ).fetchall()
+        rows.reverse()
+        return rows
+
+    def count(self, level=None, source_ip=None, since=None, until=None):
+        """
+        统计符合条件的记录数，参数同 query
+
+        Returns:
+            int: 记录数
+        """
+        clauses, args = self._filters(level, source_ip, since, until)
+        with self._read_lock:
+            return self._read_conn.execute(
+                f"SELECT COUNT(*) FROM alerts{self._where(clauses)}", args
+            ).fetchone()[0]
+
+    def stats(self):
+        """
+        返回写入统计
+
+        Returns:
+            dict: 待写记录数、已写入数、丢弃数、事务数、写入失败数和最近一次提交耗时
+        """
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'errors': self.errors,
+            'last_commit_ms': self.last_commit_ms,
+        }
+
+    def _filters(self, level, source_ip, since, until):
+        clauses, args = [], []
+        if level is not None:
+            clauses.append("level = ?")
+            args.append(level)
+        if source_ip is not None:
+            clauses.append("source_ip = ?")
+            args.append(source_ip)
+        if since is not None:
+            clauses.append("ts >= ?")
+            args.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            args.append(until)
+        return clauses, args
+
+    @staticmethod
+    def _where(clauses):
+        return f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                if self._running and len(self._pending) < self.batch_size:
+                    # 不足一批时再等一会儿，让突发的消息合并进同一个事务
+                    self._cond.wait(self.flush_interval if self._pending else None)
+                if not self._running:
+                    return
+            self._write_pending()
+
+    def _write_pending(self):
+        while True:
+            with self._cond:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:len(batch)]
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                rows = [_row(ts, message) for ts, message in batch]
+                with self._write_conn:
+                    self._write_conn.executemany(INSERT_SQL, rows)
+                self.written += len(batch)
+                self.batches += 1
+            except Exception:
+                # 写入失败的批次丢弃并计数，写入线程不能因此退出
+                self.errors += 1
+            self.last_commit_ms = round((time.perf_counter() - started) * 1000, 3)
+            with self._cond:
+                self._done += len(batch)
+                self._cond.notify_all()
@@ -0,0 +1,53 @@
+import threading
+from collections import deque
+
+
+class LogStore:
+    """
+    有界日志存储
+
+    任意线程都可以追加日志行，新日志进入固定长度的待刷新队列，由UI线程批量取出写入日志视图。
+    应用在后台暂停时 Kivy 时钟不运行、队列不会被取出，超出 max_lines 的旧日志自动淘汰，内存占用有上限。
+    """
+
+    def __init__(self, max_lines=500):
+        """
+        初始化日志存储
+
+        Args:
+            max_lines: 最多保留的待刷新日志行数
+        """
+        self.max_lines = max_lines
+        self._pending = deque(maxlen=max_lines)
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+
+    def append(self, line):
+        """
+        追加一行日志
+
+        Args:
+            line: 日志文本
+
+        Returns:
+            bool: 是否需要安排一次刷新；上次安排的刷新尚未执行时为False
+        """
+        with self._lock:
+            self._pending.append(line)
+            if self._flush_scheduled:
+                return False
+            self._flush_scheduled = True
+            return True
+
+    def drain(self):
+        """
+        取出所有待刷新的日志
+
+        Returns:
+            list: 本次新增的日志行(最多 max_lines 行)
+        """
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+            self._flush_scheduled = False
+        return pending
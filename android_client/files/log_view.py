@@ -0,0 +1,176 @@
+from datetime import datetime
+
+from kivy.clock import Clock
+from kivy.metrics import dp
+from kivy.uix.label import Label
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.recycleview import RecycleView
+
+
+class LogLine(Label):
+    """日志视图中的一行，高度随文本自动换行调整"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.halign = 'left'
+        self.valign = 'top'
+        self.size_hint_y = None
+        self.bind(width=self._update_text_size, texture_size=self._update_height)
+
+    def _update_text_size(self, instance, width):
+        self.text_size = (width, None)
+
+    def _update_height(self, instance, texture_size):
+        self.height = max(texture_size[1], dp(18))
+
+
+def _create_layout():
+    layout = RecycleBoxLayout(
+        orientation='vertical',
+        size_hint_y=None,
+        default_size=(None, dp(18)),
+        default_size_hint=(1, None),
+        padding=dp(4)
+    )
+    layout.bind(minimum_height=layout.setter('height'))
+    return layout
+
+
+def _rows(lines, font_name):
+    if font_name:
+        return [{'text': line, 'font_name': font_name} for line in lines]
+    return [{'text': line} for line in lines]
+
+
+def format_record(record):
+    """
+    把警报日志中的一条记录格式化为一行文本
+
+    Args:
+        record: AlertJournal.query 返回的记录字典
+
+    Returns:
+        str: 日志文本
+    """
+    timestamp = datetime.fromtimestamp(record['ts']).strftime("%m-%d %H:%M:%S")
+    kind = record['level'] or record['command'] or record['type']
+    return f"[{timestamp}] [{kind}] {record['source_ip'] or 'unknown'}: {record['content'] or ''}"
+
+
+class LogView(RecycleView):
+    """
+    基于 RecycleView 的日志视图
+
+    只为可见区域创建 LogLine 控件并循环复用，日志行数多时界面开销不随之增长。
+    """
+
+    def __init__(self, font_name=None, max_lines=500, **kwargs):
+        """
+        初始化日志视图
+
+        Args:
+            font_name: 日志字体
+            max_lines: 最多显示的日志行数
+        """
+        super().__init__(**kwargs)
+        self.font_name = font_name
+        self.max_lines = max_lines
+        self.viewclass = LogLine
+        self.add_widget(_create_layout())
+
+    def append_lines(self, lines):
+        """
+        追加日志行并滚动到底部
+
+        Args:
+            lines: 日志文本列表
+        """
+        if not lines:
+            return
+        rows = _rows(lines, self.font_name)
+        data = self.data
+        overflow = len(data) + len(rows) - self.max_lines
+        if overflow > 0:
+            # 一次性删除最旧的日志，再整体追加，避免逐行触发刷新
+            del data[:min(overflow, len(data))]
+            rows = rows[-self.max_lines:]
+        data.extend(rows)
+        Clock.schedule_once(self._scroll_to_bottom, 0)
+
+    def _scroll_to_bottom(self, dt):
+        self.scroll_y = 0
+
+
+class HistoryView(RecycleView):
+    """
+    警报历史视图
+
+    从警报日志(journal.AlertJournal)按页读取记录，最新的在最上面，
+    滚动到底部时再读取下一页更早的记录，不会一次性把全部历史加载到界面中。
+    每页查询只走索引，在UI线程中直接执行。
+    """
+
+    def __init__(self, journal, font_name=None, page_size=50, **kwargs):
+        """
+        初始化历史视图
+
+        Args:
+            journal: 警报日志
+            font_name: 日志字体
+            page_size: 每次读取的记录数
+        """
+        super().__init__(**kwargs)
+        self.journal = journal
+        self.font_name = font_name
+        self.page_size = page_size
+        self.viewclass = LogLine
+        self.filters = {}
+        self._cursor = None
+        self._exhausted = False
+        self.add_widget(_create_layout())
+        self.bind(scroll_y=self._on_scroll)
+
+    def reload(self, **filters):
+        """
+        清空视图并按条件重新读取第一页
+
+        Args:
+            **filters: 查询条件(level、source_ip、since、until)，参见 AlertJournal.query
+        """
+        self.filters = filters
+        self._cursor = None
+        self._exhausted = False
+        self.data = []
+        self.load_more()
+        self.scroll_y = 1
+
+    def load_more(self):
+        """
+        读取下一页更早的记录
+
+        Returns:
+            int: 本次读取的记录数
+        """
+        if self._exhausted:
+            return 0
+        records = self.journal.query(before=self._cursor, limit=self.page_size, **self.filters)
+        if len(records) < self.page_size:
+            self._exhausted = True
+        if records:
+            last = records[-1]
+            old_height = self.layout_manager.height if self._cursor is not None else None
+            self._cursor = (last['ts'], last['id'])
+            self.data.extend(_rows([format_record(record) for record in records], self.font_name))
+            if old_height is not None:
+                Clock.schedule_once(lambda dt: self._keep_position(old_height), 0)
+        return len(records)
+
+    def _keep_position(self, old_height):
+        # 新的一页接在底部，保持原来的可见位置，而不是跳到新的底部
+        scrollable = self.layout_manager.height - self.height
+        if scrollable > 0:
+            self.scroll_y = max(0, 1 - (old_height - self.height) / scrollable)
+
+    def _on_scroll(self, instance, scroll_y):
+        if scroll_y <= 0 and not self._exhausted:
+            self.load_more()
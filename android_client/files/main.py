@@ -1,52 +1,49 @@
 # -*- coding: utf-8 -*-
+import importlib.util
+import json
 import sys
 import os
-import socket
 import threading
-import json
-import time
 from datetime import datetime
 
-# 音频播放和硬件控制相关导入
-try:
-    from kivy.core.audio import SoundLoader
-    import androidhelper
-    droid = androidhelper.Android()
-    ANDROID_AVAILABLE = True
-    print("检测到Android环境")
-except ImportError:
-    print("未检测到Android环境，将使用模拟模式")
-    ANDROID_AVAILABLE = False
-    droid = None
-
-# 创建音频文件夹
+from alert_service import DEFAULT_DATA_DIR, SERVICE_NAME, ServiceClient, load_token
+from android_bridge import get_bridge
+from audio import AudioRegistry
+from commands import THREAD_UI, command
+from datagram import DEFAULT_GROUP
+from dedup import AlertDeduplicator, SeenIds
+from dispatch_queue import DEFAULT_COMMAND_PRIORITY, LEVEL_PRIORITY
+from effects import (
+    CHANNEL_FLASH, CHANNEL_SOUND, CHANNEL_VIBRATE, EffectsBackend, EffectsScheduler, pulse_pattern
+)
+from journal import AlertJournal
+from metrics import MetricsRegistry, snapshot_writer
+from network import AlertTransport, NetworkManager
+from relay import OUTBOX_FILE, FanoutRelay, open_outbox
+from response_handler import ResponseHandler
+
+from kivy.app import App
+from kivy.clock import Clock
+from kivy.config import Config
+from kivy.utils import platform
+
+from log_store import LogStore
+
+# 启动时只导入网络监听和警报处理需要的模块；界面组件、窗口、字体和 androidhelper
+# 在监听开始之后才加载，进程被系统杀死后重启时尽早恢复接收警报
+
+# androidhelper 只检查是否存在，连接在第一次使用硬件或界面显示后的预热中建立
+ANDROID_AVAILABLE = importlib.util.find_spec('androidhelper') is not None
+_droid = None
+_droid_lock = threading.Lock()
+
+# 音频文件夹，在界面显示后的预热中创建
 audio_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'audio')
-if not os.path.exists(audio_dir):
-    os.makedirs(audio_dir)
-    print(f"已创建音频文件夹: {audio_dir}")
 
 # 警报状态
 is_alert_active = False
-current_alert_sound = None
 alert_stop_event = threading.Event()
 
-# 添加初始诊断信息
-print(f"Python 版本: {sys.version}")
-print(f"当前工作目录: {os.getcwd()}")
-print("开始导入 Kivy 模块...")
-
-from kivy.app import App
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.label import Label
-from kivy.uix.button import Button
-from kivy.uix.textinput import TextInput
-from kivy.clock import Clock
-from kivy.core.window import Window
-from kivy.utils import platform
-from kivy.config import Config
-from kivy.resources import resource_add_path
-from kivy.core.text import LabelBase
-
 # 确保正确处理UTF-8编码
 if hasattr(sys, 'getfilesystemencoding'):
     encoding = sys.getfilesystemencoding()
@@ -54,77 +51,237 @@ if hasattr(sys, 'getfilesystemencoding'):
         # 强制使用UTF-8编码
         os.environ['PYTHONIOENCODING'] = 'utf-8'
 
-# 设置窗口大小
-Window.size = (400, 600)
-
 # 配置Kivy以支持中文
 Config.set('kivy', 'log_level', 'error')
 
-# 添加字体资源路径，让Kivy可以找到系统字体
-if platform == 'win':
-    # Windows系统下添加系统字体目录
-    font_dirs = [
-        'C:\\Windows\\Fonts',
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fonts')
-    ]
-    for font_dir in font_dirs:
-        if os.path.exists(font_dir):
-            resource_add_path(font_dir)
-            print(f"已添加字体目录: {font_dir}")
-
-print(f"当前平台: {platform}")
-print("使用系统默认字体并配置字体路径，确保中文显示正确")
-
-# 设置默认字体配置
-os.environ['KIVY_FONT_PATH'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fonts')
-print(f"Kivy字体路径设置为: {os.environ['KIVY_FONT_PATH']}")
-
-# 尝试注册一些系统中常见的中文字体，但使用try-except避免可能的错误
-try:
-    # 尝试使用Windows系统中常见的中文字体
+
+def get_droid():
+    """
+    取得 androidhelper.Android 实例，第一次调用时创建
+
+    Returns:
+        androidhelper.Android 实例，非Android环境下为 None
+    """
+    global _droid
+    if not ANDROID_AVAILABLE:
+        return None
+    if _droid is None:
+        with _droid_lock:
+            if _droid is None:
+                import androidhelper
+                _droid = androidhelper.Android()
+    return _droid
+
+
+def ensure_audio_dir():
+    """创建音频文件夹"""
+    if not os.path.exists(audio_dir):
+        os.makedirs(audio_dir, exist_ok=True)
+        print(f"已创建音频文件夹: {audio_dir}")
+
+
+def print_diagnostics():
+    """打印运行环境诊断信息"""
+    print(f"Python 版本: {sys.version}")
+    print(f"当前工作目录: {os.getcwd()}")
+    print(f"当前平台: {platform}")
+    print("检测到Android环境" if ANDROID_AVAILABLE else "未检测到Android环境，将使用模拟模式")
+
+
+def setup_fonts():
+    """
+    配置字体路径并选择中文字体，在创建界面之前调用
+
+    Windows 下把系统字体目录加入资源路径，并按常见中文字体文件是否存在选择默认字体，
+    结果写入 default_font_style。
+    """
+    from kivy.resources import resource_add_path
+
+    # 添加字体资源路径，让Kivy可以找到系统字体
     if platform == 'win':
-        common_fonts = [
-            ('SimHei', 'simhei.ttf'),
-            ('Microsoft YaHei', 'msyh.ttc'),
-            ('Arial Unicode MS', 'arialuni.ttf'),
-            ('SimSun', 'simsun.ttc')
+        # Windows系统下添加系统字体目录
+        font_dirs = [
+            'C:\\Windows\\Fonts',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fonts')
         ]
-        
-        for font_name, font_file in common_fonts:
-            font_path = os.path.join('C:\\Windows\\Fonts', font_file)
-            if os.path.exists(font_path):
-                print(f"尝试加载字体: {font_name} ({font_path})")
-                # 注意：这里只是打印信息，不实际调用LabelBase.register以避免闪退
-                # 而是通过系统默认字体机制处理
-                os.environ['KIVY_DEFAULT_FONT'] = font_name
-                print(f"已设置默认字体: {font_name}")
-                break
-except Exception as e:
-    print(f"字体处理过程中出现警告（非严重错误）: {str(e)}")
-    print("继续使用系统默认字体机制")
-
-# 创建一个字体样式字典供UI组件使用
+        for font_dir in font_dirs:
+            if os.path.exists(font_dir):
+                resource_add_path(font_dir)
+                print(f"已添加字体目录: {font_dir}")
+
+    # 设置默认字体配置
+    os.environ['KIVY_FONT_PATH'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'fonts')
+    print(f"Kivy字体路径设置为: {os.environ['KIVY_FONT_PATH']}")
+
+    # 尝试注册一些系统中常见的中文字体，但使用try-except避免可能的错误
+    try:
+        # 尝试使用Windows系统中常见的中文字体
+        if platform == 'win':
+            common_fonts = [
+                ('SimHei', 'simhei.ttf'),
+                ('Microsoft YaHei', 'msyh.ttc'),
+                ('Arial Unicode MS', 'arialuni.ttf'),
+                ('SimSun', 'simsun.ttc')
+            ]
+            
+            for font_name, font_file in common_fonts:
+                font_path = os.path.join('C:\\Windows\\Fonts', font_file)
+                if os.path.exists(font_path):
+                    print(f"尝试加载字体: {font_name} ({font_path})")
+                    # 注意：这里只是打印信息，不实际调用LabelBase.register以避免闪退
+                    # 而是通过系统默认字体机制处理
+                    os.environ['KIVY_DEFAULT_FONT'] = font_name
+                    print(f"已设置默认字体: {font_name}")
+                    break
+    except Exception as e:
+        print(f"字体处理过程中出现警告（非严重错误）: {str(e)}")
+        print("继续使用系统默认字体机制")
+    default_font_style['font_name'] = os.environ.get('KIVY_DEFAULT_FONT', 'sans-serif')
+
+
+# 警报去重使用的指纹字段及抑制窗口(秒)
+ALERT_FINGERPRINT_FIELDS = ('source', 'type', 'command', 'level', 'content', 'params')
+ALERT_DEDUP_TTL = 60
+
+# 分发队列最大深度，超出后丢弃低优先级消息
+DISPATCH_QUEUE_DEPTH = 256
+
+# 记住的已处理消息ID数，发送方重试时相同ID的消息只处理一次
+SEEN_IDS_SIZE = 4096
+
+# 传输引擎：'thread'(每连接一个线程)、'asyncio'(单线程事件循环) 或 'selectors'(单线程 selectors)
+NETWORK_ENGINE = 'thread'
+
+# 连接管理：最大同时连接数、空闲超时(秒)、心跳间隔(秒，None 表示不发送)
+LISTEN_MAX_CONNECTIONS = 1024
+LISTEN_IDLE_TIMEOUT = 300
+LISTEN_HEARTBEAT_INTERVAL = None
+
+# 默认监听地址；LISTEN_ON_START 为 True 时应用启动即在该地址监听，不等待点击启动服务
+LISTEN_HOST = '0.0.0.0'
+LISTEN_PORT = 8888
+LISTEN_ON_START = True
+
+# 中继：收到的警报和命令转发给这些下游设备("host:port")，为空时不转发
+RELAY_PEERS = []
+RELAY_WORKERS = 32
+
+# UDP/组播警报：可选，与TCP监听并行接收；开启后持有 WLAN 组播锁，耗电增加，默认关闭。
+# UDP_PORT 为 None 时使用界面中填写的TCP监听端口，MULTICAST_GROUP 为 None 时只接收单播和广播
+UDP_ENABLED = False
+UDP_PORT = None
+MULTICAST_GROUP = DEFAULT_GROUP
+
+# 服务模式：警报由后台服务(alert_service.py，Android 上为前台服务)接收和响应，界面被关闭或回收后
+# 仍能收到警报；界面通过本机IPC通道显示服务日志并发送停止警报命令
+SERVICE_MODE = False
+
+# 日志最多保留的行数及界面刷新的最小间隔(秒)
+LOG_MAX_LINES = 500
+LOG_FLUSH_INTERVAL = 1 / 15.
+
+# 警报日志：收到的警报和命令保存在应用数据目录下的 SQLite 数据库中，历史视图每页读取的记录数
+JOURNAL_ENABLED = True
+JOURNAL_FILE = 'alerts.db'
+HISTORY_PAGE_SIZE = 50
+
+# 运行统计：关闭后所有指标都是空操作；快照定期写入应用数据目录
+METRICS_ENABLED = True
+METRICS_DUMP_INTERVAL = 60
+METRICS_FILE = 'metrics.json'
+
+# 创建一个字体样式字典供UI组件使用，字体名称由 setup_fonts 确定
 default_font_style = {
     'font_name': os.environ.get('KIVY_DEFAULT_FONT', 'sans-serif'),
     'font_size': '14sp'
 }
 
+# 综合警报的闪光灯和声音节拍
+ALERT_FLASH_PATTERN = pulse_pattern(0.5, 0.5)
+ALERT_SOUND_PATTERN = pulse_pattern(2, 0.5)
+
+
+class AppEffectsBackend(EffectsBackend):
+    """通过androidhelper控制硬件的效果后端，非Android环境下只模拟"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    def flash(self, on):
+        if ANDROID_AVAILABLE:
+            get_droid().toggleFlashLight(on)
+    
+    def vibrate(self, on, duration=0):
+        if not ANDROID_AVAILABLE:
+            return
+        if on:
+            get_droid().vibrate(int(duration * 1000))
+        else:
+            get_droid().cancelVibrate()
+    
+    def sound(self, on, duration=0, asset=None):
+        if on:
+            self.app._sound_on(asset)
+        else:
+            self.app._sound_off(asset)
+
+class AppResponseHandler(ResponseHandler):
+    """
+    应用使用的响应处理器
+
+    警报和 alert 命令启动综合警报(闪光灯、声音、震动和悬浮窗)，stop_alert 命令停止警报，
+    其余命令由应用注册到命令表的实现执行。同一批消息中的多条警报只启动一次综合警报。
+    """
+
+    def __init__(self, app):
+        """
+        初始化响应处理器
+
+        Args:
+            app: AlertClientApp 实例，需已创建日志、去重器、效果调度器、指标注册表和警报日志
+        """
+        super().__init__(
+            log_callback=app.log_message,
+            deduplicator=app.alert_deduplicator,
+            effects=app.effects,
+            audio=app.audio,
+            metrics=app.metrics,
+            journal=app.journal,
+            relay=app.relay
+        )
+        self.app = app
+
+    def raise_alert(self, message):
+        self.app.start_alert(message.params or {},
+                             received_at=message.received_at,
+                             peer=message.source,
+                             message_id=message.id)
+
+    def stop_alert(self):
+        self.app.stop_alert()
+
+
 class AlertClientApp(App):
+    # 响应处理器类，子类可替换以记录或扩展消息处理
+    response_handler_class = AppResponseHandler
+    
     def build(self):
+        # 监听先于界面启动，窗口、字体和界面组件随后加载
+        self.start_alert_path()
         print("构建应用界面...")
         self.title = u'联动警报客户端'
-        self.server_ip = '0.0.0.0'  # 默认监听所有网络接口
-        self.server_port = 8888     # 默认端口
-        self.socket = None
-        self.connection_thread = None
-        self.is_listening = False
         
-        # 警报相关状态
-        self.is_alert_active = False
-        self.current_alert_sound = None
-        self.alert_stop_event = threading.Event()
-        self.flash_thread = None
-        self.alert_source = None  # 记录警报来源
+        from kivy.core.window import Window
+        from kivy.uix.boxlayout import BoxLayout
+        from kivy.uix.button import Button
+        from kivy.uix.label import Label
+        from kivy.uix.textinput import TextInput
+        from log_view import LogView
+        setup_fonts()
+        
+        # 设置窗口大小(无窗口环境下 Window 为 None)
+        if Window is not None:
+            Window.size = (400, 600)
         
         # 确保Window对象存在后设置回调
         if hasattr(Window, 'bind'):
@@ -136,7 +293,7 @@ class AlertClientApp(App):
         
         # 状态显示区域
         self.status_label = Label(
-            text='状态: 未连接',
+            text=f'状态: 已启动 ({self.server_ip}:{self.server_port})' if self.is_listening else '状态: 未连接',
             size_hint=(1, 0.1),
             halign='left',
             valign='middle',
@@ -176,7 +333,7 @@ class AlertClientApp(App):
         # 控制按钮
         control_box = BoxLayout(size_hint=(1, 0.15), spacing=10)
         self.start_button = Button(
-            text='启动服务', 
+            text='停止服务' if self.is_listening else '启动服务',
             on_press=self.toggle_service,
             **default_font_style
         )
@@ -191,6 +348,15 @@ class AlertClientApp(App):
         )
         control_box.add_widget(self.stop_alert_button)
         
+        # 警报历史，从警报日志分页读取
+        history_button = Button(
+            text='警报历史',
+            on_press=self.show_history,
+            **default_font_style
+        )
+        history_button.disabled = self.journal is None
+        control_box.add_widget(history_button)
+        
         # 日志区域
         log_label = Label(
             text='接收日志:', 
@@ -200,12 +366,10 @@ class AlertClientApp(App):
         )
         log_label.bind(size=log_label.setter('text_size'))
         
-        self.log_area = TextInput(
-            text='',
-            readonly=True,
-            size_hint=(1, 0.4),
-            background_color=(0.9, 0.9, 0.9, 1),
-            font_name=default_font_style['font_name']
+        self.log_area = LogView(
+            font_name=default_font_style['font_name'],
+            max_lines=LOG_MAX_LINES,
+            size_hint=(1, 0.4)
         )
         
         # 将所有组件添加到主布局
@@ -216,8 +380,174 @@ class AlertClientApp(App):
         layout.add_widget(self.log_area)
         
         self.log_message("应用已启动")
+        # 第一帧之后再解码警报音并连接 androidhelper，不拖慢界面显示
+        Clock.schedule_once(self._preload_audio, 0)
         return layout
     
+    def start_alert_path(self):
+        """
+        初始化警报通路，LISTEN_ON_START 为 True 时立即开始监听
+
+        在窗口和界面之前调用，应用被系统杀死后重启时尽早恢复接收警报；已初始化时不再重复。
+        """
+        if getattr(self, 'transport', None) is not None:
+            return
+        self.setup_alert_path()
+        if LISTEN_ON_START and self.start_listener(self.server_ip, self.server_port):
+            self.log_message(f"服务已启动 ({self.server_ip}:{self.server_port})，等待连接...")
+    
+    def setup_alert_path(self, effects_backend=None, engine=None):
+        """
+        初始化网络监听到硬件响应之间的非界面部分，build 之前调用可在无界面环境中运行
+        
+        Args:
+            effects_backend: 硬件效果后端，默认通过 androidhelper 控制硬件
+            engine: 传输引擎名称或类，默认为 NETWORK_ENGINE
+        """
+        self.server_ip = LISTEN_HOST
+        self.server_port = LISTEN_PORT
+        self.is_listening = False
+        self.service_client = None  # 服务模式下连接后台警报服务的IPC客户端
+        
+        # Android 类和系统服务只解析一次，桌面环境下为占位实现
+        self.android = get_bridge()
+        
+        # 警报相关状态
+        self.is_alert_active = False
+        self.alert_stop_event = threading.Event()
+        self.alert_source = None  # 记录警报来源
+        self.alert_peer = None    # 发来当前警报的连接，确认消息从该连接回送
+        self.alert_ref = None     # 当前警报的消息ID，确认消息中带回以便发送方对应
+        # 警报去重：同一来源的相同警报在抑制窗口内只触发一次
+        self.alert_deduplicator = AlertDeduplicator(fields=ALERT_FINGERPRINT_FIELDS, ttl=ALERT_DEDUP_TTL)
+        
+        # 警报音只查找和解码一次，播放器对象反复使用
+        self.audio = AudioRegistry((audio_dir,))
+        
+        # 闪光灯、震动和声音统一由一个效果调度线程驱动
+        self.effects = EffectsScheduler(effects_backend or AppEffectsBackend(self))
+        self.effects.start()
+        
+        # 待刷新的日志保存在有界队列中，界面按帧合并刷新；界面只保留最近 LOG_MAX_LINES 行
+        self.log_store = LogStore(max_lines=LOG_MAX_LINES)
+        self._log_flush_trigger = Clock.create_trigger(self._flush_log, LOG_FLUSH_INTERVAL)
+        
+        self.metrics = MetricsRegistry(enabled=METRICS_ENABLED)
+        self.journal = self.setup_journal()
+        # 已处理的消息ID从警报日志中恢复，重启前收到的消息被重发时不会再次报警
+        self.seen_ids = SeenIds(max_size=SEEN_IDS_SIZE)
+        if self.journal is not None:
+            for key in self.journal.recent_ids(SEEN_IDS_SIZE):
+                self.seen_ids.add(key)
+        self.relay = self.setup_relay()
+        
+        # 传输引擎 -> 优先级分发队列 -> 响应处理器，关键警报优先处理并中断低级别响应
+        self.handler = self.response_handler_class(self)
+        # 应用的命令实现注册到处理器的命令表，替换处理器的同名命令
+        self.commands = self.handler.commands
+        self.commands.ui_scheduler = lambda function: Clock.schedule_once(lambda dt: function(), 0)
+        self.commands.register_object(self)
+        self.transport = AlertTransport(
+            self.handler,
+            engine=engine or NETWORK_ENGINE,
+            max_depth=DISPATCH_QUEUE_DEPTH,
+            metrics=self.metrics,
+            seen_ids=self.seen_ids,
+            max_connections=LISTEN_MAX_CONNECTIONS,
+            idle_timeout=LISTEN_IDLE_TIMEOUT,
+            heartbeat_interval=LISTEN_HEARTBEAT_INTERVAL
+        )
+        self.dispatcher = self.transport.dispatcher
+        
+        self.setup_metrics()
+    
+    def setup_journal(self):
+        """
+        打开应用数据目录下的警报日志并启动写入线程
+        
+        Returns:
+            AlertJournal: 警报日志，未启用或数据目录不可用时为 None
+        """
+        if not JOURNAL_ENABLED:
+            return None
+        try:
+            journal = AlertJournal(os.path.join(self.user_data_dir, JOURNAL_FILE))
+        except Exception as e:
+            # 警报日志不可用时照常处理警报，只是不保存历史
+            self.log_message(f"无法打开警报日志: {str(e)}")
+            return None
+        journal.start()
+        return journal
+    
+    def setup_relay(self):
+        """
+        按 RELAY_PEERS 创建并启动转发器，以及转发失败消息的重试队列(self.outbox)
+        
+        Returns:
+            FanoutRelay: 转发器，没有下游设备时为 None
+        """
+        self.outbox = None
+        if not RELAY_PEERS:
+            return None
+        # 转发使用单独的连接池，与回送确认消息互不占用连接
+        send = NetworkManager().send_message
+        try:
+            # 转发失败的消息由重试队列补发，应用重启后继续
+            self.outbox = open_outbox(os.path.join(self.user_data_dir, OUTBOX_FILE), send, log=self.log_message)
+        except Exception as e:
+            self.log_message(f"无法打开转发重试队列，发送失败的设备不再补发: {str(e)}")
+        else:
+            self.metrics.gauge('relay.outbox', self.outbox.stats)
+        relay = FanoutRelay(send, RELAY_PEERS, max_workers=RELAY_WORKERS, metrics=self.metrics, outbox=self.outbox)
+        relay.start()
+        if self.outbox is not None:
+            self.outbox.start()
+        return relay
+    
+    def show_history(self, instance=None):
+        """弹出警报历史窗口，可按警报级别筛选"""
+        from kivy.uix.boxlayout import BoxLayout
+        from kivy.uix.button import Button
+        from kivy.uix.popup import Popup
+        from log_view import HistoryView
+        
+        history = HistoryView(self.journal, font_name=default_font_style['font_name'],
+                              page_size=HISTORY_PAGE_SIZE)
+        content = BoxLayout(orientation='vertical', spacing=5)
+        filter_box = BoxLayout(size_hint=(1, None), height=40, spacing=5)
+        for text, level in (('全部', None), ('critical', 'critical'), ('warning', 'warning'), ('info', 'info')):
+            filter_box.add_widget(Button(
+                text=text,
+                on_press=lambda button, level=level: history.reload(level=level),
+                **default_font_style
+            ))
+        content.add_widget(filter_box)
+        content.add_widget(history)
+        
+        popup = Popup(title='警报历史', title_font=default_font_style['font_name'],
+                      content=content, size_hint=(0.95, 0.9))
+        close_button = Button(text='关闭', size_hint=(1, None), height=40, **default_font_style)
+        close_button.bind(on_press=popup.dismiss)
+        content.add_widget(close_button)
+        # 写入线程可能还有未提交的记录，先提交再读取第一页
+        self.journal.flush(timeout=1)
+        history.reload()
+        popup.open()
+    
+    def setup_metrics(self):
+        """登记应用的运行统计指标，并定期把快照写入应用数据目录"""
+        self._ack_errors = self.metrics.counter('app.ack_errors')
+        self.metrics.gauge('audio', self.audio.stats)
+        self.metrics.gauge('android', self.android.stats)
+        if METRICS_ENABLED and METRICS_DUMP_INTERVAL:
+            try:
+                path = os.path.join(self.user_data_dir, METRICS_FILE)
+            except OSError as e:
+                # 数据目录不可用时只提供 stats 命令，不写快照文件
+                self.log_message(f"无法创建运行统计快照目录: {str(e)}")
+            else:
+                self.metrics.start_dump(METRICS_DUMP_INTERVAL, snapshot_writer(path))
+    
     def toggle_service(self, instance):
         if not self.is_listening:
             self.start_service()
@@ -226,198 +556,178 @@ class AlertClientApp(App):
     
     def start_service(self):
         try:
-            self.server_ip = self.ip_input.text
-            self.server_port = int(self.port_input.text)
-            
-            # 创建套接字
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.socket.bind((self.server_ip, self.server_port))
-            self.socket.listen(5)
-            
-            self.is_listening = True
+            port = int(self.port_input.text)
+        except ValueError:
+            self.log_message(f"启动服务失败: 无效的端口 {self.port_input.text}")
+            return
+        # 启动失败的原因由传输层通过处理器写入日志
+        if self.start_listener(self.ip_input.text, port):
             self.start_button.text = '停止服务'
             self.status_label.text = f'状态: 已启动 ({self.server_ip}:{self.server_port})'
-            
-            # 在新线程中接受连接
-            self.connection_thread = threading.Thread(target=self.accept_connections)
-            self.connection_thread.daemon = True
-            self.connection_thread.start()
-            
             self.log_message("服务已启动，等待连接...")
-        except Exception as e:
-            self.log_message(f"启动服务失败: {str(e)}")
+    
+    def start_listener(self, host, port):
+        """
+        开始在指定地址监听，不涉及界面
+        
+        Args:
+            host: 监听地址
+            port: 监听端口
+            
+        Returns:
+            bool: 是否成功启动
+        """
+        self.server_ip = host
+        self.server_port = port
+        if SERVICE_MODE:
+            self.is_listening = self.start_background_service(host, port)
+            return self.is_listening
+        if UDP_ENABLED:
+            if MULTICAST_GROUP:
+                self.android.acquire_multicast_lock()
+            self.is_listening = self.transport.start(host, port, udp_port=UDP_PORT or port, group=MULTICAST_GROUP)
+        else:
+            self.is_listening = self.transport.start(host, port)
+        return self.is_listening
     
     def stop_service(self):
-        if self.socket:
-            self.is_listening = False
-            self.socket.close()
-            self.socket = None
+        if self.is_listening:
+            self.stop_listener()
             self.start_button.text = '启动服务'
             self.status_label.text = '状态: 已停止'
-            self.log_message("服务已停止")
     
-    def accept_connections(self):
-        while self.is_listening:
-            try:
-                client_socket, address = self.socket.accept()
-                client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, address)
-                )
-                client_thread.daemon = True
-                client_thread.start()
-                
-                Clock.schedule_once(
-                    lambda dt: self.log_message(f"接受来自 {address[0]}:{address[1]} 的连接"),
-                    0
-                )
-            except:
-                # 如果socket被关闭，退出循环
-                break
+    def stop_listener(self):
+        """停止监听，不涉及界面"""
+        self.is_listening = False
+        if self.service_client is not None:
+            # 请后台服务退出，Android 上同时停止前台服务
+            self.service_client.stop_service()
+            self.service_client.stop()
+            self.service_client = None
+            self.android.stop_service(SERVICE_NAME)
+            return
+        self.transport.stop()
+        if UDP_ENABLED and MULTICAST_GROUP:
+            self.android.release_multicast_lock()
     
-    def handle_client(self, client_socket, address):
+    def start_background_service(self, host, port):
+        """
+        启动后台警报服务并通过IPC通道连接，服务模式下代替本进程的监听
+        
+        Args:
+            host: 监听地址
+            port: 监听端口
+            
+        Returns:
+            bool: 是否已请求启动；连接在后台建立，服务尚未就绪时自动重试
+        """
+        argument = {
+            'host': host,
+            'port': port,
+            'udp': UDP_ENABLED,
+            'udp_port': UDP_PORT or port,
+            'group': MULTICAST_GROUP or '',
+            'engine': NETWORK_ENGINE,
+            'relay': RELAY_PEERS,
+            'workers': RELAY_WORKERS,
+        }
         try:
-            while self.is_listening:
-                data = client_socket.recv(1024)
-                if not data:
-                    break
-                
-                # 处理接收到的数据
-                self.process_data(data, client_socket, address)
-        except:
+            # 服务与界面共用应用数据目录中的警报日志和IPC令牌，历史窗口照常可用
+            argument['data_dir'] = self.user_data_dir
+        except OSError:
             pass
-        finally:
-            client_socket.close()
+        # 本机其他应用也能连接IPC端口，服务只接受带有令牌的消息
+        data_dir = argument.setdefault('data_dir', DEFAULT_DATA_DIR)
+        token = load_token(data_dir)
+        argument['token'] = token
+        if not self.android.start_service(SERVICE_NAME, json.dumps(argument)):
+            self.log_message(f"请在本机运行 python -m alert_service --port {port} --data-dir {data_dir}，界面将自动连接")
+        if self.service_client is None:
+            self.service_client = ServiceClient(self.on_service_event, token)
+        self.service_client.start()
+        return True
     
-    def process_data(self, data, client_socket, address):
-        try:
-            # 尝试解析JSON数据
-            message = json.loads(data.decode('utf-8'))
-            
-            # 保存client_socket引用用于确认消息发送
-            self.client_socket = client_socket
-            
-            # 在UI线程中更新日志
-            Clock.schedule_once(
-                lambda dt: self.log_message(f"收到来自 {address[0]} 的消息: {message}"),
-                0
-            )
-            
-            # 根据消息类型执行不同操作
-            if 'type' in message:
-                if message['type'] == 'alert':
-                    # 直接启动综合警报
-                    params = message.get('params', {})
-                    self.start_alert(params)
-                elif message['type'] == 'command':
-                    command = message.get('command')
-                    params = message.get('params', {})
-                    
-                    if command == 'alert':
-                        self.start_alert(params)
-                    elif command == 'stop_alert':
-                        self.stop_alert()
-                    else:
-                        self.execute_command(command, params)
-                
-                # 发送响应
-                response = {'status': 'ok', 'message': '已处理'}
-                client_socket.send(json.dumps(response).encode('utf-8'))
-        except json.JSONDecodeError:
-            # 非JSON格式数据处理
-            text_data = data.decode('utf-8', errors='ignore')
-            Clock.schedule_once(
-                lambda dt: self.log_message(f"收到非JSON数据: {text_data}"),
-                0
-            )
-        except Exception as e:
-            Clock.schedule_once(
-                lambda dt: self.log_message(f"处理数据时出错: {str(e)}"),
-                0
-            )
-    
-    def handle_alert(self, message):
-        """处理警报消息"""
-        if 'content' in message:
-            alert_content = message['content']
-            level = message.get('level', 'info')
-            
-            # 在UI线程中显示警报
-            Clock.schedule_once(
-                lambda dt: self.show_alert(alert_content, level),
-                0
-            )
-    
-    def handle_command(self, message):
-        """处理命令消息"""
-        if 'command' in message:
-            command = message['command']
-            params = message.get('params', {})
-            
-            # 在UI线程中执行命令
-            Clock.schedule_once(
-                lambda dt: self.execute_command(command, params),
-                0
-            )
-    
-    def show_alert(self, content, level):
-        """显示警报"""
-        # 这里可以根据不同级别显示不同样式的警报
-        self.log_message(f"警报 [{level}]: {content}")
-        # TODO: 实现更丰富的警报展示效果
+    def on_service_event(self, message):
+        """处理后台服务推送的事件，在IPC客户端线程中调用"""
+        name = message.get('event')
+        if name == 'log':
+            # 服务的日志行已带时间戳
+            for line in message['message'].split('\n'):
+                if self.log_store.append(line):
+                    self._log_flush_trigger()
+        elif name == 'alert':
+            self.is_alert_active = True
+            Clock.schedule_once(lambda dt: self._show_status("警报中！", (1, 0, 0, 1)), 0)
+        elif name == 'alert_stopped':
+            self.is_alert_active = False
+            Clock.schedule_once(lambda dt: self._show_status("警报已停止", (0, 1, 0, 1)), 0)
+        elif name == 'connected':
+            self.log_message("已连接后台警报服务")
+        elif name == 'disconnected':
+            self.log_message("与后台警报服务的连接已断开，正在重连...")
+    
+    def _show_status(self, text, color):
+        if hasattr(self, 'status_label'):
+            self.status_label.text = text
+            self.status_label.color = color
     
     def execute_command(self, command, params):
-        """执行命令"""
-        self.log_message(f"执行命令: {command}, 参数: {params}")
+        """
+        执行命令，与网络收到的命令使用同一个命令表
         
-        # 根据不同命令执行不同操作
-        if command == "beep":
-            # 播放声音
-            duration = params.get('duration', 1)
-            self.log_message(f"播放警报声音，持续 {duration} 秒")
-            self.play_sound(duration=duration)
-        elif command == "vibrate":
-            # 震动
-            duration = params.get('duration', 1)
-            self.log_message(f"设备震动，持续 {duration} 秒")
-            self.vibrate(duration)
-        elif command == "flash":
-            # 闪光
-            count = params.get('count', 3)
-            self.log_message(f"闪光灯闪烁 {count} 次")
-            self.flash_light(count)
-        elif command == "alert":
-            # 综合警报（声音+闪光灯+悬浮窗）
-            self.log_message(f"启动综合警报")
-            self.start_alert(params)
-            # 发送确认消息到服务端，告知警报已启动
-            self.send_alert_ack()
-        elif command == "stop_alert":
-            self.log_message("接收到停止警报命令")
-            self.stop_alert()
-            # 发送停止确认消息到服务端
-            self.send_stop_alert_ack()
-            
+        Raises:
+            CommandError: 命令未注册、参数不合法、执行出错或超时
+        """
+        self.log_message(f"执行命令: {command}, 参数: {params}")
+        self.commands.execute(command, params)
+    
+    @command('beep')
+    def _command_beep(self, params, message=None):
+        duration = params.get('duration', 1)
+        self.log_message(f"播放警报声音，持续 {duration} 秒")
+        self.play_sound(duration=duration)
+    
+    @command('vibrate')
+    def _command_vibrate(self, params, message=None):
+        self.vibrate(params.get('duration', 1))
+    
+    @command('flash')
+    def _command_flash(self, params, message=None):
+        self.flash_light(params.get('count', 3))
+    
+    @command('display', thread=THREAD_UI)
+    def _command_display(self, params, message=None):
+        text = params.get('text', '')
+        self.log_message(f"显示消息: {text}")
+        self._show_status(text, (1, 1, 1, 1))
+    
     def send_alert_ack(self):
         """发送警报启动确认到服务端"""
-        try:
-            if hasattr(self, 'client_socket') and self.client_socket:
-                ack_message = json.dumps({"type": "alert_ack", "message": "警报已启动"})
-                self.client_socket.send(ack_message.encode('utf-8'))
-                self.log_message("已发送警报确认到服务端")
-        except Exception as e:
-            self.log_message(f"发送警报确认失败: {str(e)}")
+        self.send_ack({"type": "alert_ack", "message": "警报已启动"}, "警报确认")
     
     def send_stop_alert_ack(self):
         """发送警报停止确认到服务端"""
+        self.send_ack({"type": "stop_alert_ack", "message": "警报已停止"}, "停止警报确认")
+    
+    def send_ack(self, ack_message, name):
+        """
+        通过发来当前警报的连接回送确认消息
+        
+        Args:
+            ack_message: 确认消息字典
+            name: 写入日志的确认名称
+        """
+        if self.alert_peer is None:
+            return
+        if self.alert_ref is not None:
+            ack_message = dict(ack_message, ref=self.alert_ref)
         try:
-            if hasattr(self, 'client_socket') and self.client_socket:
-                ack_message = json.dumps({"type": "stop_alert_ack", "message": "警报已停止"})
-                self.client_socket.send(ack_message.encode('utf-8'))
-                self.log_message("已发送停止警报确认到服务端")
+            if not self.transport.send_to(self.alert_peer, ack_message):
+                raise ConnectionError("连接已断开")
+            self.log_message(f"已发送{name}到服务端")
         except Exception as e:
-            self.log_message(f"发送停止警报确认失败: {str(e)}")
+            self._ack_errors.inc()
+            self.log_message(f"发送{name}失败: {str(e)}")
     
     def show_floating_window(self):
         """显示悬浮窗提示"""
@@ -425,24 +735,20 @@ class AlertClientApp(App):
             try:
                 self.log_message("显示悬浮窗提示")
                 # 使用androidhelper显示通知，这是最简单可靠的方式
-                droid.notify("紧急警报", "收到紧急警报，请立即处理！", "警报通知", timeout=30000)
+                get_droid().notify("紧急警报", "收到紧急警报，请立即处理！", "警报通知", timeout=30000)
                 
                 # 尝试创建悬浮窗（如果权限允许）
                 try:
-                    from jnius import autoclass, cast
-                    
-                    # 获取必要的Android类
-                    PythonActivity = autoclass('org.kivy.android.PythonActivity')
-                    WindowManager = autoclass('android.view.WindowManager')
-                    LayoutParams = autoclass('android.view.WindowManager$LayoutParams')
-                    LinearLayout = autoclass('android.widget.LinearLayout')
-                    TextView = autoclass('android.widget.TextView')
-                    Button = autoclass('android.widget.Button')
-                    Context = autoclass('android.content.Context')
-                    Gravity = autoclass('android.view.Gravity')
+                    # 获取必要的Android类，类和系统服务由桥接对象缓存
+                    bridge = self.android
+                    LayoutParams = bridge.autoclass('android.view.WindowManager$LayoutParams')
+                    LinearLayout = bridge.autoclass('android.widget.LinearLayout')
+                    TextView = bridge.autoclass('android.widget.TextView')
+                    Button = bridge.autoclass('android.widget.Button')
+                    Gravity = bridge.autoclass('android.view.Gravity')
                     
                     # 获取当前Activity
-                    activity = PythonActivity.mActivity
+                    activity = bridge.activity
                     
                     # 创建悬浮窗布局
                     linear_layout = LinearLayout(activity)
@@ -475,11 +781,10 @@ class AlertClientApp(App):
                         # 发送停止确认到服务端
                         self.send_stop_alert_ack()
                         # 移除悬浮窗
-                        window_manager = cast(WindowManager, activity.getSystemService(Context.WINDOW_SERVICE))
-                        window_manager.removeViewImmediate(linear_layout)
+                        bridge.remove_view(linear_layout)
                     
                     # 创建点击监听器
-                    class ButtonClickListener(autoclass('android.view.View$OnClickListener')):
+                    class ButtonClickListener(bridge.autoclass('android.view.View$OnClickListener')):
                         def __init__(self, callback):
                             self.callback = callback
                             super(ButtonClickListener, self).__init__()
@@ -507,8 +812,7 @@ class AlertClientApp(App):
                     params.y = 100
                     
                     # 添加悬浮窗
-                    window_manager = cast(WindowManager, activity.getSystemService(Context.WINDOW_SERVICE))
-                    window_manager.addView(linear_layout, params)
+                    bridge.window_manager.addView(linear_layout, params)
                     
                     # 保存悬浮窗引用以便后续可以移除
                     self.floating_window = linear_layout
@@ -517,7 +821,7 @@ class AlertClientApp(App):
                 except Exception as floating_e:
                     self.log_message(f"创建悬浮窗失败，使用通知替代: {str(floating_e)}")
                     # 如果悬浮窗创建失败，确保通知已经发送
-                    droid.notify("紧急警报", "收到紧急警报，请点击通知查看详情！", "警报通知", timeout=30000)
+                    get_droid().notify("紧急警报", "收到紧急警报，请点击通知查看详情！", "警报通知", timeout=30000)
                     
             except Exception as e:
                 self.log_message(f"显示提示出错: {str(e)}")
@@ -536,24 +840,23 @@ class AlertClientApp(App):
         # 如果有悬浮窗，移除它
         if hasattr(self, 'floating_window') and self.floating_window and ANDROID_AVAILABLE:
             try:
-                from jnius import autoclass, cast
-                Context = autoclass('android.content.Context')
-                WindowManager = autoclass('android.view.WindowManager')
-                PythonActivity = autoclass('org.kivy.android.PythonActivity')
-                activity = PythonActivity.mActivity
-                window_manager = cast(WindowManager, activity.getSystemService(Context.WINDOW_SERVICE))
-                window_manager.removeViewImmediate(self.floating_window)
+                self.android.remove_view(self.floating_window)
                 self.floating_window = None
             except Exception as e:
                 self.log_message(f"移除悬浮窗出错: {str(e)}")
         return True
     
     def log_message(self, message):
-        """添加日志消息"""
-        current_text = self.log_area.text
-        self.log_area.text = f"{current_text}\n[{self.get_time()}] {message}" if current_text else f"[{self.get_time()}] {message}"
-        # 滚动到底部
-        self.log_area.cursor = (0, len(self.log_area.text))
+        """添加日志消息，可在任意线程中调用"""
+        timestamp = self.get_time()
+        for line in str(message).split('\n'):
+            if self.log_store.append(f"[{timestamp}] {line}"):
+                # 尚未安排刷新时才安排，同一帧内的日志合并为一次界面更新
+                self._log_flush_trigger()
+    
+    def _flush_log(self, dt):
+        """在UI线程中把待刷新的日志写入日志视图"""
+        self.log_area.append_lines(self.log_store.drain())
     
     def get_time(self):
         """获取当前时间字符串"""
@@ -562,8 +865,22 @@ class AlertClientApp(App):
     def on_stop(self):
         """应用停止时清理资源"""
         print("应用正在停止...")
-        self.stop_alert()
-        self.stop_service()
+        if self.service_client is not None:
+            # 界面退出后服务继续在后台接收警报
+            self.service_client.stop()
+        else:
+            self.stop_alert()
+            self.stop_service()
+        self.transport.close()
+        self.commands.stop()
+        self.effects.stop()
+        self.metrics.stop_dump()
+        if self.relay is not None:
+            self.relay.stop()
+        if self.outbox is not None:
+            self.outbox.stop()
+        if self.journal is not None:
+            self.journal.close()
         
     def on_pause(self):
         """应用暂停时"""
@@ -574,93 +891,77 @@ class AlertClientApp(App):
     def on_resume(self):
         """应用恢复时"""
         print("应用恢复")
+        # Activity 可能已被系统重建，与旧窗口绑定的服务需要重新取得
+        self.android.reset_activity()
         # 如果有活动的警报，显示提示
         if self.is_alert_active:
             self.show_notification("警报", "有活动的警报正在进行中")
         return True
         
     def play_sound(self, duration=3, sound_file=None):
-        """播放警报声音"""
-        try:
-            if platform == 'win':
-                # Windows平台测试用
-                import winsound
-                winsound.Beep(1000, duration * 1000)  # 1000Hz，持续指定秒数
-            elif ANDROID_AVAILABLE:
-                # 检查音频文件夹和文件
-                audio_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'audio')
-                alert_sound_path = os.path.join(audio_dir, 'alert_sound.mp3') if sound_file is None else sound_file
-                
-                # 支持的音频文件格式列表
-                sound_formats = ['alert_sound.mp3', 'alert_sound.wav', 'alert_sound.ogg']
-                found_sound = False
-                
-                for fmt in sound_formats:
-                    fmt_path = os.path.join(audio_dir, fmt)
-                    if os.path.exists(fmt_path):
-                        alert_sound_path = fmt_path
-                        found_sound = True
-                        break
-                
-                if found_sound:
-                    self.log_message(f"播放音频: {alert_sound_path}")
-                    self.current_alert_sound = SoundLoader.load(alert_sound_path)
-                    if self.current_alert_sound:
-                        self.current_alert_sound.loop = True
-                        self.current_alert_sound.play()
-                        time.sleep(duration)
-                        self.current_alert_sound.stop()
-                else:
-                    # 如果没有音频文件，使用系统提示音
-                    self.log_message("未找到警报音频文件，使用系统提示音")
-                    try:
-                        # 在Android上使用系统声音
-                        droid.playRingtone()
-                        time.sleep(duration)
-                        droid.stopRingtone()
-                    except Exception as inner_e:
-                        self.log_message(f"播放系统声音失败: {str(inner_e)}")
-                        # 最后的备选方案 - 使用振动代替
-                        self.vibrate(duration)
-            else:
-                # 在非Android环境下模拟
-                self.log_message(f"模拟播放警报声音，持续 {duration} 秒")
-                time.sleep(duration)
-        except Exception as e:
-            self.log_message(f"播放声音时出错: {str(e)}")
+        """播放警报声音，由效果调度器驱动，立即返回"""
+        asset = sound_file or self.audio.sound_for()
+        self.effects.play(CHANNEL_SOUND, pulse_pattern(duration), priority=DEFAULT_COMMAND_PRIORITY, asset=asset)
+    
+    def _sound_on(self, asset):
+        """开始播放警报声音，由效果调度器线程调用"""
+        if platform == 'win':
+            # Windows平台测试用，异步播放系统提示音
+            import winsound
+            winsound.MessageBeep()
+        elif ANDROID_AVAILABLE:
+            # 音频已在启动时解码，这里直接复用缓存的播放器
+            if not self.audio.play(asset or self.audio.default, loop=True):
+                # 如果没有音频文件，使用系统提示音
+                self.log_message("未找到警报音频文件，使用系统提示音")
+                try:
+                    # 在Android上使用系统声音
+                    get_droid().playRingtone()
+                except Exception as inner_e:
+                    self.log_message(f"播放系统声音失败: {str(inner_e)}")
+                    # 最后的备选方案 - 使用振动代替
+                    get_droid().vibrate(1000)
+        else:
+            # 在非Android环境下模拟
+            self.log_message("模拟播放警报声音")
+    
+    def _sound_off(self, asset):
+        """停止播放警报声音，由效果调度器线程或停止警报的线程调用"""
+        self.audio.stop(asset)
+        if ANDROID_AVAILABLE:
+            get_droid().stopRingtone()
+    
+    def _preload_audio(self, dt):
+        """界面显示后预先解码警报音，并在后台连接 androidhelper，第一次警报时不必再加载"""
+        if ANDROID_AVAILABLE:
+            threading.Thread(target=get_droid, daemon=True).start()
+        ensure_audio_dir()
+        loaded = self.audio.preload()
+        self.log_message(f"已预加载 {loaded} 个警报音频")
             
     def vibrate(self, duration=1):
         """控制设备震动"""
-        try:
-            if ANDROID_AVAILABLE:
-                self.log_message(f"控制设备震动 {duration} 秒")
-                droid.vibrate(duration * 1000)  # convert to ms
-            else:
-                self.log_message(f"模拟设备震动 {duration} 秒")
-        except Exception as e:
-            self.log_message(f"震动控制出错: {str(e)}")
+        if ANDROID_AVAILABLE:
+            self.log_message(f"控制设备震动 {duration} 秒")
+        else:
+            self.log_message(f"模拟设备震动 {duration} 秒")
+        self.effects.play(CHANNEL_VIBRATE, pulse_pattern(duration), priority=DEFAULT_COMMAND_PRIORITY)
             
     def flash_light(self, count=3, interval=0.5):
         """控制闪光灯闪烁"""
-        try:
-            if ANDROID_AVAILABLE:
-                self.log_message(f"控制闪光灯闪烁 {count} 次")
-                for i in range(count):
-                    droid.toggleFlashLight(True)
-                    time.sleep(interval)
-                    droid.toggleFlashLight(False)
-                    time.sleep(interval)
-            else:
-                self.log_message(f"模拟闪光灯闪烁 {count} 次")
-        except Exception as e:
-            self.log_message(f"闪光灯控制出错: {str(e)}")
+        if ANDROID_AVAILABLE:
+            self.log_message(f"控制闪光灯闪烁 {count} 次")
+        else:
+            self.log_message(f"模拟闪光灯闪烁 {count} 次")
+        self.effects.play(CHANNEL_FLASH, pulse_pattern(interval, interval), repeat=count,
+                          priority=DEFAULT_COMMAND_PRIORITY)
             
     def show_notification(self, title, message):
         """显示通知"""
         try:
             if ANDROID_AVAILABLE:
                 self.log_message(f"显示通知: {title} - {message}")
-                droid.notify(title, message)
+                get_droid().notify(title, message)
             else:
                 self.log_message(f"模拟显示通知: {title} - {message}")
         except Exception as e:
@@ -672,7 +973,7 @@ class AlertClientApp(App):
             if ANDROID_AVAILABLE:
                 self.log_message(f"显示悬浮窗: {message}")
                 # 在Android上使用通知作为悬浮窗的替代方案
-                droid.notify("紧急警报", message, "ongoing_event")
+                get_droid().notify("紧急警报", message, "ongoing_event")
             else:
                 self.log_message(f"模拟显示悬浮窗: {message}")
         except Exception as e:
@@ -682,20 +983,20 @@ class AlertClientApp(App):
         """检查应用是否在前台运行"""
         if ANDROID_AVAILABLE:
             try:
-                from jnius import autoclass
-                PythonActivity = autoclass('org.kivy.android.PythonActivity')
-                activity = PythonActivity.mActivity
-                return activity.getWindow().getDecorView().getWindowVisibility() == 0  # VISIBLE
+                return self.android.is_foreground()
             except Exception as e:
                 self.log_message(f"检查前台状态出错: {str(e)}")
                 return True  # 默认假设在前台
         return True
             
-    def start_alert(self, params=None):
+    def start_alert(self, params=None, received_at=None, peer=None, message_id=None):
         """启动综合警报
         
         Args:
-            params: 可选参数字典，可包含alert_duration等配置
+            params: 可选参数字典，可包含alert_duration、level等配置
+            received_at: 收到警报时的 time.monotonic() 时间，用于统计从收到警报到开始发声的耗时
+            peer: 发来警报的连接的来源信息，确认消息从该连接回送
+            message_id: 警报消息的ID，确认消息的 ref 字段带回此ID
         """
         try:
             # 设置默认参数
@@ -717,22 +1018,21 @@ class AlertClientApp(App):
             
             # 记录警报来源
             self.alert_source = params.get('source', 'unknown')
+            if peer is not None:
+                self.alert_peer = peer
+                self.alert_ref = message_id
             alert_message = params.get('message', '收到警报！')
             
             # 显示悬浮窗
             self.show_floating_window(alert_message)
             
-            # 启动闪光灯线程
-            if self.flash_thread is None or not self.flash_thread.is_alive():
-                self.flash_thread = threading.Thread(target=self._flash_loop)
-                self.flash_thread.daemon = True
-                self.flash_thread.start()
-            
-            # 启动声音播放
-            threading.Thread(target=self._sound_loop).start()
-            
-            # 震动
-            self.vibrate()
+            # 闪光灯、声音循环直到警报停止，震动一次；警报已在进行时相同的效果请求会被合并
+            critical = LEVEL_PRIORITY['critical']
+            self.effects.play(CHANNEL_FLASH, ALERT_FLASH_PATTERN, repeat=None, priority=critical)
+            self.effects.play(CHANNEL_SOUND, ALERT_SOUND_PATTERN, repeat=None, priority=critical,
+                              asset=self.audio.sound_for(params.get('level', 'critical')),
+                              requested_at=received_at)
+            self.effects.play(CHANNEL_VIBRATE, pulse_pattern(1), priority=critical)
             
             # 显示通知
             self.show_notification("紧急警报", alert_message)
@@ -745,6 +1045,11 @@ class AlertClientApp(App):
         
     def stop_alert(self, instance=None):
         """停止警报"""
+        if self.service_client is not None:
+            # 警报由后台服务响应，停止命令发给服务
+            if not self.service_client.send_command('stop_alert'):
+                self.log_message("未连接后台警报服务，无法停止警报")
+            return
         try:
             if self.is_alert_active:
                 self.log_message("停止警报")
@@ -753,39 +1058,21 @@ class AlertClientApp(App):
                 self.alert_stop_event.set()
                 self.is_alert_active = False
                 
-                # 停止音频播放
-                if hasattr(self, 'current_alert_sound') and self.current_alert_sound:
-                    try:
-                        self.current_alert_sound.stop()
-                    except Exception as e:
-                        self.log_message(f"停止音频播放出错: {str(e)}")
-                    self.current_alert_sound = None
-                
-                # 停止闪光灯
-                if ANDROID_AVAILABLE:
-                    try:
-                        droid.toggleFlashLight(False)
-                    except:
-                        pass
-                
-                # 停止声音
-                if ANDROID_AVAILABLE:
-                    try:
-                        droid.stopRingtone()
-                    except:
-                        pass
+                # 警报被人工停止后，相同警报再次到达时应重新报警
+                self.alert_deduplicator.clear()
                 
-                # 停止震动
-                if ANDROID_AVAILABLE:
-                    try:
-                        droid.cancelVibrate()
-                    except Exception as e:
-                        self.log_message(f"停止震动出错: {str(e)}")
+                # 立即关闭闪光灯、声音和震动，不等待当前节拍结束
+                self.effects.cancel()
+                stats = self.effects.stats()
+                self.log_message(
+                    f"硬件效果已停止，耗时 {stats['last_stop_latency_ms']} 毫秒；"
+                    f"本次警报从收到到发声耗时 {stats['start_latency_ms'].get(CHANNEL_SOUND)} 毫秒"
+                )
                 
                 # 取消通知
                 if ANDROID_AVAILABLE:
                     try:
-                        droid.cancelNotification()
+                        get_droid().cancelNotification()
                     except:
                         pass
                 
@@ -797,13 +1084,7 @@ class AlertClientApp(App):
                 # 移除悬浮窗
                 if hasattr(self, 'floating_window') and self.floating_window and ANDROID_AVAILABLE:
                     try:
-                        from jnius import autoclass, cast
-                        Context = autoclass('android.content.Context')
-                        WindowManager = autoclass('android.view.WindowManager')
-                        PythonActivity = autoclass('org.kivy.android.PythonActivity')
-                        activity = PythonActivity.mActivity
-                        window_manager = cast(WindowManager, activity.getSystemService(Context.WINDOW_SERVICE))
-                        window_manager.removeViewImmediate(self.floating_window)
+                        self.android.remove_view(self.floating_window)
                         self.floating_window = None
                     except Exception as e:
                         self.log_message(f"移除悬浮窗出错: {str(e)}")
@@ -817,40 +1098,13 @@ class AlertClientApp(App):
         except Exception as e:
             self.log_message(f"停止警报出错: {str(e)}")
             
-    def _flash_loop(self):
-        """闪光灯循环闪烁"""
-        try:
-            while not self.alert_stop_event.is_set() and self.is_alert_active:
-                if ANDROID_AVAILABLE:
-                    try:
-                        droid.toggleFlashLight(True)
-                        time.sleep(0.5)
-                        droid.toggleFlashLight(False)
-                        time.sleep(0.5)
-                    except:
-                        break
-                else:
-                    self.log_message("模拟闪光灯闪烁")
-                    time.sleep(1)
-        except Exception as e:
-            self.log_message(f"闪光灯循环出错: {str(e)}")
-            
-    def _sound_loop(self):
-        """声音循环播放"""
-        try:
-            while not self.alert_stop_event.is_set() and self.is_alert_active:
-                self.play_sound(duration=2)
-                if self.alert_stop_event.is_set():
-                    break
-                time.sleep(0.5)  # 短暂暂停后继续
-        except Exception as e:
-            self.log_message(f"声音循环出错: {str(e)}")
-
 if __name__ == '__main__':
     try:
-        print("正在初始化 Kivy 应用...")
         app = AlertClientApp()
-        print("应用初始化完成，正在启动...")
+        # 先开始监听，再打印诊断信息和创建窗口
+        app.start_alert_path()
+        print_diagnostics()
+        print("正在启动 Kivy 应用...")
         app.run()
     except Exception as e:
         import traceback
@@ -0,0 +1,278 @@
+import sys
+
+from dispatch_queue import COMMAND_PRIORITY, DEFAULT_COMMAND_PRIORITY, LEVEL_PRIORITY
+
+# 转换为消息对象的消息类型
+TYPE_ALERT = 'alert'
+TYPE_COMMAND = 'command'
+
+# 警报级别；解析时换成这里的字符串对象，之后按同一个对象比较和查表
+LEVEL_CRITICAL = 'critical'
+LEVEL_WARNING = 'warning'
+LEVEL_INFO = 'info'
+LEVELS = {level: sys.intern(level) for level in LEVEL_PRIORITY}
+
+NUMBER = (int, float)
+
+# 处理器和应用内置的命令及其参数类型，参数缺省时不检查；未列出的命令只检查参数是否为对象
+COMMAND_PARAMS = {
+    'beep': {'duration': NUMBER, 'repeat': int},
+    'vibrate': {'duration': NUMBER, 'repeat': int},
+    'flash': {'count': int, 'color': list},
+    'display': {'text': str, 'duration': NUMBER},
+    'alert': {'message': str},
+    'stop_alert': {},
+}
+COMMANDS = {command: sys.intern(command) for command in COMMAND_PARAMS}
+
+_MISSING = object()
+
+
+class MessageError(ValueError):
+    """消息字段不合法，消息在进入分发队列之前被拒绝"""
+
+
+class Message:
+    """
+    警报和命令消息的基类
+
+    网络层解码出的 alert/command 字典由 parse_message 转换为消息对象，字段只在转换时校验一次，
+    之后的处理直接读取属性。消息对象使用 __slots__，比同样内容的字典占用的内存少得多。
+
+    为兼容按字典读取消息的模块(警报日志、转发器、去重器等)，消息对象也提供字典的
+    get、[]、in、keys 和 items；没有单独定义属性的字段(如 seq、relay_hops)保存在 extra 中。
+    值为 None 的属性视为该字段不存在。
+    """
+
+    __slots__ = ('id', 'params', 'source', 'received_at', 'priority', 'extra')
+
+    type = None
+    # 可按字典键读写的属性，子类加上自己的字段
+    FIELDS = frozenset(('id', 'params', 'source', 'received_at'))
+    # to_dict 中字段的顺序
+    _ORDER = ('id', 'params', 'source', 'received_at')
+
+    def __init__(self, message_id=None, params=None, source=None, received_at=None, extra=None):
+        self.id = message_id
+        self.params = params
+        self.source = source
+        self.received_at = received_at
+        self.extra = extra
+
+    @property
+    def source_ip(self):
+        """来源IP，没有来源信息时为 'unknown'"""
+        return self.source.get('ip', 'unknown') if self.source else 'unknown'
+
+    def get(self, key, default=None):
+        if key == 'type':
+            return self.type
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        if self.extra:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        elif key == 'type':
+            raise KeyError("消息类型不能修改")
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def to_dict(self):
+        """
+        转换为字典，用于编码和写入日志
+
+        Returns:
+            dict: 包含 type、值不为 None 的属性和 extra 中的字段
+        """
+        message = {'type': self.type}
+        for key in self._ORDER:
+            value = getattr(self, key)
+            if value is not None:
+                message[key] = value
+        if self.extra:
+            message.update(self.extra)
+        return message
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.to_dict()!r})"
+
+
+class AlertMessage(Message):
+    """警报消息，level 为 LEVELS 中的字符串，priority 为该级别的分发优先级"""
+
+    __slots__ = ('level', 'content')
+
+    type = TYPE_ALERT
+    FIELDS = Message.FIELDS | {'level', 'content'}
+    _ORDER = ('id', 'level', 'content', 'params', 'source', 'received_at')
+
+    def __init__(self, level=LEVEL_INFO, content=None, message_id=None, params=None, source=None,
+                 received_at=None, extra=None):
+        # 每条消息都会创建一次，直接给各属性赋值，不经过基类的 __init__
+        self.level = level
+        self.content = content
+        self.priority = LEVEL_PRIORITY[level]
+        self.id = message_id
+        self.params = params
+        self.source = source
+        self.received_at = received_at
+        self.extra = extra
+
+    def __setitem__(self, key, value):
+        if key == 'level':
+            value = _parse_level(value)
+            self.priority = LEVEL_PRIORITY[value]
+        super().__setitem__(key, value)
+
+
+class CommandMessage(Message):
+    """命令消息，已知命令的 command 为 COMMANDS 中的字符串，priority 为该命令的分发优先级"""
+
+    __slots__ = ('command',)
+
+    type = TYPE_COMMAND
+    FIELDS = Message.FIELDS | {'command'}
+    _ORDER = ('id', 'command', 'params', 'source', 'received_at')
+
+    def __init__(self, command, message_id=None, params=None, source=None, received_at=None, extra=None):
+        self.command = command
+        self.priority = COMMAND_PRIORITY.get(command, DEFAULT_COMMAND_PRIORITY)
+        self.id = message_id
+        self.params = params
+        self.source = source
+        self.received_at = received_at
+        self.extra = extra
+
+    def as_alert(self, level=LEVEL_CRITICAL, content=None):
+        """
+        把命令转换为警报消息，如 alert 命令按关键级别警报去重和响应
+
+        Args:
+            level: 警报级别
+            content: 警报内容
+
+        Returns:
+            AlertMessage: 与命令的ID、参数和来源相同的警报
+        """
+        return AlertMessage(level=level, content=content, message_id=self.id, params=self.params,
+                            source=self.source, received_at=self.received_at, extra=self.extra)
+
+
+def _parse_level(level):
+    interned = LEVELS.get(level) if isinstance(level, str) else None
+    if interned is None:
+        raise MessageError(f"未知的警报级别: {level!r}，可用: {', '.join(LEVELS)}")
+    return interned
+
+
+def _common(data, known):
+    """校验ID和参数，返回 (ID, 参数, 其余字段)"""
+    message_id = data.get('id')
+    if message_id is not None and (isinstance(message_id, bool) or not isinstance(message_id, (str, int))):
+        raise MessageError("消息ID必须是字符串或整数")
+    params = data.get('params')
+    if params is not None and not isinstance(params, dict):
+        raise MessageError("params 必须是对象")
+    extra = None
+    for key in data:
+        if key not in known:
+            if extra is None:
+                extra = {}
+            extra[key] = data[key]
+    return message_id, params, extra
+
+
+_ALERT_KEYS = AlertMessage.FIELDS | {'type'}
+_COMMAND_KEYS = CommandMessage.FIELDS | {'type'}
+
+
+def _parse_alert(data):
+    level = _parse_level(data.get('level', LEVEL_INFO))
+    content = data.get('content')
+    if content is not None and not isinstance(content, str):
+        raise MessageError("警报内容必须是字符串")
+    message_id, params, extra = _common(data, _ALERT_KEYS)
+    return AlertMessage(level, content, message_id, params, data.get('source'), data.get('received_at'), extra)
+
+
+def _parse_command(data):
+    command = data.get('command')
+    if not isinstance(command, str) or not command:
+        raise MessageError("命令消息缺少 command")
+    command = COMMANDS.get(command, command)
+    message_id, params, extra = _common(data, _COMMAND_KEYS)
+    check_params(command, params, COMMAND_PARAMS.get(command))
+    return CommandMessage(command, message_id, params, data.get('source'), data.get('received_at'), extra)
+
+
+def check_params(command, params, schema):
+    """
+    按参数类型表检查命令参数
+
+    Args:
+        command: 命令名
+        params: 参数字典，可为 None
+        schema: {参数名: 类型或类型元组}，为 None 时不检查
+
+    Raises:
+        MessageError: 参数类型与类型表不符
+    """
+    if schema and params:
+        for name, expected in schema.items():
+            value = params.get(name)
+            if value is not None and not isinstance(value, expected):
+                raise MessageError(f"命令 {command} 的参数 {name} 类型错误")
+
+
+_PARSERS = {
+    TYPE_ALERT: _parse_alert,
+    TYPE_COMMAND: _parse_command,
+}
+
+
+def parse_message(data):
+    """
+    把解码出的 alert/command 字典转换为消息对象并校验字段
+
+    Args:
+        data: 解码出的消息字典，不会被修改
+
+    Returns:
+        AlertMessage/CommandMessage；其他类型的消息和已转换的消息原样返回
+
+    Raises:
+        MessageError: 字段不合法，如未知的警报级别、缺少命令名或参数类型错误
+    """
+    if not isinstance(data, dict):
+        return data
+    parser = _PARSERS.get(data.get('type'))
+    if parser is None:
+        return data
+    return parser(data)
+
+
+def is_message(value):
+    """是否为可分发的消息(字典或消息对象)"""
+    return isinstance(value, (dict, Message))
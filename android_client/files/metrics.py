@@ -0,0 +1,307 @@
+import bisect
+import ipaddress
+import json
+import os
+import threading
+import time
+
+# 延迟直方图的默认分桶上界(毫秒)，最后一个桶收集所有更大的值
+DEFAULT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def is_local_address(ip):
+    """
+    判断地址是否为本机回环地址，stats 等本地命令只接受来自本机的请求
+
+    Args:
+        ip: IP地址字符串
+
+    Returns:
+        bool: 是否为回环地址
+    """
+    try:
+        return ipaddress.ip_address(ip).is_loopback
+    except ValueError:
+        return False
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """可增可减的当前值；指定 fn 时在取快照时调用 fn 读取，热路径上没有任何开销"""
+
+    __slots__ = ('value', 'fn', '_lock')
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def snapshot(self):
+        if self.fn is None:
+            return self.value
+        try:
+            return self.fn()
+        except Exception as e:
+            return f"error: {str(e)}"
+
+
+class Histogram:
+    """
+    固定分桶的延迟直方图(毫秒)
+
+    计时用法:
+        started = histogram.start()
+        ...
+        histogram.stop(started)
+    """
+
+    __slots__ = ('buckets', 'counts', 'count', 'total', 'max', '_lock')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        记录一个观测值
+
+        Args:
+            value: 观测值(毫秒)
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def start(self):
+        """返回计时起点，交给 stop 使用"""
+        return time.perf_counter()
+
+    def stop(self, started):
+        """记录从 start 返回的起点到现在经过的毫秒数"""
+        self.observe((time.perf_counter() - started) * 1000)
+
+    def percentile(self, pct):
+        """
+        按分桶估算百分位数
+
+        Args:
+            pct: 百分位(0-100)
+
+        Returns:
+            float: 该百分位所在分桶的上界，超出最大分桶时返回观测到的最大值
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            rank = pct / 100 * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank and count:
+                    return self.buckets[index] if index < len(self.buckets) else self.max
+            return self.max
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            count, total, maximum = self.count, self.total, self.max
+        labels = [f"le_{bound}" for bound in self.buckets] + ['inf']
+        return {
+            'count': count,
+            'avg_ms': round(total / count, 3) if count else None,
+            'max_ms': round(maximum, 3),
+            'p50_ms': self.percentile(50),
+            'p99_ms': self.percentile(99),
+            'buckets': {label: n for label, n in zip(labels, counts) if n},
+        }
+
+
+class _NullMetric:
+    """关闭统计时使用的空指标，所有操作都不做任何事"""
+
+    __slots__ = ()
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def start(self):
+        return 0
+
+    def stop(self, started):
+        pass
+
+
+NULL_METRIC = _NullMetric()
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    按名称创建并缓存计数器、仪表和直方图。关闭时所有指标都是共享的空指标，
+    热路径上只剩一次空方法调用。可以定期把快照交给回调(如写入文件)。
+    """
+
+    def __init__(self, enabled=True):
+        """
+        初始化指标注册表
+
+        Args:
+            enabled: 是否启用统计
+        """
+        self.enabled = enabled
+        self.started = time.time()
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._dump_stop = None
+        self._dump_thread = None
+
+    def counter(self, name):
+        """取得计数器"""
+        return self._get(name, Counter)
+
+    def gauge(self, name, fn=None):
+        """
+        取得仪表
+
+        Args:
+            name: 指标名称
+            fn: 可选的读取函数，取快照时调用，返回值可以是数值或字典
+        """
+        return self._get(name, Gauge, fn)
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS_MS):
+        """取得延迟直方图"""
+        return self._get(name, Histogram, buckets)
+
+    def snapshot(self):
+        """
+        返回所有指标的快照
+
+        Returns:
+            dict: 时间戳、运行时长，以及按类型分组的指标值
+        """
+        with self._lock:
+            metrics = list(self._metrics.items())
+        result = {
+            'timestamp': round(time.time(), 3),
+            'uptime_s': round(time.time() - self.started, 1),
+            'enabled': self.enabled,
+            'counters': {},
+            'gauges': {},
+            'histograms': {},
+        }
+        groups = {Counter: 'counters', Gauge: 'gauges', Histogram: 'histograms'}
+        for name, metric in sorted(metrics):
+            result[groups[type(metric)]][name] = metric.snapshot()
+        return result
+
+    def start_dump(self, interval, sink):
+        """
+        定期导出快照
+
+        Args:
+            interval: 导出间隔(秒)
+            sink: 回调函数，参数为快照字典
+        """
+        self.stop_dump()
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    sink(self.snapshot())
+                except Exception:
+                    # 导出失败不影响下一次导出
+                    pass
+
+        self._dump_stop = stop
+        self._dump_thread = threading.Thread(target=run)
+        self._dump_thread.daemon = True
+        self._dump_thread.start()
+
+    def stop_dump(self):
+        """停止定期导出"""
+        if self._dump_stop:
+            self._dump_stop.set()
+            self._dump_thread.join(timeout=5)
+            self._dump_stop = None
+            self._dump_thread = None
+
+    def _get(self, name, cls, arg=None):
+        if not self.enabled:
+            return NULL_METRIC
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = cls() if arg is None else cls(arg)
+                    self._metrics[name] = metric
+        return metric
+
+
+# 未传入注册表的组件使用此关闭状态的注册表
+NULL_REGISTRY = MetricsRegistry(enabled=False)
+
+
+def snapshot_writer(path):
+    """
+    返回一个把快照写入文件的导出回调，文件只保存最新的快照
+
+    Args:
+        path: 快照文件路径
+
+    Returns:
+        function: 可交给 MetricsRegistry.start_dump 的回调
+    """
+    def write(snapshot):
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        # 先写临时文件再替换，读取方不会看到写了一半的文件
+        os.replace(temp_path, path)
+    return write
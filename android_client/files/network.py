@@ -1,21 +1,102 @@
-import socket
-import threading
 import json
-from kivy.clock import Clock
+import time
+
+from datagram import DatagramListener
+from dedup import SeenIds
+from dispatch_queue import PriorityDispatcher
+from engines import (
+    DEFAULT_BACKLOG, DEFAULT_HEARTBEAT_INTERVAL, DEFAULT_IDLE_TIMEOUT, DEFAULT_KEEPALIVE,
+    DEFAULT_MAX_CONNECTIONS, create_engine
+)
+from messages import MessageError, is_message, parse_message
+from metrics import NULL_REGISTRY, is_local_address
+from pool import ConnectionPool
+from framing import (
+    FRAMING_AUTO, FRAMING_LENGTH, FRAMING_NDJSON, FrameError, StreamDecoder, encode_message
+)
+from wire_codecs import CODEC_JSON, JSON_CODEC, available_codecs, get_codec, sniff_codec
+
+# 对 {"type": "ping"} 心跳的应答
+PONG_MESSAGE = {'type': 'pong'}
+
+# 以 0x80-0xbf 开头的帧不可能是JSON或UTF-8文本，是未启用的二进制编码(MessagePack/CBOR 的字典)
+_BINARY_FIRST_BYTES = range(0x80, 0xc0)
+
+# 消息ID重复的消息不再分发，直接给出此结果，发送方据此停止重试
+DUPLICATE_RESULT = {'status': 'ok', 'message': '重复消息，已忽略', 'duplicate': True}
+
+# 已应答的消息在分发队列中被更优先的消息挤出时，通过原连接发送此消息，ref 字段带回消息ID
+EVICTED_MESSAGE = {'type': 'nack', 'status': 'error', 'message': '分发队列已满，消息已丢弃，请重试'}
+
 
 class NetworkManager:
-    def __init__(self, callback=None):
+    def __init__(self, callback=None, engine='thread', framing=FRAMING_AUTO, pool=None,
+                 batch_callback=None, metrics=None, backlog=DEFAULT_BACKLOG,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, keepalive=DEFAULT_KEEPALIVE,
+                 seen_ids=None, codec=CODEC_JSON, codecs=None):
         """
         初始化网络管理器
         
         Args:
             callback: 接收消息时的回调函数
+            engine: 传输引擎，'thread'(每连接一个线程)、'asyncio'(单线程事件循环)
+                或 engines.BaseEngine 的子类
+            framing: 监听端口的分帧方式，'auto'(按连接首字节协商)、'ndjson' 或 'length'
+            pool: send_message 使用的连接池，默认新建一个，可在多个实例间共享
+            batch_callback: 批量回调函数，设置后一次接收到的所有消息以列表形式一次性交给它，
+                可返回与消息一一对应的处理结果列表
+            metrics: 指标注册表，默认不统计
+            backlog: 监听队列长度
+            max_connections: 最大同时连接数，超出时拒绝新连接，None 表示不限制
+            idle_timeout: 连接在该时长(秒)内没有收到数据即关闭，None 表示不限制
+            heartbeat_interval: 连接空闲超过该时长(秒)时发送 ping 心跳，None 表示不发送
+            keepalive: TCP keepalive 参数 (空闲秒数, 探测间隔秒数, 探测次数)，None 表示不启用
+            seen_ids: 已处理消息ID集合(dedup.SeenIds)，带 id 字段的消息按来源IP和ID只处理一次，默认新建一个
+            codec: send_message 发送消息使用的编码名称或 wire_codecs.Codec，二进制编码使用长度前缀分帧，
+                对端需支持该编码
+            codecs: 监听端口接受的编码列表，默认为全部可用的编码；按连接上第一帧识别，响应使用相同的编码
         """
         self.callback = callback
-        self.socket = None
+        self.batch_callback = batch_callback
+        self.engine_name = engine
+        self.framing = framing
+        self.engine = None
+        self.datagram = None
+        self.engine_options = {
+            'backlog': backlog,
+            'max_connections': max_connections,
+            'idle_timeout': idle_timeout,
+            'heartbeat_interval': heartbeat_interval,
+            'keepalive': keepalive,
+        }
         self.is_listening = False
-        self.connection_thread = None
-        self.client_handlers = []
+        self.pool = pool if pool is not None else ConnectionPool()
+        self.seen_ids = seen_ids if seen_ids is not None else SeenIds()
+        self.codec = get_codec(codec)
+        self.codecs = [get_codec(name) for name in (codecs or available_codecs())]
+        
+        self.metrics = metrics if metrics is not None else NULL_REGISTRY
+        self._bytes_in = self.metrics.counter('net.bytes_in')
+        self._frames_in = self.metrics.counter('net.frames')
+        self._messages_in = self.metrics.counter('net.messages')
+        self._batches_in = self.metrics.counter('net.batches')
+        self._frame_errors = self.metrics.counter('net.frame_errors')
+        self._parse_errors = self.metrics.counter('net.parse_errors')
+        self._invalid_messages = self.metrics.counter('net.invalid_messages')
+        self._raw_frames = self.metrics.counter('net.raw_data')
+        self._dispatch_errors = self.metrics.counter('net.dispatch_errors')
+        self._duplicates = self.metrics.counter('net.duplicates')
+        self._send_errors = self.metrics.counter('net.send_errors')
+        self._process_time = self.metrics.histogram('net.process_ms')
+        self._dispatch_time = self.metrics.histogram('net.dispatch_ms')
+        self._send_time = self.metrics.histogram('net.send_ms')
+        self._codec_counts = {codec.name: self.metrics.counter(f'net.codec.{codec.name}') for codec in self.codecs}
+        self.metrics.gauge('net.connections', self.connection_count)
+        self.metrics.gauge('net.engine', self.engine_stats)
+        self.metrics.gauge('net.pool', self.pool.stats)
+        self.metrics.gauge('net.seen_ids', self.seen_ids.stats)
+        self.metrics.gauge('udp.sequences', self.datagram_stats)
     
     def start_server(self, host='0.0.0.0', port=8888):
         """
@@ -29,133 +110,485 @@ class NetworkManager:
             bool: 是否成功启动
         """
         try:
-            # 创建套接字
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.socket.bind((host, port))
-            self.socket.listen(5)
-            
+            self.engine = create_engine(self.engine_name, self, **self.engine_options)
+            self.engine.start(host, port)
             self.is_listening = True
-            
-            # 在新线程中接受连接
-            self.connection_thread = threading.Thread(target=self.accept_connections)
-            self.connection_thread.daemon = True
-            self.connection_thread.start()
-            
             return True
         except Exception as e:
+            self.engine = None
             if self.callback:
                 self.callback({"type": "error", "message": f"启动服务失败: {str(e)}"})
             return False
     
+    def start_datagram(self, host='0.0.0.0', port=8888, group=None, interface='0.0.0.0'):
+        """
+        启动UDP/组播接收，与TCP监听并行，收到的消息进入同一条分发链路
+        
+        Args:
+            host: 监听地址
+            port: 监听端口，可与TCP监听端口相同
+            group: 组播地址，None 表示只接收单播和广播
+            interface: 加入组播组使用的本机网卡地址
+            
+        Returns:
+            bool: 是否成功启动
+        """
+        self.stop_datagram()
+        listener = DatagramListener(self, host, port, group, interface)
+        try:
+            listener.start()
+        except Exception as e:
+            self.notify({"type": "error", "message": f"启动UDP接收失败: {str(e)}"})
+            return False
+        self.datagram = listener
+        return True
+    
+    def stop_datagram(self):
+        """停止UDP/组播接收"""
+        if self.datagram:
+            self.datagram.stop()
+            self.datagram = None
+    
+    def datagram_stats(self):
+        """返回UDP接收的序号跟踪统计，未启动时为空字典"""
+        return self.datagram.sequences.stats() if self.datagram else {}
+    
     def stop_server(self):
         """停止服务器"""
-        if self.socket:
+        self.stop_datagram()
+        if self.engine:
             self.is_listening = False
-            self.socket.close()
-            self.socket = None
-            
-            # 清理客户端处理线程
-            self.client_handlers = []
+            self.engine.stop()
+            self.engine = None
+            self.pool.close_all()
             
             if self.callback:
                 self.callback({"type": "info", "message": "服务已停止"})
     
-    def accept_connections(self):
-        """接受客户端连接"""
-        while self.is_listening:
-            try:
-                client_socket, address = self.socket.accept()
-                
-                # 创建客户端处理线程
-                client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, address)
-                )
-                client_thread.daemon = True
-                client_thread.start()
-                
-                # 保存线程引用
-                self.client_handlers.append(client_thread)
-                
-                if self.callback:
-                    self.callback({
-                        "type": "connection", 
-                        "message": f"接受来自 {address[0]}:{address[1]} 的连接"
-                    })
-            except:
-                # 如果socket被关闭，退出循环
-                break
-    
-    def handle_client(self, client_socket, address):
-        """
-        处理客户端连接
-        
-        Args:
-            client_socket: 客户端套接字
+    def connection_count(self):
+        """返回当前活动连接数"""
+        return self.engine.connection_count() if self.engine else 0
+    
+    def engine_stats(self):
+        """返回传输引擎的连接管理统计，服务未启动时为空字典"""
+        return self.engine.stats() if self.engine else {}
+    
+    def notify(self, message):
+        """
+        通过回调上报消息
+        
+        Args:
+            message: 消息字典
+        """
+        if self.callback:
+            self.callback(message)
+    
+    def create_decoder(self):
+        """为新连接创建分帧解码器"""
+        return StreamDecoder(self.framing)
+    
+    def process_data(self, data, address, decoder):
+        """
+        处理一次接收到的数据，由传输引擎在其接收线程中调用
+        
+        一次接收的数据可能包含多条消息，也可能只是一条消息的一部分，
+        由连接的解码器切分出完整的帧。本次得到的所有消息(包括批量信封
+        {"type": "batch", "messages": [...]} 中的消息)合并为一批分发，
+        所有响应合并为一次写入。分发的消息带有来源 source 和接收时间
+        received_at(time.monotonic())。
+        
+        带 id 字段的消息只处理一次：同一来源重复发送的ID不再分发，直接应答成功；
+        响应和批量结果中带回消息的 id，发送方据此确认送达。
+        
+        Args:
+            data: 接收到的原始字节
             address: 客户端地址
+            decoder: 该连接的分帧解码器
+            
+        Returns:
+            bytes: 需要回写给客户端的响应，无需响应时为None
+            
+        Raises:
+            FrameError: 数据流无法分帧，连接需要关闭
+        """
+        return self._process(len(data), address, decoder, lambda: decoder.feed(data, copy=False))
+    
+    def process_received(self, size, address, decoder):
         """
+        处理已由 recv_into 读入解码器缓冲区(decoder.get_buffer())的数据
+        
+        与 process_data 相同，但数据不经过中间字节串：帧是指向连接缓冲区的
+        memoryview，每帧只解码一次，缓冲区在消息之间复用。
+        
+        Args:
+            size: 读入的字节数
+            address: 客户端地址
+            decoder: 该连接的分帧解码器
+            
+        Returns:
+            bytes: 需要回写给客户端的响应，无需响应时为None
+            
+        Raises:
+            FrameError: 数据流无法分帧，连接需要关闭
+        """
+        return self._process(size, address, decoder, lambda: decoder.commit(size))
+    
+    def process_remaining(self, address, decoder):
+        """
+        处理连接中剩余的未结束数据，由传输引擎在连接关闭或空闲时调用
+        
+        旧版发送方不带换行符的原始文本在此之前不会被当作消息，
+        避免一条分成多个TCP分段到达的文本被拆成多条消息。
+        
+        Args:
+            address: 客户端地址
+            decoder: 该连接的分帧解码器
+            
+        Returns:
+            bytes: 需要回写给客户端的响应，无需响应时为None
+        """
+        if not decoder.pending:
+            return None
+        return self._process(0, address, decoder, decoder.flush)
+    
+    def _process(self, size, address, decoder, split):
+        started = self._process_time.start()
+        received_at = time.monotonic()
+        self._bytes_in.inc(size)
+        source = {
+            'ip': address[0],
+            'port': address[1]
+        }
         try:
-            while self.is_listening:
-                data = client_socket.recv(1024)
-                if not data:
-                    break
-                
-                # 处理接收到的数据
-                try:
-                    # 尝试解析JSON数据
-                    message = json.loads(data.decode('utf-8'))
-                    
-                    # 添加来源信息
-                    message['source'] = {
-                        'ip': address[0],
-                        'port': address[1]
-                    }
-                    
-                    # 回调通知
-                    if self.callback:
-                        self.callback(message)
-                    
-                    # 发送响应
-                    response = {'status': 'ok', 'message': '已处理'}
-                    client_socket.send(json.dumps(response).encode('utf-8'))
-                    
-                except json.JSONDecodeError:
-                    # 非JSON格式数据处理
-                    text_data = data.decode('utf-8', errors='ignore')
-                    if self.callback:
-                        self.callback({
-                            "type": "raw_data",
-                            "message": text_data,
-                            "source": {
-                                'ip': address[0],
-                                'port': address[1]
-                            }
-                        })
-                except Exception as e:
-                    if self.callback:
-                        self.callback({
-                            "type": "error",
-                            "message": f"处理数据时出错: {str(e)}",
-                            "source": {
-                                'ip': address[0],
-                                'port': address[1]
-                            }
-                        })
-        except:
-            pass
-        finally:
-            client_socket.close()
-            if self.callback:
-                self.callback({
-                    "type": "disconnection",
-                    "message": f"客户端 {address[0]}:{address[1]} 已断开连接"
-                })
+            frames = split()
+        except FrameError as e:
+            self._frame_errors.inc()
+            self.notify({
+                "type": "error",
+                "message": f"数据分帧失败: {str(e)}",
+                "source": source
+            })
+            raise
+        if not frames:
+            return None
+        self._frames_in.inc(len(frames))
+        if decoder.codec is None:
+            codec = self.negotiate_codec(frames[0], decoder.framing)
+            if codec is None:
+                # 不接受的二进制编码，以JSON逐帧应答错误，对端可改用JSON
+                self._parse_errors.inc(len(frames))
+                self._process_time.stop(started)
+                error = {'status': 'error', 'message': f"不支持的消息编码，可用: {', '.join(c.name for c in self.codecs)}"}
+                return b''.join(encode_message(error, decoder.framing) for _ in frames)
+            decoder.codec = codec
+        codec = decoder.codec
+        
+        # 帧可能指向接收缓冲区，必须在下一次读入之前全部解码
+        decoded = [self.decode_frame(frame, source, codec) for frame in frames]
+        responses = self.process_messages([message for message in decoded if message is not None],
+                                          source, received_at)
+        self._process_time.stop(started)
+        if not responses:
+            return None
+        return b''.join(encode_message(response, decoder.framing, codec) for response in responses)
+    
+    def negotiate_codec(self, frame, framing):
+        """
+        按连接上第一帧的首字节确定该连接的编码
+        
+        Args:
+            frame: 连接上的第一帧
+            framing: 连接的分帧方式，二进制编码只能用于长度前缀分帧
+            
+        Returns:
+            Codec: 编码；无法识别时为JSON，按JSON解析失败的数据作为原始数据上报；
+                是不接受的二进制编码时为 None
+        """
+        codec = JSON_CODEC
+        if framing == FRAMING_LENGTH:
+            codec = sniff_codec(frame, self.codecs)
+            if codec is None:
+                if frame[0] in _BINARY_FIRST_BYTES:
+                    return None
+                codec = JSON_CODEC
+        counter = self._codec_counts.get(codec.name)
+        if counter is not None:
+            counter.inc()
+        return codec
+    
+    def process_messages(self, decoded, source, received_at):
+        """
+        处理一组已解析的消息，TCP 和 UDP 共用
+        
+        alert/command 消息(包括批量信封中的)在这里转换为消息对象(messages.AlertMessage/CommandMessage)
+        并校验字段，字段不合法的消息直接应答错误，不进入分发队列。
+        
+        Args:
+            decoded: 已由 decode_frame 添加来源信息的消息字典列表
+            source: 来源信息字典
+            received_at: 接收时间(time.monotonic())
+            
+        Returns:
+            list: 需要应答的响应字典列表
+        """
+        messages = []
+        # 消息ID重复的消息在 messages 中的位置及其结果，这些消息不再分发
+        presets = {}
+        has_ids = False
+        # 每帧对应的响应: (是否批量, 在messages中的起始位置, 消息数、预先确定的结果列表或响应，stats 查询为None)
+        replies = []
+        for message in decoded:
+            if message.get('type') == 'ping':
+                # 心跳直接应答，不进入分发
+                replies.append((False, 0, PONG_MESSAGE))
+                continue
+            if message.get('type') == 'pong':
+                # 对端对心跳的回复，收到数据时连接已被标记为活动
+                continue
+            if message.get('type') == 'stats':
+                # 本地统计查询不进入分发，在本次消息处理完后应答
+                replies.append((False, 0, None))
+                continue
+            if message.get('type') == 'batch':
+                self._batches_in.inc()
+                items = message.get('messages')
+                if not isinstance(items, list):
+                    replies.append((True, 0, [{'status': 'error', 'message': '批量消息缺少messages列表'}]))
+                    continue
+                replies.append((True, len(messages), len(items)))
+                for item in items:
+                    if isinstance(item, dict):
+                        item['source'] = source
+                        item['received_at'] = received_at
+                        item = self._parse(item, len(messages), presets)
+                        if 'id' in item:
+                            has_ids = True
+                            if len(messages) not in presets:
+                                self._check_id(item, len(messages), presets)
+                    messages.append(item)
+            else:
+                message['received_at'] = received_at
+                message = self._parse(message, len(messages), presets)
+                if 'id' in message:
+                    has_ids = True
+                    if len(messages) not in presets:
+                        self._check_id(message, len(messages), presets)
+                replies.append((False, len(messages), 1))
+                messages.append(message)
+        
+        self._messages_in.inc(len(messages))
+        results = self.dispatch(messages, presets) if messages else []
+        if has_ids:
+            self._settle_ids(messages, results, presets)
+        
+        responses = []
+        for is_batch, start, count in replies:
+            if count is None:
+                response = self.stats_response(source)
+            elif isinstance(count, dict):
+                response = count
+            elif is_batch:
+                items = count if isinstance(count, list) else results[start:start + count]
+                response = {
+                    'status': 'ok' if all(r['status'] == 'ok' for r in items) else 'partial',
+                    'message': '已处理',
+                    'results': items
+                }
+            elif results[start]['status'] == 'ok':
+                response = {'status': 'ok', 'message': '已处理'}
+                response.update(results[start])
+            else:
+                response = results[start]
+            responses.append(response)
+        return responses
+    
+    def _parse(self, message, index, presets):
+        """把 alert/command 消息转换为消息对象；字段不合法的消息放入 presets，不再分发"""
+        try:
+            return parse_message(message)
+        except MessageError as e:
+            self._invalid_messages.inc()
+            presets[index] = {'status': 'error', 'message': str(e)}
+            return message
+    
+    def _check_id(self, message, index, presets):
+        """记录消息ID，重复的消息放入 presets，不再分发"""
+        message_id = message['id']
+        if not isinstance(message_id, (str, int)):
+            return
+        # ID按字符串比较，与警报日志中保存的ID一致
+        if not self.seen_ids.add((message['source']['ip'], str(message_id))):
+            self._duplicates.inc()
+            presets[index] = DUPLICATE_RESULT
+    
+    def _settle_ids(self, messages, results, presets):
+        """把消息ID带回结果；未能处理的消息从已处理集合中移除，发送方重试时再次处理"""
+        for index, message in enumerate(messages):
+            message_id = message.get('id') if is_message(message) else None
+            if not isinstance(message_id, (str, int)):
+                continue
+            result = results[index]
+            if result['status'] != 'ok' and index not in presets:
+                self.seen_ids.discard((message['source']['ip'], str(message_id)))
+            results[index] = dict(result, id=message_id)
+    
+    def stats_response(self, source):
+        """
+        生成 {"type": "stats"} 命令的响应，只接受来自本机的请求
+        
+        Args:
+            source: 来源信息字典
+            
+        Returns:
+            dict: 包含指标快照的响应
+        """
+        if not is_local_address(source['ip']):
+            return {'status': 'error', 'message': 'stats 命令只接受本机请求'}
+        return {'status': 'ok', 'stats': self.metrics.snapshot()}
+    
+    def decode_frame(self, frame, source, codec=None):
+        """
+        解析一条完整的消息帧
+        
+        文本编码的帧只按 UTF-8 解码一次，解析失败时直接用解码后的文本作为原始数据上报。
+        
+        Args:
+            frame: 消息体，bytes、指向接收缓冲区的 memoryview 或已解码的 str
+            source: 来源信息字典
+            codec: 消息编码，默认JSON
+            
+        Returns:
+            dict: 已添加来源信息的消息，非JSON数据或解析失败时为None
+        """
+        codec = codec or JSON_CODEC
+        payload = frame
+        try:
+            if not codec.binary and not isinstance(frame, str):
+                payload = str(frame, 'utf-8')
+            message = codec.decode(payload)
+            if not isinstance(message, dict):
+                raise ValueError("消息必须是JSON对象")
+            
+            # 添加来源信息
+            message['source'] = source
+            return message
+            
+        except json.JSONDecodeError:
+            # 非JSON格式数据处理
+            self._raw_frames.inc()
+            self.notify({
+                "type": "raw_data",
+                "message": payload,
+                "source": source
+            })
+        except Exception as e:
+            self._parse_errors.inc()
+            self.notify({
+                "type": "error",
+                "message": f"处理数据时出错: {str(e)}",
+                "source": source
+            })
+        return None
+    
+    def dispatch(self, messages, presets=None):
+        """
+        一次分发一批消息
+        
+        Args:
+            messages: 消息列表
+            presets: 不分发的消息，{在 messages 中的位置: 处理结果}
+            
+        Returns:
+            list: 与消息一一对应的处理结果字典
+        """
+        results = [
+            {'status': 'ok'} if is_message(message) else {'status': 'error', 'message': '无效消息格式'}
+            for message in messages
+        ]
+        presets = presets or {}
+        for index, result in presets.items():
+            results[index] = result
+        indexes = [
+            index for index, message in enumerate(messages)
+            if is_message(message) and index not in presets
+        ]
+        if not indexes:
+            return results
+        
+        if self.batch_callback:
+            started = self._dispatch_time.start()
+            try:
+                handled = self.batch_callback([messages[index] for index in indexes])
+            except Exception as e:
+                self._dispatch_errors.inc()
+                handled = [{'status': 'error', 'message': str(e)}] * len(indexes)
+            self._dispatch_time.stop(started)
+            if handled:
+                for index, result in zip(indexes, handled):
+                    results[index] = result
+            return results
+        
+        for index in indexes:
+            try:
+                self.notify(messages[index])
+            except Exception as e:
+                self._dispatch_errors.inc()
+                results[index] = {'status': 'error', 'message': str(e)}
+        return results
+    
+    def send_to(self, source, message):
+        """
+        通过对方发来消息的连接回送一条消息，如警报确认
+        
+        UDP 收到的消息没有连接可回送，发送方指定了 ack_port 时改为通过TCP发往该端口。
+        
+        Args:
+            source: 消息中的来源信息字典
+            message: 要发送的消息(字典)
+            
+        Returns:
+            bool: 是否已发送，连接已断开或服务未启动时返回False
+            
+        Raises:
+            OSError: 写入失败
+        """
+        if source.get('transport') == 'udp':
+            if not self.datagram or 'ack_port' not in source:
+                return False
+            self.datagram.send_ack(source['ip'], source['ack_port'], message)
+            return True
+        if not self.engine:
+            return False
+        try:
+            sent = self.engine.send((source['ip'], source['port']), message)
+        except OSError:
+            self._send_errors.inc()
+            raise
+        if not sent:
+            self._send_errors.inc()
+        return sent
+    
+    def disconnect(self, source):
+        """
+        关闭发来消息的TCP连接，如拒绝未通过验证的客户端
+        
+        Args:
+            source: 消息中的来源信息字典
+            
+        Returns:
+            bool: 连接存在并已关闭时返回True
+        """
+        if source.get('transport') == 'udp' or not self.engine:
+            return False
+        return self.engine.disconnect((source['ip'], source['port']))
     
     def send_message(self, host, port, message):
         """
         向指定主机发送消息
         
+        连接从连接池中取出并在收到响应后归还，同一目标地址的后续消息复用该连接。
+        复用的连接如果已被对端关闭，会自动换一个新连接重试一次。
+        
         Args:
             host: 目标主机地址
             port: 目标主机端口
@@ -164,20 +597,151 @@ class NetworkManager:
         Returns:
             dict: 响应消息
         """
+        started = self._send_time.start()
         try:
-            # 创建临时套接字
-            client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            client_socket.settimeout(5)  # 设置超时
-            client_socket.connect((host, port))
-            
-            # 发送消息
-            client_socket.send(json.dumps(message).encode('utf-8'))
-            
-            # 接收响应
-            response_data = client_socket.recv(1024)
-            response = json.loads(response_data.decode('utf-8'))
-            
-            client_socket.close()
-            return response
+            codec = self.codec
+            payload = encode_message(message, FRAMING_LENGTH if codec.binary else FRAMING_NDJSON, codec)
+            while True:
+                conn = self.pool.acquire(host, port)
+                try:
+                    frames = self._request(conn, payload)
+                    # 对端不支持该编码时可能以JSON应答错误
+                    response = (sniff_codec(frames[0], (JSON_CODEC, codec)) or codec).decode(frames[0])
+                except (OSError, ConnectionError):
+                    self.pool.release(conn, reuse=False)
+                    if conn.reused:
+                        # 池中的连接可能已失效，使用新连接重试
+                        continue
+                    raise
+                except Exception:
+                    self.pool.release(conn, reuse=False)
+                    raise
+                # 对端多发了数据时，连接上的请求与响应已无法对应，不再复用
+                self.pool.release(conn, reuse=len(frames) == 1)
+                self._send_time.stop(started)
+                return response
         except Exception as e:
-            return {"status": "error", "message": str(e)}
\ No newline at end of file
+            self._send_errors.inc()
+            return {"status": "error", "message": str(e)}
+    
+    def _request(self, conn, payload):
+        """在连接上发送一条消息，返回读到的第一批完整帧(memoryview)"""
+        conn.sock.sendall(payload)
+        
+        # 接收响应，直到读到一条完整的帧；帧指向连接的读缓冲区，调用方需在下次请求前解码
+        frames = []
+        while not frames:
+            size, frames = conn.decoder.recv_into(conn.sock)
+            if not size:
+                raise ConnectionError("连接在收到响应前被关闭")
+        return frames
+
+
+class AlertTransport:
+    """
+    警报接收链路：传输引擎 -> NetworkManager -> 优先级分发队列 -> 响应处理器
+    
+    网络线程只负责分帧和入队，处理器在分发队列的工作线程中按优先级批量处理消息
+    (handler.handle_batch)，连接和错误等事件交给 handler.handle_message。
+    传输引擎按名称或类指定，更换引擎不需要修改处理器和界面代码。
+    """
+    
+    def __init__(self, handler, engine='thread', framing=FRAMING_AUTO, max_depth=256,
+                 pool=None, metrics=None, seen_ids=None, **options):
+        """
+        初始化警报接收链路
+        
+        Args:
+            handler: 响应处理器，需提供 handle_message、handle_batch 和 preempt
+            engine: 传输引擎名称或 engines.BaseEngine 的子类
+            framing: 监听端口的分帧方式
+            max_depth: 分发队列最大深度
+            pool: send_message 使用的连接池
+            metrics: 指标注册表，默认不统计
+            seen_ids: 已处理消息ID集合，参见 NetworkManager
+            **options: 连接管理参数(backlog、max_connections、idle_timeout、
+                heartbeat_interval、keepalive)，参见 NetworkManager
+        """
+        self.handler = handler
+        self.dispatcher = PriorityDispatcher(
+            handler.handle_batch,
+            max_depth=max_depth,
+            preempt_callback=handler.preempt,
+            drop_callback=self._evicted
+        )
+        self.manager = NetworkManager(
+            callback=handler.handle_message,
+            engine=engine,
+            framing=framing,
+            pool=pool,
+            batch_callback=self.dispatcher.submit_batch,
+            metrics=metrics,
+            seen_ids=seen_ids,
+            **options
+        )
+        self.manager.metrics.gauge('dispatch.queue', self.dispatcher.stats)
+        self._evictions = self.manager.metrics.counter('dispatch.evicted')
+        self.dispatcher.start()
+    
+    @property
+    def is_listening(self):
+        return self.manager.is_listening
+    
+    def start(self, host='0.0.0.0', port=8888, udp_port=None, group=None):
+        """
+        开始监听，可在 stop 之后再次调用
+        
+        Args:
+            host: 监听地址
+            port: 监听端口
+            udp_port: 同时在该端口接收UDP警报，None 表示只监听TCP
+            group: UDP接收加入的组播地址
+            
+        Returns:
+            bool: TCP监听是否成功启动，UDP接收启动失败只上报错误，不影响TCP
+        """
+        if not self.manager.start_server(host, port):
+            return False
+        if udp_port is not None:
+            self.manager.start_datagram(host, udp_port, group)
+        return True
+    
+    def stop(self):
+        """停止监听，分发队列保持运行"""
+        self.manager.stop_server()
+    
+    def close(self):
+        """停止监听和分发队列"""
+        self.stop()
+        self.dispatcher.stop()
+    
+    def send_to(self, source, message):
+        """通过对方发来消息的连接回送一条消息，参见 NetworkManager.send_to"""
+        return self.manager.send_to(source, message)
+    
+    def _evicted(self, message):
+        """
+        已应答 ok 的消息被挤出分发队列：从已处理集合中移除其ID，记录日志并通知发送方重试
+        
+        在提交消息的网络线程中调用。
+        """
+        self._evictions.inc()
+        source = message.get('source') or {}
+        message_id = message.get('id')
+        if isinstance(message_id, (str, int)) and 'ip' in source:
+            # 发送方重试时不会被当作重复消息忽略
+            self.manager.seen_ids.discard((source['ip'], str(message_id)))
+        self.handler.handle_message({
+            "type": "error",
+            "message": f"分发队列已满，丢弃来自 {source.get('ip', 'unknown')} 的 {message.get('type')} 消息(id={message_id})"
+        })
+        if 'ip' not in source:
+            return
+        nack = dict(EVICTED_MESSAGE)
+        if message_id is not None:
+            nack['ref'] = message_id
+        try:
+            self.manager.send_to(source, nack)
+        except OSError:
+            # 连接已断开；发送方未收到确认，会自行重发
+            pass
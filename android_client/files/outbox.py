@@ -0,0 +1,269 @@
+import heapq
+import itertools
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created REAL NOT NULL
+)"""
+
+# 发送失败后的重试间隔(秒)：首次 BASE_DELAY，之后每次翻倍，最长 MAX_DELAY
+BASE_DELAY = 0.5
+MAX_DELAY = 60
+# 重试间隔上下浮动的比例，避免大量消息在同一时刻重试
+JITTER = 0.2
+# 消息最长保留时间(秒)，超过后放弃发送
+DEFAULT_MAX_AGE = 24 * 3600
+
+
+def new_message_id():
+    """生成一个新的消息ID"""
+    return uuid.uuid4().hex
+
+
+def backoff_delay(attempts, base=BASE_DELAY, maximum=MAX_DELAY, jitter=JITTER):
+    """
+    计算第 attempts 次发送失败后的重试间隔
+
+    Args:
+        attempts: 已失败的次数(从1开始)
+        base: 首次重试间隔(秒)
+        maximum: 最长重试间隔(秒)
+        jitter: 上下浮动的比例
+
+    Returns:
+        float: 重试间隔(秒)
+    """
+    delay = min(maximum, base * (2 ** (attempts - 1)))
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+def is_delivered(response, message_id):
+    """
+    判断响应是否确认了消息送达
+
+    接收方处理成功(包括识别为重复消息)时返回 status 为 ok 的响应；
+    支持消息ID的接收方会带回 id，与发送的ID不一致的响应不算确认。
+
+    Args:
+        response: send_message 返回的响应字典
+        message_id: 发送的消息ID
+
+    Returns:
+        bool: 是否已送达
+    """
+    if not isinstance(response, dict) or response.get('status') != 'ok':
+        return False
+    return response.get('id', message_id) == message_id
+
+
+class Outbox:
+    """
+    发送方的可靠发送队列
+
+    send 为消息分配ID、写入 SQLite 后立即返回，由一个发送线程通过 send_message 发出。
+    没有收到确认的消息按指数退避重试，重试时使用相同的ID，接收方据此只处理一次；
+    队列保存在数据库中，应用重启后继续发送。某个目标地址发送失败后，发往该地址的
+    其余消息一起顺延到该地址的下次重试时间，不会对不可达的地址逐条等待超时。
+    """
+
+    def __init__(self, path, send, max_age=DEFAULT_MAX_AGE, base_delay=BASE_DELAY, max_delay=MAX_DELAY,
+                 result_callback=None):
+        """
+        初始化发送队列，数据库中已有的未送达消息会在启动后继续发送
+
+        Args:
+            path: 数据库文件路径
+            send: 发送函数 send(host, port, message)，返回响应字典，如 NetworkManager.send_message
+            max_age: 消息最长保留时间(秒)，超过后放弃发送，None 表示一直重试
+            base_delay: 首次重试间隔(秒)
+            max_delay: 最长重试间隔(秒)
+            result_callback: 消息送达或放弃时的回调，参数为 (队列键, 响应字典或None)，队列键默认即消息ID
+        """
+        self.path = path
+        self.send_function = send
+        self.max_age = max_age
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.result_callback = result_callback
+        self.delivered = 0
+        self.retries = 0
+        self.expired = 0
+        self._heap = []
+        # 发送失败的目标地址: (连续失败次数, 下次重试时间)
+        self._backoff = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._worker = None
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._db_lock = threading.Lock()
+        with self._conn:
+            self._conn.execute(SCHEMA)
+        for key, next_attempt in self._conn.execute("SELECT id, next_attempt FROM outbox"):
+            heapq.heappush(self._heap, (next_attempt, next(self._seq), key))
+
+    def start(self):
+        """启动发送线程"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._worker = threading.Thread(target=self._work)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def stop(self):
+        """停止发送线程并关闭数据库，未送达的消息留在数据库中"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._worker and self._worker is not threading.current_thread():
+            self._worker.join(timeout=10)
+        self._worker = None
+        with self._db_lock:
+            self._conn.close()
+
+    def send(self, host, port, message, key=None):
+        """
+        把消息放入发送队列，不等待网络往返
+
+        Args:
+            host: 目标主机地址
+            port: 目标主机端口
+            message: 消息字典，没有 id 字段时分配一个新ID
+            key: 消息在队列中的键，默认为消息ID；同一条消息发往多个地址时每个地址用一个键
+
+        Returns:
+            str: 消息ID
+        """
+        message = dict(message)
+        message_id = message.setdefault('id', new_message_id())
+        key = key or message_id
+        now = time.time()
+        with self._db_lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO outbox (id, host, port, payload, attempts, next_attempt, created) "
+                    "VALUES (?, ?, ?, ?, 0, ?, ?)",
+                    (key, host, port, json.dumps(message, ensure_ascii=False), now, now)
+                )
+        with self._cond:
+            heapq.heappush(self._heap, (now, next(self._seq), key))
+            self._cond.notify()
+        return message_id
+
+    def pending(self):
+        """返回尚未送达的消息数"""
+        with self._cond:
+            return len(self._heap)
+
+    def stats(self):
+        """
+        返回发送统计
+
+        Returns:
+            dict: 未送达的消息数、已送达数、重试次数和放弃的消息数
+        """
+        return {
+            'pending': self.pending(),
+            'delivered': self.delivered,
+            'retries': self.retries,
+            'expired': self.expired,
+        }
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    now = time.time()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+                if not self._running:
+                    return
+                # 取出本轮到期的全部消息
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+            self._send_round(due)
+
+    def _send_round(self, due):
+        for key in due:
+            if not self._running:
+                # 停止时尚未发送的消息留在数据库中，下次启动后发送
+                return
+            with self._db_lock:
+                row = self._conn.execute(
+                    "SELECT host, port, payload, attempts, created FROM outbox WHERE id = ?", (key,)
+                ).fetchone()
+            if row is None:
+                continue
+            host, port, payload, attempts, created = row
+            if self.max_age is not None and time.time() - created > self.max_age:
+                self._finish(key, None)
+                self.expired += 1
+                continue
+            target = (host, port)
+            failures, retry_at = self._backoff.get(target, (0, None))
+            if retry_at is not None and retry_at > time.time():
+                # 该地址还在退避中，不计入重试次数，到时与发往该地址的其他消息一起重试
+                self._reschedule(key, retry_at)
+                continue
+
+            message = json.loads(payload)
+            response = self.send_function(host, port, message)
+            if is_delivered(response, message['id']):
+                self._backoff.pop(target, None)
+                self._finish(key, response)
+                self.delivered += 1
+            else:
+                attempts += 1
+                failures += 1
+                self.retries += 1
+                # 退避间隔按目标地址的连续失败次数计算，地址恢复前每个间隔只尝试一条消息
+                retry_at = time.time() + backoff_delay(failures, self.base_delay, self.max_delay)
+                self._backoff[target] = (failures, retry_at)
+                self._reschedule(key, retry_at, attempts)
+
+    def _reschedule(self, key, next_attempt, attempts=None):
+        try:
+            with self._db_lock:
+                with self._conn:
+                    if attempts is not None:
+                        self._conn.execute("UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ?",
+                                           (attempts, next_attempt, key))
+                    else:
+                        self._conn.execute("UPDATE outbox SET next_attempt = ? WHERE id = ?",
+                                           (next_attempt, key))
+        except sqlite3.ProgrammingError:
+            # 停止时数据库已关闭，消息仍按上次保存的时间重试
+            return
+        with self._cond:
+            heapq.heappush(self._heap, (next_attempt, next(self._seq), key))
+
+    def _finish(self, key, response):
+        try:
+            with self._db_lock:
+                with self._conn:
+                    self._conn.execute("DELETE FROM outbox WHERE id = ?", (key,))
+        except sqlite3.ProgrammingError:
+            return
+        if self.result_callback:
+            try:
+                self.result_callback(key, response)
+            except Exception:
+                pass
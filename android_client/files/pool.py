@@ -0,0 +1,180 @@
+import select
+import socket
+import threading
+import time
+
+from framing import FRAMING_AUTO, StreamDecoder
+
+
+class PoolTimeout(Exception):
+    """等待可用连接超时"""
+
+
+class PooledConnection:
+    """连接池中的一个连接，携带该连接自己的分帧解码器"""
+
+    __slots__ = ('key', 'sock', 'decoder', 'last_used', 'reused')
+
+    def __init__(self, key, sock):
+        self.key = key
+        self.sock = sock
+        # 响应与请求使用相同的分帧方式，按首字节识别
+        self.decoder = StreamDecoder(FRAMING_AUTO)
+        self.last_used = time.monotonic()
+        self.reused = False
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class ConnectionPool:
+    """
+    按 (host, port) 复用的客户端连接池
+
+    空闲连接按后进先出取出，超过 idle_timeout 未使用的连接会被关闭；
+    每次取出前做一次非阻塞健康检查，对端已关闭或残留未读数据的连接直接丢弃。
+    """
+
+    def __init__(self, max_per_host=4, idle_timeout=60, timeout=5):
+        """
+        初始化连接池
+
+        Args:
+            max_per_host: 每个目标地址同时存在的最大连接数
+            idle_timeout: 空闲连接的最长保留时间(秒)
+            timeout: 建立连接、收发数据以及等待可用连接的超时时间(秒)
+        """
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = {}
+        self._active = {}
+        self._cond = threading.Condition()
+
+    def acquire(self, host, port):
+        """
+        取出一个到目标地址的连接，没有可复用的连接时新建
+
+        Args:
+            host: 目标主机地址
+            port: 目标主机端口
+
+        Returns:
+            PooledConnection: 可用连接，使用完毕后必须调用 release 归还
+
+        Raises:
+            PoolTimeout: 该地址的连接数已达上限且等待超时
+            OSError: 建立连接失败
+        """
+        key = (host, port)
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                self._evict_expired(key)
+                idle = self._idle.get(key)
+                while idle:
+                    conn = idle.pop()
+                    if self._is_healthy(conn):
+                        conn.reused = True
+                        return conn
+                    conn.close()
+                    self._active[key] -= 1
+
+                if self._active.get(key, 0) < self.max_per_host:
+                    self._active[key] = self._active.get(key, 0) + 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"等待到 {host}:{port} 的可用连接超时")
+                self._cond.wait(remaining)
+
+        # 建立连接时不持有锁，避免阻塞其他目标地址
+        try:
+            sock = socket.create_connection(key, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except Exception:
+            with self._cond:
+                self._active[key] -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(key, sock)
+
+    def release(self, conn, reuse=True):
+        """
+        归还连接
+
+        Args:
+            conn: acquire 取出的连接
+            reuse: 是否放回池中复用，出错的连接应传 False
+        """
+        with self._cond:
+            if reuse and conn.decoder.pending == 0:
+                conn.last_used = time.monotonic()
+                self._idle.setdefault(conn.key, []).append(conn)
+            else:
+                conn.close()
+                self._active[conn.key] -= 1
+            self._cond.notify()
+
+    def evict_idle(self):
+        """关闭所有超过空闲时间的连接"""
+        with self._cond:
+            for key in list(self._idle):
+                self._evict_expired(key)
+
+    def close_all(self):
+        """关闭所有空闲连接，正在使用的连接归还时按正常流程处理"""
+        with self._cond:
+            for key, idle in self._idle.items():
+                for conn in idle:
+                    conn.close()
+                self._active[key] -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        返回连接池状态
+
+        Returns:
+            dict: 每个目标地址的活动连接数和空闲连接数
+        """
+        with self._cond:
+            return {
+                f"{host}:{port}": {
+                    'active': count,
+                    'idle': len(self._idle.get((host, port), ()))
+                }
+                for (host, port), count in self._active.items() if count
+            }
+
+    def _evict_expired(self, key):
+        idle = self._idle.get(key)
+        if not idle:
+            return
+        expire_before = time.monotonic() - self.idle_timeout
+        # 空闲列表按归还时间排序，过期的连接都在前部
+        expired = 0
+        while expired < len(idle) and idle[expired].last_used < expire_before:
+            idle[expired].close()
+            expired += 1
+        if expired:
+            del idle[:expired]
+            self._active[key] -= expired
+
+    @staticmethod
+    def _is_healthy(conn):
+        """空闲连接不应可读：可读意味着对端已关闭或发来了不属于任何请求的数据"""
+        try:
+            if hasattr(select, 'poll'):
+                poller = select.poll()
+                poller.register(conn.sock, select.POLLIN)
+                return not poller.poll(0)
+            readable, _, _ = select.select([conn.sock], [], [], 0)
+            return not readable
+        except (OSError, ValueError):
+            return False
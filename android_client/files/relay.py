@@ -0,0 +1,387 @@
+import argparse
+import threading
+import time
+from collections import deque
+
+from metrics import NULL_REGISTRY
+from outbox import Outbox, is_delivered, new_message_id
+
+# 转发的消息类型，停止警报等命令也要传到下游设备
+RELAY_TYPES = ('alert', 'command')
+
+# 转发线程数，决定同时进行的发送数；不可达的设备最多占用一个线程直到连接超时
+DEFAULT_WORKERS = 32
+
+# 消息最多被转发的次数，默认只转发直接收到的消息，多个中继互相列为下游时不会循环转发
+DEFAULT_MAX_HOPS = 1
+
+# 不转发的字段：来源和接收时间由下游设备按自己收到的连接重新填写
+_RELAY_EXCLUDED = ('source', 'received_at')
+
+# 转发失败的消息交给重试队列，超过此时长(秒)仍未送达时放弃，过时的警报不再补发
+RETRY_MAX_AGE = 600
+# 重试队列的数据库文件名，保存在数据目录中
+OUTBOX_FILE = 'relay_outbox.db'
+
+
+def parse_peer(peer, default_port=8888):
+    """
+    解析下游设备地址
+
+    Args:
+        peer: "host:port"、"host" 或 (host, port)
+        default_port: 未指定端口时使用的端口
+
+    Returns:
+        tuple: (host, port)
+
+    Raises:
+        ValueError: 端口不是整数
+    """
+    if isinstance(peer, (tuple, list)):
+        host, port = peer
+        return host, int(port)
+    host, sep, port = peer.rpartition(':')
+    if not sep:
+        return peer, default_port
+    return host, int(port)
+
+
+class _Fanout:
+    """一条消息的一次转发，收集每个下游设备的结果"""
+
+    __slots__ = ('message', 'peers', 'results', 'started', 'remaining', 'done')
+
+    def __init__(self, message, peers):
+        self.message = message
+        self.peers = peers
+        self.results = {}
+        self.started = time.perf_counter()
+        self.remaining = len(peers)
+        self.done = threading.Event()
+
+    def report(self):
+        delivered = sum(1 for result in self.results.values() if result['status'] == 'ok')
+        queued = sum(1 for result in self.results.values() if result['status'] == 'queued')
+        finished = len(self.results)
+        return {
+            'id': self.message.get('id'),
+            'peers': len(self.peers),
+            'delivered': delivered,
+            'queued': queued,
+            'failed': finished - delivered - queued,
+            'pending': len(self.peers) - finished,
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'results': dict(self.results),
+        }
+
+
+class FanoutRelay:
+    """
+    把收到的警报转发给一组下游设备
+
+    一条消息发往每个下游设备是一个独立的发送任务，由固定数量的转发线程并发执行，
+    发送函数通常是 NetworkManager.send_message，同一设备的后续消息复用连接池中的连接。
+    转发全部设备的耗时约为一次往返，不可达的设备只占用一个转发线程直到连接超时，
+    不会拖慢其他设备。每条消息转发完成后生成一份按设备列出结果的报告。
+
+    转发的消息保留原消息ID(没有时分配一个)，下游设备据此去重，并带上 relay_hops 计数。
+    设置了重试队列(outbox.Outbox)时，发送失败的设备改由重试队列按指数退避补发，应用重启后继续。
+    """
+
+    def __init__(self, send, peers=(), max_workers=DEFAULT_WORKERS, max_hops=DEFAULT_MAX_HOPS,
+                 report_callback=None, metrics=None, outbox=None):
+        """
+        初始化转发器
+
+        Args:
+            send: 发送函数 send(host, port, message)，返回响应字典，如 NetworkManager.send_message
+            peers: 下游设备地址列表，元素为 "host:port" 或 (host, port)
+            max_workers: 转发线程数
+            max_hops: 消息最多被转发的次数
+            report_callback: 每条消息转发完成后的回调，参数为转发报告字典，在转发线程中调用
+            metrics: 指标注册表，默认不统计
+            outbox: 重试队列(outbox.Outbox)，由调用方启动和停止；为 None 时发送失败只记入报告
+        """
+        self.send_function = send
+        self.outbox = outbox
+        self.peers = [parse_peer(peer) for peer in peers]
+        self.max_workers = max_workers
+        self.max_hops = max_hops
+        self.report_callback = report_callback
+        self._tasks = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._workers = []
+
+        self.metrics = metrics if metrics is not None else NULL_REGISTRY
+        self._relayed = self.metrics.counter('relay.messages')
+        self._delivered = self.metrics.counter('relay.delivered')
+        self._failed = self.metrics.counter('relay.failed')
+        self._queued = self.metrics.counter('relay.queued')
+        self._fanout_time = self.metrics.histogram('relay.fanout_ms')
+        self._peer_time = self.metrics.histogram('relay.peer_ms')
+        self.metrics.gauge('relay', self.stats)
+
+    def start(self):
+        """启动转发线程"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._workers = [threading.Thread(target=self._work) for _ in range(self.max_workers)]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+
+    def stop(self):
+        """停止转发线程，尚未开始的发送任务被丢弃"""
+        with self._cond:
+            self._running = False
+            self._tasks.clear()
+            self._cond.notify_all()
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join(timeout=10)
+        self._workers = []
+
+    def set_peers(self, peers):
+        """
+        更换下游设备列表，对之后转发的消息生效
+
+        Args:
+            peers: 下游设备地址列表
+        """
+        self.peers = [parse_peer(peer) for peer in peers]
+
+    def should_relay(self, message):
+        """
+        检查消息是否需要转发
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            bool: 有下游设备、消息类型需要转发且转发次数未达上限时返回True
+        """
+        return (bool(self.peers) and message.get('type') in RELAY_TYPES
+                and message.get('relay_hops', 0) < self.max_hops)
+
+    def submit(self, message):
+        """
+        把消息转发给所有下游设备，立即返回，结果通过 report_callback 报告
+
+        Args:
+            message: 收到的消息字典
+
+        Returns:
+            _Fanout: 本次转发，全部设备完成后其 done 事件被设置；转发器未启动或没有下游设备时为 None
+        """
+        peers = list(self.peers)
+        if not peers or not self._running:
+            return None
+        outgoing = {key: value for key, value in message.items() if key not in _RELAY_EXCLUDED}
+        outgoing.setdefault('id', new_message_id())
+        outgoing['relay_hops'] = message.get('relay_hops', 0) + 1
+        fanout = _Fanout(outgoing, peers)
+        self._relayed.inc()
+        with self._cond:
+            self._tasks.extend((fanout, peer) for peer in peers)
+            self._cond.notify_all()
+        return fanout
+
+    def relay(self, message, timeout=None):
+        """
+        把消息转发给所有下游设备并等待结果
+
+        Args:
+            message: 收到的消息字典
+            timeout: 最长等待时间(秒)，超时后未完成的设备在报告中计为 pending
+
+        Returns:
+            dict: 转发报告，包括设备数、成功数、失败数、未完成数、耗时和每个设备的结果
+        """
+        fanout = self.submit(message)
+        if fanout is None:
+            return _Fanout(message, []).report()
+        fanout.done.wait(timeout)
+        return fanout.report()
+
+    def stats(self):
+        """
+        返回转发状态
+
+        Returns:
+            dict: 下游设备数、转发线程数和等待发送的任务数
+        """
+        with self._cond:
+            queued = len(self._tasks)
+        return {'peers': len(self.peers), 'workers': len(self._workers), 'queued': queued}
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running and not self._tasks:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                fanout, peer = self._tasks.popleft()
+            self._send(fanout, peer)
+
+    def _send(self, fanout, peer):
+        host, port = peer
+        started = self._peer_time.start()
+        before = time.perf_counter()
+        try:
+            response = self.send_function(host, port, fanout.message)
+        except Exception as e:
+            response = {'status': 'error', 'message': str(e)}
+        self._peer_time.stop(started)
+        result = {'status': 'ok', 'ms': round((time.perf_counter() - before) * 1000, 3)}
+        if is_delivered(response, fanout.message['id']):
+            self._delivered.inc()
+        else:
+            self._failed.inc()
+            result['status'] = 'error'
+            result['message'] = response.get('message') if isinstance(response, dict) else str(response)
+            if self.outbox is not None:
+                try:
+                    # 每个设备一个队列键，消息ID不变，下游设备收到重试的消息时按ID去重
+                    self.outbox.send(host, port, fanout.message, key=f"{fanout.message['id']}@{host}:{port}")
+                    self._queued.inc()
+                    result['status'] = 'queued'
+                except Exception as e:
+                    result['message'] += f"；无法加入重试队列: {str(e)}"
+
+        with self._cond:
+            fanout.results[f"{host}:{port}"] = result
+            fanout.remaining -= 1
+            finished = fanout.remaining == 0
+        if not finished:
+            return
+        self._fanout_time.observe((time.perf_counter() - fanout.started) * 1000)
+        fanout.done.set()
+        if self.report_callback:
+            try:
+                self.report_callback(fanout.report())
+            except Exception:
+                pass
+
+
+def format_report(report, max_failures=5):
+    """
+    把转发报告格式化为一行日志
+
+    Args:
+        report: FanoutRelay 生成的转发报告
+        max_failures: 最多列出的失败设备数
+
+    Returns:
+        str: 日志文本
+    """
+    text = f"转发到 {report['peers']} 个设备: 成功 {report['delivered']}，失败 {report['failed']}，"
+    if report.get('queued'):
+        text += f"待重试 {report['queued']}，"
+    text += f"耗时 {report['elapsed_ms']:.1f} ms"
+    failures = [peer for peer, result in report['results'].items() if result['status'] != 'ok']
+    if failures:
+        shown = ', '.join(failures[:max_failures])
+        more = f" 等 {len(failures)} 个" if len(failures) > max_failures else ""
+        text += f" (未送达: {shown}{more})"
+    return text
+
+
+def open_outbox(path, send, log=print):
+    """
+    打开转发失败消息的重试队列，未送达的消息在启动后继续补发
+
+    Args:
+        path: 数据库文件路径
+        send: 发送函数，与转发器相同
+        log: 日志函数，记录超过 RETRY_MAX_AGE 仍未送达而放弃的消息
+
+    Returns:
+        Outbox: 尚未启动的重试队列
+    """
+    def finished(key, response):
+        if response is None:
+            log(f"转发消息 {key} 超过 {RETRY_MAX_AGE} 秒仍未送达，已放弃")
+
+    return Outbox(path, send, max_age=RETRY_MAX_AGE, result_callback=finished)
+
+
+class RelayHandler:
+    """
+    只转发、不发出警报的处理器，用于无界面运行的中继设备
+
+    提供 AlertTransport 需要的 handle_message、handle_batch 和 preempt。
+    """
+
+    def __init__(self, relay, log=print):
+        """
+        初始化处理器
+
+        Args:
+            relay: FanoutRelay 实例
+            log: 日志函数
+        """
+        self.relay = relay
+        self.log = log
+        if relay.report_callback is None:
+            relay.report_callback = lambda report: self.log(format_report(report))
+
+    def handle_message(self, message):
+        if self.relay.should_relay(message):
+            self.relay.submit(message)
+        elif message.get('type') in ('connection', 'disconnection', 'error', 'info'):
+            self.log(message.get('message', '系统消息'))
+
+    def handle_batch(self, messages):
+        for message in messages:
+            self.handle_message(message)
+        return [{'status': 'ok'}] * len(messages)
+
+    def preempt(self, priority):
+        pass
+
+
+def main():
+    from network import AlertTransport, NetworkManager
+
+    parser = argparse.ArgumentParser(description='警报中继：接收警报并转发给一组下游设备')
+    parser.add_argument('peers', nargs='+', help='下游设备地址 host:port')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=8888, help='监听端口')
+    parser.add_argument('--engine', default='selectors', help='传输引擎')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='转发线程数')
+    parser.add_argument('--outbox', default=OUTBOX_FILE, help='转发失败消息的重试队列数据库，空字符串表示不重试')
+    args = parser.parse_args()
+
+    send = NetworkManager().send_message
+    outbox = open_outbox(args.outbox, send) if args.outbox else None
+    relay = FanoutRelay(send, args.peers, max_workers=args.workers, outbox=outbox)
+    transport = AlertTransport(RelayHandler(relay), engine=args.engine)
+    relay.start()
+    if outbox is not None:
+        outbox.start()
+    if not transport.start(args.host, args.port):
+        relay.stop()
+        if outbox is not None:
+            outbox.stop()
+        transport.close()
+        raise SystemExit(1)
+    print(f"中继已启动 {args.host}:{args.port}，下游设备 {len(relay.peers)} 个")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        transport.close()
+        relay.stop()
+        if outbox is not None:
+            outbox.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,193 +1,464 @@
-from kivy.utils import platform
-from kivy.clock import Clock
+import json
 import threading
-import time
+
+from android_bridge import ON_ANDROID, get_bridge
+from audio import DEFAULT_SOUND, LEVEL_SOUNDS, AudioRegistry
+from commands import CommandRegistry, command
+from dedup import AlertDeduplicator
+from dispatch_queue import LEVEL_PRIORITY, DEFAULT_COMMAND_PRIORITY, message_priority
+from effects import CHANNEL_SOUND, CHANNEL_VIBRATE, EffectsBackend, EffectsScheduler, pulse_pattern
+from messages import LEVEL_CRITICAL, CommandMessage, Message, MessageError, parse_message
+from metrics import NULL_REGISTRY
+from relay import format_report
+
+# 各警报级别的硬件响应: 声音(持续秒数, 次数)、震动(持续秒数, 次数)、闪烁(颜色, 次数)
+ALERT_EFFECTS = {
+    'critical': {'sound': (3, 3), 'vibrate': (1, 3), 'flash': ([1, 0, 0, 1], 5)},   # 红色闪烁
+    'warning': {'sound': (1, 2), 'vibrate': (0.5, 2), 'flash': ([1, 0.5, 0, 1], 3)},  # 橙色闪烁
+    'info': {'sound': (0.5, 1), 'flash': ([0, 0, 1, 1], 2)},                        # 蓝色闪烁
+}
+
+# 写入警报日志的消息类型
+JOURNAL_TYPES = ('alert', 'command')
+
+# 直接记录日志的系统消息类型
+SYSTEM_TYPES = ('connection', 'disconnection', 'error', 'info')
+
+# 受更高级别警报响应抑制的硬件命令
+HARDWARE_COMMANDS = ('beep', 'vibrate')
+
+# 日志中消息摘要的最大字符数，原始数据和未知消息不再整条写入日志
+LOG_SUMMARY_LENGTH = 120
+
+# 重复播放声音、重复震动之间的间隔(秒)
+SOUND_GAP = 0.5
+VIBRATE_GAP = 0.2
+
+# 没有对应音频文件时，各警报音使用的 ToneGenerator 音调
+ASSET_TONES = {
+    LEVEL_SOUNDS['critical']: 'TONE_CDMA_ALERT_CALL_GUARD',
+    LEVEL_SOUNDS['warning']: 'TONE_CDMA_ALERT_NETWORK_LITE',
+    LEVEL_SOUNDS['info']: 'TONE_PROP_BEEP',
+}
+DEFAULT_TONE = 'TONE_CDMA_ALERT_CALL_GUARD'
+TONE_GENERATOR_CLASS = 'android.media.ToneGenerator'
+
+# 非安卓平台上找不到警报音时使用的音频文件
+FALLBACK_SOUND_FILE = 'alert.wav'
+
+def summarize(message, limit=LOG_SUMMARY_LENGTH):
+    """
+    把消息压缩为一行日志摘要，省略来源信息，超长时截断
+    
+    Args:
+        message: 消息字典
+        limit: 最大字符数
+        
+    Returns:
+        str: 摘要文本
+    """
+    text = json.dumps({key: value for key, value in message.items() if key not in ('source', 'received_at')},
+                      ensure_ascii=False, default=str)
+    return text if len(text) <= limit else text[:limit] + '...'
+
+class ToneEffectsBackend(EffectsBackend):
+    """
+    通过音频文件或Android API发声和震动的效果后端
+    
+    有对应音频文件的警报音通过音频资源注册表播放；安卓平台上没有音频文件时
+    使用 ToneGenerator 按警报音选择音调。ToneGenerator 在第一次使用时创建，
+    之后一直复用；Java类和震动服务由 Android 桥接对象缓存。
+    """
+    
+    def __init__(self, log=None, audio=None, bridge=None):
+        """
+        初始化效果后端
+        
+        Args:
+            log: 日志函数
+            audio: 音频资源注册表，默认查找 data/audio 目录
+            bridge: Android 桥接对象，默认使用进程内共享的桥接对象
+        """
+        self.log = log or (lambda message: None)
+        self.audio = audio if audio is not None else AudioRegistry()
+        self.bridge = bridge if bridge is not None else get_bridge()
+        self._tone_generator = None
+    
+    def sound(self, on, duration=0, asset=None):
+        asset = asset or DEFAULT_SOUND
+        if not on:
+            self.audio.stop()
+            if ON_ANDROID:
+                self._get_tone_generator().stopTone()
+            return
+        if self.audio.play(asset):
+            return
+        if ON_ANDROID:
+            tone_generator = self._get_tone_generator()
+            tone = getattr(self.bridge.autoclass(TONE_GENERATOR_CLASS), ASSET_TONES.get(asset, DEFAULT_TONE))
+            tone_generator.startTone(tone, int(duration * 1000))
+        elif not self.audio.play(FALLBACK_SOUND_FILE):
+            # 非安卓平台，需要提供一个警报音频文件
+            self.log("播放声音失败: 未找到音频文件或不支持的平台")
+    
+    def preload(self):
+        """预先解码警报音并创建 ToneGenerator，第一次警报时不必再加载"""
+        self.audio.preload()
+        if ON_ANDROID:
+            self._get_tone_generator()
+    
+    def vibrate(self, on, duration=0):
+        if not ON_ANDROID:
+            return
+        vibrator = self._get_vibrator()
+        if on:
+            vibrator.vibrate(int(duration * 1000))
+        else:
+            vibrator.cancel()
+    
+    def _get_tone_generator(self):
+        if self._tone_generator is None:
+            ToneGenerator = self.bridge.autoclass(TONE_GENERATOR_CLASS)
+            AudioManager = self.bridge.autoclass('android.media.AudioManager')
+            self._tone_generator = ToneGenerator(AudioManager.STREAM_ALARM, 100)
+        return self._tone_generator
+    
+    def _get_vibrator(self):
+        # 请求震动权限，只在第一次震动时申请
+        self.bridge.request_permissions(['VIBRATE'])
+        return self.bridge.vibrator
 
 class ResponseHandler:
-    def __init__(self, log_callback=None):
+    def __init__(self, log_callback=None, deduplicator=None, effects=None, audio=None, metrics=None,
+                 journal=None, relay=None):
         """
         初始化响应处理器
         
         Args:
             log_callback: 日志回调函数
+            deduplicator: 警报去重器，默认按来源、级别和内容去重
+            effects: 硬件效果调度器，默认创建一个使用 ToneEffectsBackend 的调度器
+            audio: 默认效果后端使用的音频资源注册表
+            metrics: 指标注册表，默认不统计
+            journal: 警报日志(journal.AlertJournal)，收到的警报和命令写入其中，默认不保存
+            relay: 转发器(relay.FanoutRelay)，收到的警报和命令同时转发给下游设备，默认不转发
         """
         self.log_callback = log_callback
+        self.journal = journal
+        self.relay = relay
+        if relay is not None and relay.report_callback is None:
+            relay.report_callback = lambda report: self.log(format_report(report))
+        self.deduplicator = deduplicator if deduplicator is not None else AlertDeduplicator()
+        # 批量处理时按线程收集日志，批次结束后一次性输出
+        self._batch_state = threading.local()
+        # 声音和震动由效果调度器按优先级驱动
+        if effects is None:
+            effects = EffectsScheduler(ToneEffectsBackend(self.log, audio))
+            effects.start()
+        self.effects = effects
+        
+        self.metrics = metrics if metrics is not None else NULL_REGISTRY
+        self._messages = self.metrics.counter('handler.messages')
+        self._invalid = self.metrics.counter('handler.invalid')
+        self._unknown = self.metrics.counter('handler.unknown')
+        self._duplicates = self.metrics.counter('handler.duplicates')
+        self._errors = self.metrics.counter('handler.errors')
+        self._message_time = self.metrics.histogram('handler.message_ms')
+        self._batch_time = self.metrics.histogram('handler.batch_ms')
+        self.metrics.gauge('effects', self.effects.stats)
+        self.metrics.gauge('dedup', self.deduplicator.stats)
+        if journal is not None:
+            self.metrics.gauge('journal', journal.stats)
+        
+        # 消息类型的处理函数表，子类覆盖的 handle_alert/handle_command 同样生效
+        self._handlers = {'alert': self.handle_alert, 'command': self.handle_command}
+        self._handlers.update((msg_type, self.handle_system) for msg_type in SYSTEM_TYPES)
+        # 命令表，注册本类和子类中用 command 装饰的方法；应用可向同一个命令表注册自己的实现
+        self.commands = CommandRegistry(log=lambda line: self.log(line), metrics=self.metrics)
+        self.commands.register_object(self)
+    
+    def preload_audio(self):
+        """预先解码警报音，应用启动后调用可缩短第一次警报的发声耗时"""
+        preload = getattr(self.effects.backend, 'preload', None)
+        if preload:
+            preload()
     
     def handle_message(self, message):
         """
         处理接收到的消息
         
         Args:
-            message: 接收到的消息字典
+            message: 消息对象(messages.Message)或消息字典；alert/command 字典先转换为消息对象
+            
+        Raises:
+            MessageError: alert/command 消息的字段不合法
         """
-        if not isinstance(message, dict):
+        if isinstance(message, dict):
+            try:
+                message = parse_message(message)
+            except MessageError:
+                self._invalid.inc()
+                raise
+        elif not isinstance(message, Message):
+            self._invalid.inc()
             self.log("收到无效消息格式")
             return
         
-        # 根据消息类型分发处理
-        msg_type = message.get('type')
+        started = self._message_time.start()
+        self._messages.inc()
+        msg_type = message.type if isinstance(message, Message) else message.get('type')
+        if self.journal is not None and msg_type in JOURNAL_TYPES:
+            # 只放入待写列表，由警报日志的写入线程批量提交
+            self.journal.record(message)
+        if self.relay is not None and self.relay.should_relay(message):
+            # 先交给转发线程，下游设备与本机同时响应
+            self.relay.submit(message)
         
-        if msg_type == 'alert':
-            self.handle_alert(message)
-        elif msg_type == 'command':
-            self.handle_command(message)
-        elif msg_type in ['connection', 'disconnection', 'error', 'info']:
-            # 系统消息直接记录日志
-            self.log(message.get('message', '系统消息'))
-        else:
-            # 未知消息类型
-            source = message.get('source', {})
-            source_ip = source.get('ip', 'unknown')
-            self.log(f"收到来自 {source_ip} 的未知类型消息: {message}")
+        try:
+            # 按消息类型查表分发
+            handler = self._handlers.get(msg_type)
+            if handler is not None:
+                handler(message)
+            else:
+                # 未知消息类型
+                self._unknown.inc()
+                source = message.get('source') or {}
+                source_ip = source.get('ip', 'unknown')
+                self.log(f"收到来自 {source_ip} 的未知类型消息: {summarize(message)}")
+        finally:
+            self._message_time.stop(started)
+    
+    def handle_system(self, message):
+        """
+        处理连接、断开、错误等系统消息，直接记录日志
+        
+        Args:
+            message: 系统消息字典
+        """
+        self.log(message.get('message', '系统消息'))
+    
+    def handle_batch(self, messages):
+        """
+        批量处理一次接收到的消息
+        
+        批次内的日志合并为一次UI更新；批次内的多条警报只对优先级最高的
+        一条(同级时取最后一条)执行一次响应，见 raise_alert。
+        
+        Args:
+            messages: 消息字典列表
+            
+        Returns:
+            list: 与消息一一对应的处理结果字典
+        """
+        started = self._batch_time.start()
+        state = self._batch_state
+        state.lines = []
+        state.alerts = []
+        results = []
+        try:
+            for message in messages:
+                try:
+                    self.handle_message(message)
+                    results.append({'status': 'ok'})
+                except Exception as e:
+                    self._errors.inc()
+                    self.log(f"处理消息出错: {str(e)}")
+                    results.append({'status': 'error', 'message': str(e)})
+            
+            alerts, state.alerts = state.alerts, None
+            if alerts:
+                # 消息已按优先级排序，同级时后到的警报参数覆盖先到的
+                top = min(message_priority(alert) for alert in alerts)
+                self.raise_alert([alert for alert in alerts if message_priority(alert) == top][-1])
+        finally:
+            lines, state.lines = state.lines, None
+            state.alerts = None
+        
+        if lines:
+            self._emit_log('\n'.join(lines))
+        self._batch_time.stop(started)
+        return results
     
     def handle_alert(self, message):
         """
         处理警报消息
         
         Args:
-            message: 警报消息字典
+            message: 警报消息(messages.AlertMessage)
         """
-        content = message.get('content', '未指定内容')
-        level = message.get('level', 'info')
-        source = message.get('source', {})
-        source_ip = source.get('ip', 'unknown')
+        content = message.content if message.content is not None else '未指定内容'
+        level = message.level
+        source_ip = message.source_ip
+        
+        # 抑制窗口内的重复警报只记录次数，不再触发硬件响应
+        is_new, repeat_count = self.deduplicator.check(message)
+        if not is_new:
+            self._duplicates.inc()
+            self.log(f"重复警报 [{level}] 来自 {source_ip}: {content} (重复 {repeat_count} 次，已抑制)")
+            return
         
         # 记录警报日志
         self.log(f"警报 [{level}] 来自 {source_ip}: {content}")
         
-        # 根据警报级别执行不同响应
-        if level == 'critical':
-            # 关键警报：声音+震动+闪光
-            self.play_sound(duration=3, repeat=3)
-            self.vibrate(duration=1, repeat=3)
-            self.flash_screen(color=[1, 0, 0, 1], count=5)  # 红色闪烁
-        elif level == 'warning':
-            # 警告：声音+震动
-            self.play_sound(duration=1, repeat=2)
-            self.vibrate(duration=0.5, repeat=2)
-            self.flash_screen(color=[1, 0.5, 0, 1], count=3)  # 橙色闪烁
-        elif level == 'info':
-            # 信息：声音
-            self.play_sound(duration=0.5)
-            self.flash_screen(color=[0, 0, 1, 1], count=2)  # 蓝色闪烁
+        alerts = getattr(self._batch_state, 'alerts', None)
+        if alerts is not None:
+            # 批量处理中，警报响应在批次结束时统一执行
+            alerts.append(message)
+        else:
+            self.raise_alert(message)
     
-    def handle_command(self, message):
+    def raise_alert(self, message):
+        """
+        对一条警报执行响应，默认按警报级别执行声音/震动/闪烁
+        
+        Args:
+            message: 警报消息(messages.AlertMessage)
         """
-        处理命令消息
+        self.alert_effects(message.level)
+    
+    def discard_pending_alerts(self):
+        """丢弃本批次中尚未执行响应的警报，如同一批中随后收到了停止警报的命令"""
+        alerts = getattr(self._batch_state, 'alerts', None)
+        if alerts:
+            alerts.clear()
+    
+    def alert_effects(self, level):
+        """
+        按警报级别执行声音/震动/闪烁响应
+        
+        更高级别的警报会中断正在执行的低级别响应；
+        更高级别的响应尚未结束时，低级别警报不再触发硬件响应。
         
         Args:
-            message: 命令消息字典
-        """
-        command = message.get('command')
-        params = message.get('params', {})
-        source = message.get('source', {})
-        source_ip = source.get('ip', 'unknown')
-        
-        self.log(f"执行命令 '{command}' 来自 {source_ip}, 参数: {params}")
-        
-        # 根据命令类型执行不同操作
-        if command == 'beep':
-            duration = params.get('duration', 1)
-            repeat = params.get('repeat', 1)
-            self.play_sound(duration=duration, repeat=repeat)
-        elif command == 'vibrate':
-            duration = params.get('duration', 1)
-            repeat = params.get('repeat', 1)
-            self.vibrate(duration=duration, repeat=repeat)
-        elif command == 'flash':
-            count = params.get('count', 3)
-            color = params.get('color', [1, 0, 0, 1])  # 默认红色
+            level: 警报级别
+        """
+        effects = ALERT_EFFECTS.get(level)
+        if not effects:
+            return
+        
+        priority = LEVEL_PRIORITY[level]
+        if self._outranked(priority):
+            self.log(f"更高级别的警报响应正在进行，[{level}] 警报仅记录")
+            return
+        self.effects.preempt(priority)
+        
+        if 'sound' in effects:
+            duration, repeat = effects['sound']
+            self.play_sound(duration=duration, repeat=repeat, priority=priority, level=level)
+        if 'vibrate' in effects:
+            duration, repeat = effects['vibrate']
+            self.vibrate(duration=duration, repeat=repeat, priority=priority)
+        if 'flash' in effects:
+            color, count = effects['flash']
             self.flash_screen(color=color, count=count)
-        elif command == 'display':
-            text = params.get('text', '')
-            duration = params.get('duration', 5)
-            self.display_message(text, duration)
+    
+    def preempt(self, priority):
+        """
+        中断比指定优先级低的硬件响应，由分发队列在更高优先级消息入队时调用
+        
+        Args:
+            priority: 新消息的优先级
+        """
+        if any(running > priority for running in self.effects.active().values()):
+            self.effects.preempt(priority)
+            self.log("收到更高级别的消息，已中断正在执行的低级别响应")
+    
+    def _outranked(self, priority):
+        return any(running < priority for running in self.effects.active().values())
+    
+    def handle_command(self, message):
+        """
+        处理命令消息，按命令名在命令表中查找并执行
+        
+        Args:
+            message: 命令消息(messages.CommandMessage)，内置命令的参数类型已在解析时校验
+            
+        Raises:
+            CommandError: 参数与命令注册的类型表不符、执行出错或超时
+        """
+        command_name = message.command
+        params = message.params or {}
+        
+        self.log(f"执行命令 '{command_name}' 来自 {message.source_ip}, 参数: {params}")
+        
+        if command_name not in self.commands:
+            self.log(f"未知命令: {command_name}")
+        elif command_name in HARDWARE_COMMANDS and self._outranked(DEFAULT_COMMAND_PRIORITY):
+            self.log(f"更高级别的警报响应正在进行，忽略命令 '{command_name}'")
         else:
-            self.log(f"未知命令: {command}")
+            self.commands.execute(command_name, params, message)
+    
+    @command('beep')
+    def _command_beep(self, params, message=None):
+        self.play_sound(duration=params.get('duration', 1), repeat=params.get('repeat', 1))
+    
+    @command('vibrate')
+    def _command_vibrate(self, params, message=None):
+        self.vibrate(duration=params.get('duration', 1), repeat=params.get('repeat', 1))
+    
+    @command('flash')
+    def _command_flash(self, params, message=None):
+        # 默认红色
+        self.flash_screen(color=params.get('color', [1, 0, 0, 1]), count=params.get('count', 3))
+    
+    @command('display')
+    def _command_display(self, params, message=None):
+        self.display_message(params.get('text', ''), params.get('duration', 5))
+    
+    @command('alert')
+    def _command_alert(self, params, message=None):
+        # 综合警报按关键级别记录，与警报消息一样去重并在批次结束时启动
+        if message is None:
+            message = CommandMessage('alert', params=params)
+        self.handle_alert(message.as_alert(LEVEL_CRITICAL, params.get('message', '综合警报')))
     
-    def play_sound(self, duration=1, repeat=1):
+    @command('stop_alert')
+    def _command_stop_alert(self, params, message=None):
+        # 同一批中先到的警报不再启动
+        self.discard_pending_alerts()
+        self.log("接收到停止警报命令")
+        self.stop_alert()
+    
+    def stop_alert(self):
+        """停止正在进行的警报响应，子类可替换为停止应用或服务的综合警报"""
+        self.effects.cancel()
+    
+    def play_sound(self, duration=1, repeat=1, priority=DEFAULT_COMMAND_PRIORITY, level=None):
         """
-        播放警报声音
+        播放警报声音，由效果调度器在后台按节拍执行
         
         Args:
             duration: 声音持续时间(秒)
             repeat: 重复次数
+            priority: 优先级，被更高优先级的响应中断时立即停止
+            level: 警报级别，用于选择该级别的警报音
+            
+        Returns:
+            bool: 是否开始播放
         """
         self.log(f"播放警报声音，持续 {duration} 秒，重复 {repeat} 次")
-        
-        # 在安卓平台上使用Android API播放声音
-        if platform == 'android':
-            try:
-                from jnius import autoclass
-                # 获取Android ToneGenerator类
-                ToneGenerator = autoclass('android.media.ToneGenerator')
-                AudioManager = autoclass('android.media.AudioManager')
-                
-                # 创建ToneGenerator实例
-                toneGenerator = ToneGenerator(AudioManager.STREAM_ALARM, 100)
-                
-                # 在后台线程中播放声音
-                def play_tone():
-                    for _ in range(repeat):
-                        # 播放警报音
-                        toneGenerator.startTone(ToneGenerator.TONE_CDMA_ALERT_CALL_GUARD, int(duration * 1000))
-                        time.sleep(duration)
-                        if repeat > 1:
-                            time.sleep(0.5)  # 间隔
-                    toneGenerator.release()
-                
-                threading.Thread(target=play_tone).start()
-            except Exception as e:
-                self.log(f"播放声音失败: {str(e)}")
-        else:
-            # 非安卓平台，可以使用Kivy的音频功能
-            try:
-                from kivy.core.audio import SoundLoader
-                sound = SoundLoader.load('alert.wav')  # 需要提供一个警报音频文件
-                if sound:
-                    sound.volume = 1
-                    sound.play()
-            except:
-                self.log("播放声音失败: 未找到音频文件或不支持的平台")
+        steps = pulse_pattern(duration, SOUND_GAP if repeat > 1 else 0)
+        return self.effects.play(CHANNEL_SOUND, steps, repeat=repeat, priority=priority,
+                                 asset=LEVEL_SOUNDS.get(level, DEFAULT_SOUND))
     
-    def vibrate(self, duration=1, repeat=1):
+    def vibrate(self, duration=1, repeat=1, priority=DEFAULT_COMMAND_PRIORITY):
         """
-        设备震动
+        设备震动，由效果调度器在后台按节拍执行
         
         Args:
             duration: 震动持续时间(秒)
             repeat: 重复次数
+            priority: 优先级，被更高优先级的响应中断时立即停止
+            
+        Returns:
+            bool: 是否开始震动
         """
         self.log(f"设备震动，持续 {duration} 秒，重复 {repeat} 次")
-        
-        # 在安卓平台上使用Android API控制震动
-        if platform == 'android':
-            try:
-                from jnius import autoclass
-                from android.permissions import request_permissions, Permission
-                
-                # 请求震动权限
-                request_permissions([Permission.VIBRATE])
-                
-                # 获取Android Vibrator服务
-                PythonActivity = autoclass('org.kivy.android.PythonActivity')
-                activity = PythonActivity.mActivity
-                Context = autoclass('android.content.Context')
-                vibrator = activity.getSystemService(Context.VIBRATOR_SERVICE)
-                
-                # 在后台线程中控制震动
-                def vibrate_device():
-                    for _ in range(repeat):
-                        vibrator.vibrate(int(duration * 1000))
-                        time.sleep(duration)
-                        if repeat > 1:
-                            time.sleep(0.2)  # 间隔
-                
-                threading.Thread(target=vibrate_device).start()
-            except Exception as e:
-                self.log(f"震动失败: {str(e)}")
-        else:
+        if not ON_ANDROID:
             self.log("震动功能仅在安卓设备上可用")
+            return False
+        steps = pulse_pattern(duration, VIBRATE_GAP if repeat > 1 else 0)
+        return self.effects.play(CHANNEL_VIBRATE, steps, repeat=repeat, priority=priority)
     
     def flash_screen(self, color=[1, 0, 0, 1], count=3):
         """
@@ -221,6 +492,14 @@ class ResponseHandler:
     
     def log(self, message):
         """记录日志"""
+        lines = getattr(self._batch_state, 'lines', None)
+        if lines is not None:
+            lines.append(message)
+        else:
+            self._emit_log(message)
+    
+    def _emit_log(self, message):
         if self.log_callback:
-            # 确保在主线程中调用回调
+            # 确保在主线程中调用回调；Kivy 在第一次写日志时才导入，无界面运行时不必加载
+            from kivy.clock import Clock
             Clock.schedule_once(lambda dt: self.log_callback(message), 0)
\ No newline at end of file
@@ -0,0 +1,184 @@
+import json
+
+# 二进制编码是可选依赖，未安装时只提供 JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# 编码名称
+CODEC_JSON = 'json'
+CODEC_MSGPACK = 'msgpack'
+CODEC_CBOR = 'cbor'
+
+
+class Codec:
+    """
+    消息编解码器接口
+
+    消息体的编码与分帧无关，二进制编码只能用于长度前缀分帧(换行符可能出现在消息体中)。
+    接收方按连接上第一帧的首字节识别编码(sniff)，之后该连接的请求和响应都使用这种编码，
+    因此每种编码的消息(JSON对象)首字节必须与其他编码区分开。
+    """
+
+    name = None
+    binary = True
+
+    def encode(self, message):
+        """
+        编码一条消息
+
+        Args:
+            message: 消息字典
+
+        Returns:
+            bytes: 消息体
+        """
+        raise NotImplementedError
+
+    def decode(self, payload):
+        """
+        解码一条消息
+
+        Args:
+            payload: 消息体，bytes 或指向接收缓冲区的 memoryview；文本编码也接受已解码的 str
+
+        Returns:
+            解码后的对象
+
+        Raises:
+            ValueError: 数据不是该编码的合法消息
+        """
+        raise NotImplementedError
+
+    def sniff(self, first_byte):
+        """
+        判断消息体的首字节是否属于该编码
+
+        Args:
+            first_byte: 消息体首字节(整数)
+
+        Returns:
+            bool: 属于该编码时返回True
+        """
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    name = CODEC_JSON
+    binary = False
+
+    def encode(self, message):
+        return json.dumps(message).encode('utf-8')
+
+    def decode(self, payload):
+        if not isinstance(payload, str):
+            # json.loads 不接受 memoryview，按 UTF-8 解码一次
+            payload = str(payload, 'utf-8')
+        return json.loads(payload)
+
+    def sniff(self, first_byte):
+        return first_byte in b'{[ \t\r\n'
+
+
+class MsgpackCodec(Codec):
+    """MessagePack，字典以 fixmap(0x80-0x8f)、map16(0xde) 或 map32(0xdf) 开头"""
+
+    name = CODEC_MSGPACK
+
+    def encode(self, message):
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, payload):
+        return msgpack.unpackb(payload, raw=False)
+
+    def sniff(self, first_byte):
+        return 0x80 <= first_byte <= 0x8f or first_byte in (0xde, 0xdf)
+
+
+class CborCodec(Codec):
+    """CBOR，字典以主类型5(0xa0-0xbb)或不定长 map(0xbf)开头"""
+
+    name = CODEC_CBOR
+
+    def encode(self, message):
+        return cbor2.dumps(message)
+
+    def decode(self, payload):
+        try:
+            return cbor2.loads(payload)
+        except cbor2.CBORDecodeError as e:
+            raise ValueError(str(e)) from e
+
+    def sniff(self, first_byte):
+        return 0xa0 <= first_byte <= 0xbb or first_byte == 0xbf
+
+
+JSON_CODEC = JsonCodec()
+
+_codecs = {CODEC_JSON: JSON_CODEC}
+if msgpack is not None:
+    _codecs[CODEC_MSGPACK] = MsgpackCodec()
+if cbor2 is not None:
+    _codecs[CODEC_CBOR] = CborCodec()
+
+
+def register_codec(codec):
+    """
+    登记一种编码，已有同名编码时替换
+
+    Args:
+        codec: Codec 实例
+    """
+    _codecs[codec.name] = codec
+
+
+def available_codecs():
+    """返回已登记(依赖已安装)的编码名称列表，JSON 总是第一个"""
+    return list(_codecs)
+
+
+def get_codec(name):
+    """
+    按名称取得编码
+
+    Args:
+        name: 编码名称或 Codec 实例
+
+    Returns:
+        Codec: 编码
+
+    Raises:
+        ValueError: 未知的编码或其依赖未安装
+    """
+    if isinstance(name, Codec):
+        return name
+    codec = _codecs.get(name)
+    if codec is None:
+        raise ValueError(f"不可用的编码: {name}，可用的编码: {', '.join(_codecs)}")
+    return codec
+
+
+def sniff_codec(payload, codecs):
+    """
+    按消息体首字节识别编码
+
+    Args:
+        payload: 消息体
+        codecs: 候选编码列表
+
+    Returns:
+        Codec: 识别出的编码，都不匹配时为 None
+    """
+    if not payload:
+        return None
+    first_byte = payload[0]
+    for codec in codecs:
+        if codec.sniff(first_byte):
+            return codec
+    return None